@@ -12,8 +12,82 @@
 
         `python annotate.py -n 5 mytemplate.csv` # First five rows
         `python annotate.py -n 5 -o out.ttl mytemplate.csv` # Writes to out.ttl
+
+    Large datasets can be processed in chunks of rows, writing the triples
+    for each chunk out before reading the next:
+
+        `python annotate.py -c 10000 mytemplate.csv` # 10000 rows at a time
+
+    When the graph only needs to be written out, statements can be streamed
+    straight to the output file as they're generated:
+
+        `python annotate.py --format nt --stream mytemplate.csv`
+
+    Repeated constant statements are left out of streamed output. Repeated
+    per-row statements can be left out too, using a Bloom filter of a given
+    size in megabytes:
+
+        `python annotate.py --format nt --stream --dedup-memory 256 mytemplate.csv`
+
+    The rows of the dataset can be split between several processes, each of
+    which streams its statements to the output:
+
+        `python annotate.py -j 8 mytemplate.csv` # 8 processes
+
+    Graphs too big for memory can be stored on disk, then serialized again
+    later without regenerating them:
+
+        `python annotate.py --storage sqlite --store-dir store mytemplate.csv`
+        `python annotate.py --storage sqlite --store-dir store --reopen mytemplate.csv`
+
+    Graphs that fit in memory take a fraction of the space as term IDs:
+
+        `python annotate.py --storage compact mytemplate.csv`
+
+    To find out where the time goes, write a report of the time, statements,
+    and rows of each phase (including each mapping), optionally with the
+    functions (cProfile) and lines (tracemalloc) processing spends the most
+    time and memory in:
+
+        `python annotate.py --profile report.json --profile-calls mytemplate.csv`
+
+    Long runs that write their output incrementally can save their progress
+    every so many seconds and, if they're interrupted, be continued later:
+
+        `python annotate.py -c 100000 --checkpoint 600 mytemplate.csv`
+        `python annotate.py -c 100000 --checkpoint 600 --resume mytemplate.csv`
+
+    Parsed templates, remote datasets, and parsed dataset columns can be
+    cached so later runs with the same template don't parse it again, only
+    download the dataset again if it has changed, and don't parse the
+    dataset again unless it has changed:
+
+        `python annotate.py --cache-dir cache mytemplate.csv`
+
+    Several templates, or directories of templates, can be annotated in one
+    batch. Each dataset is loaded once for all the templates that use it,
+    the templates are annotated by a pool of processes, and a table of how
+    long each took is printed at the end:
+
+        `python annotate.py -j 8 -o out/ templates/`
+        `python annotate.py -j 8 --summary summary.csv first.csv second.csv`
+
+    Output is compressed with gzip (or zstd, if the zstandard module is
+    installed) when its filename ends in .gz (or .zst), or with --compress.
+    Streamed output is compressed and written on a separate thread while
+    the statements that follow are generated:
+
+        `python annotate.py --stream -f nt -o mydataset.nt.gz mytemplate.csv`
+        `python annotate.py -j 8 --compress zstd -o out/ templates/`
+
+    The generated graph can be checked for Measurements and Observations
+    that are missing statements OBOE requires, with the number of each for
+    every key of the template:
+
+        `python annotate.py -f nt --stream --check-graph mytemplate.csv`
 """
 
+import os
 import sys
 import pandas
 import csv
@@ -21,29 +95,117 @@ import re
 import argparse
 
 from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import writers
+from csvtotriples import parallel
+from csvtotriples import store
+from csvtotriples import profiling
+from csvtotriples import batch
+from csvtotriples import validation
 
 
 if __name__ == "__main__":
     # Parse command line args
     parser = argparse.ArgumentParser(description='Generate an RDF graph from a CSV template.')
     parser.add_argument("-n", type=int, help="Number of rows to add to the graph. Default: All rows.")
-    parser.add_argument("-o", help="Filename to store the resulting RDF graph. Default: `filename`.ttl")
-    parser.add_argument("filename", help="Path to an annotation template (.csv).")
+    parser.add_argument("-o", help="Filename to store the resulting RDF graph, or directory for a batch. Default: `filename`.ttl")
+    parser.add_argument("-c", "--chunksize", type=int, help="Process the dataset this many rows at a time, writing triples out as it goes. Default: Load all rows at once.")
+    parser.add_argument("-f", "--format", default="turtle", help="Output format: turtle (ttl) or ntriples (nt). Default: turtle.")
+    parser.add_argument("--stream", action="store_true", help="Write statements to the output file as they're generated instead of building the graph in memory.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of processes to annotate the dataset (or the templates of a batch) with. Implies --stream for a single template. Default: 1.")
+    parser.add_argument("--storage", default="memory", choices=sorted(store.STORAGES), help="Where to keep the graph: memory, compact (term IDs in memory), bdb (Redland Berkeley DB), or sqlite (SQLite table). Default: memory.")
+    parser.add_argument("--store-dir", default=".", help="Directory for storage on disk. Default: current directory.")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Number of statements sqlite storage writes per commit, and the least compact storage buffers before merging them in. Default: 10000.")
+    parser.add_argument("--reopen", action="store_true", help="Serialize an existing store instead of annotating the dataset again.")
+    parser.add_argument("--profile", help="Write the time, statements, and rows of each phase to this file as JSON.")
+    parser.add_argument("--profile-calls", action="store_true", help="Add the functions processing spends the most time in (cProfile) to the --profile report.")
+    parser.add_argument("--profile-memory", action="store_true", help="Add the peak memory of each phase, and the lines processing allocates the most memory in (if tracemalloc is installed), to the --profile report.")
+    parser.add_argument("--checkpoint", type=float, help="Save progress every this many seconds, in --store-dir, so an interrupted run can be resumed. Needs --stream or -c.")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its last checkpoint, appending to its output.")
+    parser.add_argument("--cache-dir", help="Directory to cache parsed templates, remote datasets, and parsed dataset columns in. Default: Don't cache.")
+    parser.add_argument("--dedup-memory", type=float, help="Megabytes for a Bloom filter that leaves repeated per-row statements out of streamed output (per process with -j). Default: Only leave out repeated constant statements.")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="Compress the output (or each output of a batch), adding .gz or .zst to its filename. Outputs named with a .gz or .zst extension are compressed anyway. zstd needs the zstandard module.")
+    parser.add_argument("--check-graph", action="store_true", help="Check that every Measurement and Observation in the generated graph has the statements OBOE requires, and print the violations for each key. Output must be N-Triples when it's written out while processing.")
+    parser.add_argument("--summary", help="Write the table of rows, statements, and time taken for each template in a batch to this file as CSV.")
+    parser.add_argument("filename", nargs="+", help="Path to an annotation template (.csv), or several templates or directories of templates to annotate in a batch.")
 
     args = parser.parse_args()
 
-    # Createa and run the annotation
-    anno = annotation.Annotation(args.filename, nrows=args.n)
-    anno.parse()
-    anno.process()
+    if args.resume and args.checkpoint is None:
+        args.checkpoint = 300
+
+    if args.checkpoint is not None and args.jobs > 1:
+        parser.error("--checkpoint and --resume can't be used with --jobs.")
+
+    if args.jobs > 1 and (args.storage != "memory" or args.reopen):
+        parser.error("--storage and --reopen can't be used with --jobs, whose processes stream their output.")
+
+    if args.reopen and not store.STORAGES[args.storage]:
+        parser.error("--reopen needs storage kept on disk (--storage bdb or sqlite).")
+
+    profile = profiling.Profile(calls=args.profile_calls, memory=args.profile_memory)
+    bloom = int(args.dedup_memory * (1 << 20)) if args.dedup_memory is not None else None
+
+    # Annotate several templates in a batch
+    if len(args.filename) > 1 or os.path.isdir(args.filename[0]):
+        if args.chunksize is not None or args.checkpoint is not None or args.reopen or args.storage != "memory" or args.check_graph:
+            parser.error("-c, --checkpoint, --resume, --reopen, --storage, and --check-graph can't be used with a batch.")
+
+        summaries = batch.annotate(args.filename, args.jobs, directory=args.o, format=args.format, nrows=args.n,
+                                   stream=args.stream, cache=args.cache_dir, bloom=bloom, compression=args.compress)
+
+        print batch.formatSummary(summaries)
+
+        if args.summary is not None:
+            with open(args.summary, "wb") as f:
+                writer = csv.writer(f)
+                writer.writerow(["template", "outfile", "rows", "statements", "seconds", "error"])
+
+                for summary in summaries:
+                    writer.writerow([summary['template'], summary['outfile'], summary['rows'], summary['statements'],
+                                     "%.3f" % summary['seconds'], summary['error'] or ""])
+
+        sys.exit(1 if any(summary['error'] is not None for summary in summaries) else 0)
+
+    args.filename = args.filename[0]
 
     # Handle output filename
     if args.o is None:
-        outfile = args.filename.replace(".csv", ".ttl")
+        if writers.formatName(args.format) == "ntriples":
+            outfile = args.filename.replace(".csv", ".nt")
+        else:
+            outfile = args.filename.replace(".csv", ".ttl")
     else:
         outfile = args.o
 
-    anno.serialize(outfile)
+    outfile = writers.compressedFilename(outfile, args.compress)
+
+    # Createa and run the annotation
+    if args.jobs > 1:
+        anno = parallel.annotate(args.filename, outfile, args.jobs, nrows=args.n, format=args.format, chunksize=args.chunksize,
+                                 profile=profile, cache=args.cache_dir, bloom=bloom)
+    else:
+        anno = annotation.Annotation(args.filename, nrows=args.n, storage=args.storage, directory=args.store_dir,
+                                     batchsize=args.batch_size, reopen=args.reopen, profile=profile, cache=args.cache_dir)
+        anno.parse()
+
+        if args.reopen:
+            pass
+        elif args.stream or args.chunksize is not None or args.checkpoint is not None:
+            run = incremental.IncrementalRun(anno, stream=args.stream, chunksize=args.chunksize, checkpoint=args.checkpoint,
+                                             resume=args.resume, bloom=bloom)
+            run.process(outfile if run.needsOutput() else None, args.format)
+        else:
+            anno.process()
+
+        anno.serialize(outfile, args.format)
+
+    if args.check_graph:
+        print validation.formatViolations(anno.validateGraph())
+
+    if args.profile is not None:
+        profile.write(args.profile)
+        print "Wrote profile to %s." % args.profile
 
     # Print model size
     print anno
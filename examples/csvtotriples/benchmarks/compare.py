@@ -0,0 +1,78 @@
+""" compare.py
+
+    Compare two sets of benchmark results written by run.py, e.g. from two
+    commits.
+
+        `python benchmarks/compare.py before.jsonl after.jsonl`
+
+    For every case and phase present in both, prints the time before and
+    after and their ratio. When a file holds several runs of a case, the
+    last one is used.
+"""
+
+import sys
+import json
+import argparse
+
+
+def loadResults(filename):
+    """ Returns a dict of (case name, stream) -> result from `filename`. """
+
+    results = {}
+
+    with open(filename) as f:
+        for line in f:
+            if len(line.strip()) == 0:
+                continue
+
+            result = json.loads(line)
+            results[(result['case'], result['stream'])] = result
+
+    return results
+
+
+def phaseTimes(result):
+    """ Returns a dict of phase -> seconds, plus the total time. """
+
+    times = {}
+
+    for phase in result['phases']:
+        times[phase['phase']] = phase['seconds']
+
+    times['total'] = result['seconds']
+
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("before", help="Results to compare against.")
+    parser.add_argument("after", help="New results.")
+    parser.add_argument("--threshold", type=float, default=1.1, help="Flag phases that got slower by more than this ratio. Default: 1.1.")
+
+    args = parser.parse_args()
+
+    before = loadResults(args.before)
+    after = loadResults(args.after)
+    slower = 0
+
+    for key in sorted(set(before) & set(after)):
+        case, stream = key
+        old = phaseTimes(before[key])
+        new = phaseTimes(after[key])
+
+        print "%s%s (peak memory %.1f MB -> %.1f MB)" % (case, " [stream]" if stream else "",
+                                                         before[key]['peak_memory'] / 1e6, after[key]['peak_memory'] / 1e6)
+
+        for phase in sorted(set(old) & set(new)):
+            ratio = new[phase] / old[phase] if old[phase] > 0 else float("inf")
+            flag = ""
+
+            if ratio > args.threshold and new[phase] - old[phase] > 0.01:
+                flag = "  <-- slower"
+                slower += 1
+
+            print "    %-40s %10.4fs %10.4fs %8.2fx%s" % (phase, old[phase], new[phase], ratio, flag)
+
+    if slower > 0:
+        sys.exit(1)
@@ -0,0 +1,158 @@
+""" generate.py
+
+    Generate synthetic datasets and matching annotation templates for
+    benchmarking csvtotriples.
+
+    A dataset has `nmappings` numeric columns (c1, c2, ...) and, if there are
+    conditional mappings, a `category` column whose values (v1, v2, ...) are
+    each mapped by an 'eq' value mapping. The template has one observation
+    per numeric column which can have an entity, a context, and a
+    measurement with a characteristic and standard.
+
+    To generate a single dataset and template:
+
+        `python generate.py -n 100000 -m 10 -c 50 out/`
+"""
+
+import os
+import csv
+import argparse
+import numpy
+import pandas
+
+
+# Observation features that can be switched on and off
+FEATURES = ["entity", "context", "characteristic", "standard"]
+
+
+def caseName(nrows, nmappings, nconditional, features):
+    """ Returns the name used for the files of a benchmark case. """
+
+    return "rows%d-mappings%d-conditional%d-%s" % (nrows, nmappings, nconditional, "+".join(features) or "bare")
+
+
+def generateDataset(filename, nrows, nmappings, nconditional, seed=0, chunksize=100000):
+    """ Write a CSV dataset with `nrows` rows to `filename`, `chunksize` rows
+        at a time so that large datasets don't have to fit in memory.
+    """
+
+    random = numpy.random.RandomState(seed)
+    columns = ["c%d" % (i + 1) for i in range(nmappings)]
+
+    if nconditional > 0:
+        categories = numpy.array(["v%d" % (i + 1) for i in range(nconditional)], dtype=object)
+
+    written = 0
+
+    while written < nrows:
+        n = min(chunksize, nrows - written)
+        chunk = pandas.DataFrame(numpy.round(random.uniform(-100, 100, (n, nmappings)), 3), columns=columns)
+
+        if nconditional > 0:
+            chunk["category"] = categories[random.randint(0, nconditional, n)]
+
+        chunk.to_csv(filename, mode="w" if written == 0 else "a", header=(written == 0), index=False)
+        written += n
+
+
+def generateTemplate(filename, dataset, nmappings, nconditional, features):
+    """ Write an annotation template for a dataset made by generateDataset()
+        to `filename`, using the observation `features` listed.
+    """
+
+    with open(filename, "wb") as f:
+        writer = csv.writer(f)
+
+        writer.writerow(["META"])
+        writer.writerow(["data_identifier", dataset])
+
+        writer.writerow(["NAMESPACES"])
+        writer.writerow(["rdf", "http://www.w3.org/1999/02/22-rdf-syntax-ns#"])
+        writer.writerow(["owl", "http://www.w3.org/2002/07/owl#"])
+        writer.writerow(["oboe", "http://ecoinformatics.org/oboe/oboe.1.0/oboe-core.owl#"])
+        writer.writerow(["xsd", "http://www.w3.org/2001/XMLSchema#"])
+        writer.writerow(["bench", "http://example.com/bench#"])
+
+        writer.writerow(["TRIPLES"])
+        writer.writerow(["bench:Entity", "owl:equivalentClass", "oboe:Entity"])
+
+        # Rows are padded to the template's four columns, as a spreadsheet
+        # exports them (observation rows need at least three cells)
+        writer.writerow(["OBSERVATIONS"])
+
+        nobservations = nmappings + (1 if nconditional > 0 else 0)
+
+        for i in range(1, nobservations + 1):
+            writer.writerow(["observation", "o%d" % i, "", ""])
+
+            if "entity" in features:
+                writer.writerow(["", "entity", "bench:Entity%d" % i, ""])
+
+            writer.writerow(["", "measurement", "m%d" % i, ""])
+
+            if "characteristic" in features:
+                writer.writerow(["", "", "characteristic", "http://example.com/bench#Characteristic%d" % i])
+
+            if "standard" in features:
+                writer.writerow(["", "", "standard", "bench:Standard%d" % i])
+
+            if i <= nmappings:
+                writer.writerow(["", "", "datatype", "http://www.w3.org/2001/XMLSchema#decimal"])
+
+            if "context" in features and i > 1:
+                writer.writerow(["", "context", "o1", ""])
+
+        writer.writerow(["MAPPINGS"])
+
+        for i in range(1, nmappings + 1):
+            writer.writerow(["c%d" % i, "m%d" % i, "", ""])
+
+        for i in range(1, nconditional + 1):
+            writer.writerow(["category", "m%d" % nobservations, "category eq v%d" % i, "Category %d" % i])
+
+
+def casePaths(directory, nrows, nmappings, nconditional, features):
+    """ Returns the dataset and template filenames of a benchmark case in
+        `directory`.
+    """
+
+    name = caseName(nrows, nmappings, nconditional, features)
+    dataset = os.path.abspath(os.path.join(directory, "data-rows%d-mappings%d-conditional%d.csv" % (nrows, nmappings, nconditional)))
+    template = os.path.join(directory, "template-%s.csv" % name)
+
+    return dataset, template
+
+
+def generate(directory, nrows, nmappings, nconditional, features, seed=0):
+    """ Generate the dataset (unless it already exists) and template for a
+        benchmark case in `directory`. Returns the template filename.
+    """
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    dataset, template = casePaths(directory, nrows, nmappings, nconditional, features)
+
+    if not os.path.isfile(dataset):
+        print "Generating dataset %s." % dataset
+        generateDataset(dataset, nrows, nmappings, nconditional, seed)
+
+    # Templates are small, and rewriting them keeps them up to date
+    generateTemplate(template, dataset, nmappings, nconditional, features)
+
+    return template
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset and annotation template.")
+    parser.add_argument("-n", "--rows", type=int, default=1000, help="Number of rows. Default: 1000.")
+    parser.add_argument("-m", "--mappings", type=int, default=5, help="Number of unconditional mappings (numeric columns). Default: 5.")
+    parser.add_argument("-c", "--conditional", type=int, default=0, help="Number of conditional 'eq' mappings. Default: 0.")
+    parser.add_argument("--features", default=",".join(FEATURES), help="Comma-separated observation features to use, from %s. Default: all." % ",".join(FEATURES))
+    parser.add_argument("--seed", type=int, default=0, help="Random seed. Default: 0.")
+    parser.add_argument("directory", help="Directory to write the dataset and template to.")
+
+    args = parser.parse_args()
+    features = [feature for feature in args.features.split(",") if feature in FEATURES]
+
+    print "Created template at `%s`." % generate(args.directory, args.rows, args.mappings, args.conditional, features, args.seed)
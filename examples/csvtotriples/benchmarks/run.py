@@ -0,0 +1,155 @@
+""" run.py
+
+    Benchmark the csvtotriples pipeline on synthetic datasets (see
+    generate.py).
+
+    Each benchmark case is generated in one process and then run in another,
+    timing every phase of the annotation separately (parse, load,
+    processTriples, each mapping, validate, and serialize) and recording the
+    peak memory of the process, which doesn't include generating the case.
+    Results are appended as JSON lines to a results file, together with the
+    commit being benchmarked, so runs can be compared with compare.py.
+
+    Run from the csvtotriples directory:
+
+        `python benchmarks/run.py --rows 1000,10000 --mappings 5,20`
+        `python benchmarks/run.py --rows 1000000 --conditional 0,100 --stream`
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import itertools
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy
+import pandas
+
+from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import profiling
+
+import generate
+
+
+# Script that generates each case before it's run
+GENERATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate.py")
+
+
+def gitCommit():
+    """ Returns the commit of the working copy, or None. """
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runCase(template, outfile, stream=False, format="ntriples"):
+    """ Annotate `template` and return the timings of each phase (see
+        csvtotriples/profiling.py).
+    """
+
+    anno = annotation.Annotation(template)
+    anno.parse()
+
+    if stream:
+        incremental.IncrementalRun(anno, stream=True).process(outfile, format)
+    else:
+        anno.process()
+        anno.serialize(outfile, format)
+
+    return anno.profile.phases
+
+
+def runSingle(args):
+    """ Run one benchmark case and print its result as JSON. """
+
+    features = [feature for feature in args.features.split(",") if feature in generate.FEATURES]
+    template = generate.casePaths(args.workdir, int(args.rows), int(args.mappings), int(args.conditional), features)[1]
+
+    if not os.path.isfile(template):
+        raise Exception("No benchmark case at %s, generate it first (see generate.py)." % template)
+
+    outfile = os.path.join(args.workdir, "output.nt")
+
+    start = time.time()
+    phases = runCase(template, outfile, args.stream)
+
+    result = {
+        'case': generate.caseName(int(args.rows), int(args.mappings), int(args.conditional), features),
+        'rows': int(args.rows),
+        'mappings': int(args.mappings),
+        'conditional': int(args.conditional),
+        'features': features,
+        'stream': args.stream,
+        'seconds': time.time() - start,
+        'peak_memory': profiling.peakMemory(),
+        'phases': phases
+    }
+
+    os.remove(outfile)
+
+    print json.dumps(result)
+
+
+def parseList(value):
+    return [item for item in value.split(",") if len(item) > 0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark csvtotriples on synthetic datasets.")
+    parser.add_argument("--rows", default="1000,10000,100000", help="Comma-separated row counts. Default: 1000,10000,100000.")
+    parser.add_argument("--mappings", default="5,20", help="Comma-separated numbers of unconditional mappings. Default: 5,20.")
+    parser.add_argument("--conditional", default="0,50", help="Comma-separated numbers of conditional mappings. Default: 0,50.")
+    parser.add_argument("--features", default=",".join(generate.FEATURES) + ";", help="Semicolon-separated sets of comma-separated observation features. Default: all features, then none.")
+    parser.add_argument("--stream", action="store_true", help="Stream statements to the output instead of building a Redland model.")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "csvtotriples-benchmarks"), help="Directory for generated datasets and templates.")
+    parser.add_argument("-o", "--output", default="benchmark-results.jsonl", help="File to append results to. Default: benchmark-results.jsonl.")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.single:
+        runSingle(args)
+        sys.exit()
+
+    run = {
+        'commit': gitCommit(),
+        'host': socket.gethostname(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__
+    }
+
+    cases = itertools.product(parseList(args.rows), parseList(args.mappings), parseList(args.conditional), args.features.split(";"))
+
+    with open(args.output, "a") as f:
+        for rows, mappings, conditional, features in cases:
+            # Generate the case in its own process, so that its memory isn't
+            # counted in the peak memory of the run
+            subprocess.check_call([sys.executable, GENERATE, "--rows", rows, "--mappings", mappings, "--conditional", conditional,
+                                   "--features", features, args.workdir])
+
+            command = [sys.executable, os.path.abspath(__file__), "--single",
+                       "--rows", rows, "--mappings", mappings, "--conditional", conditional,
+                       "--features", features, "--workdir", args.workdir]
+
+            if args.stream:
+                command.append("--stream")
+
+            output = subprocess.check_output(command)
+            result = json.loads(output.strip().split("\n")[-1])
+            result.update(run)
+
+            print "%s: %.2fs, %.1f MB peak memory" % (result['case'], result['seconds'], result['peak_memory'] / 1e6)
+
+            f.write(json.dumps(result) + "\n")
+            f.flush()
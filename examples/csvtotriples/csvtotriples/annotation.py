@@ -8,26 +8,96 @@ import os
 import sys
 import csv
 import re
+import itertools
+import numpy
 import pandas
-import requests
 import RDF
 from urlparse import urlparse
 
 from csvtotriples import rdfutils
+from csvtotriples import terms
+from csvtotriples import writers
+from csvtotriples import store
+from csvtotriples import profiling
+from csvtotriples import plans
+from csvtotriples import downloads
+from csvtotriples import sniff
+from csvtotriples import fixedwidth
+from csvtotriples import columncache
+from csvtotriples import query
+from csvtotriples import validation
+
+
+# Types addStatement() accepts for subjects, predicates, and objects
+TERM_TYPES = frozenset([RDF.Node, RDF.Uri, str])
+
+# Blank nodes of the measurements of a mapping, and of observations (see
+# addValues())
+MEASUREMENT_NODE = re.compile(r"_:m(\d+)_row\d+\Z")
+OBSERVATION_NODE = re.compile(r"_:(.+)row\d+\Z")
+
+# String columns with at most this many distinct values per row are loaded
+# as categoricals
+CATEGORY_RATIO = 0.5
 
 
 class Annotation:
-    def __init__(self, template, nrows=None):
+    def __init__(self, template, nrows=None, start=0, storage="memory", directory=".", batchsize=10000,
+                 reopen=False, profile=None, cache=None):
+        """ `storage` selects where the graph is kept: 'memory' (default),
+            'compact' (term IDs in memory, see store.CompactStore), 'bdb'
+            (Redland Berkeley DB hashes), or 'sqlite' (a SQLite triple table
+            written `batchsize` statements at a time). Stores on disk (and
+            checkpoints, see incremental.py) are kept in `directory`. Set
+            `reopen` to open an existing store, e.g. to serialize it again,
+            instead of starting a new one.
+
+            Set `start` to annotate the rows of the dataset from that row on
+            (see process()).
+
+            Timings for each phase are recorded in `profile`, a
+            profiling.Profile (a new one by default).
+
+            Set `cache` to a directory to keep parsed templates (see parse()
+            and plans.py) and remote datasets (see locateDataset()) in.
+
+            To write statements out as they're generated, or process the
+            dataset in chunks, see incremental.py.
+        """
+
         print "Loading annotation template from file: %s." % template
 
         self.template = template
         self.dataset = None
         self.nrows = nrows
-        self.model = rdfutils.createModel() # An RDF Model
+        self.start = start # First row of the dataset to annotate
+        self.storage = storage
+        self.directory = directory
+        self.model = store.createStore(storage, directory, new=not reopen, batchsize=batchsize) # An RDF Model
+        self.terms = terms.TermCache() # Expanded CURIEs and RDF Nodes
+
+        # Incremental output (see incremental.py)
+        self.outfile = None # File statements were written to while processing
+        self.nflushed = 0 # Statements written out and no longer in the Model
+        self.constants = None # Constant statements added, when flushing chunks
+
+        # Index of the graph for match() and count(), and the number of
+        # statements added when it was built
+        self.index = None
+        self.nindexed = None
+
+        # Per-phase timings (see beginPhase())
+        self.profile = profile if profile is not None else profiling.Profile()
+        self.nadded = 0 # Statements added, including duplicates
+
+        # Parsed templates and emission plans (see measurementPlan())
+        self.cache = cache
+        self.plans = {}
+        self.plans_version = None
 
         # Store annotation template as a number of a dicts/arrays
         self.meta = {}
-        self.ns = {}
+        self.ns = terms.Namespaces()
         self.triples = []
         self.observations = {}
         self.contexts = {}
@@ -37,19 +107,80 @@ class Annotation:
         self.standards = {}
         self.conversions = {}
         self.datatypes = {}
+        self.dtypes = {} # pandas dtypes of attributes (see readDataset())
         self.mappings = []
+        self.values = {}
+        self.described = {} # Rows each Observation's own statements were added for (see describeRows())
+
+        # Formats of datasets, by filename (see sniffFormat())
+        self.formats = {}
 
 
     def __str__(self):
-        outstring = "Current model size is %d." % self.model.size()
+        outstring = "Current model size is %d." % self.size()
 
         return outstring
 
 
     def size(self):
-        """ Returns the number of statements in the RDF Model"""
+        """ Returns the number of statements in the RDF Model, including any
+            statements already flushed to the output file.
+        """
+
+        return self.model.size() + self.nflushed
+
+
+    def graphIndex(self):
+        """ Returns a query.TripleIndex of the graph, building it the first
+            time and again whenever statements have been added since.
+        """
+
+        if self.outfile is not None:
+            raise Exception("Statements were written to %s during processing and can't be queried." % self.outfile)
+
+        if self.index is None or self.nindexed != self.nadded:
+            self.beginPhase("index")
+            self.index = query.indexModel(self.model)
+            self.nindexed = self.nadded
+            self.endPhase()
+
+        return self.index
+
+
+    def queryTerm(self, term, position):
+        """ Returns the N-Triples term for `term` in a pattern: None (which
+            matches anything), an N-Triples URI or literal, or a template
+            string (see resolveTerm()).
+        """
+
+        if term is None or term.startswith("<") or term.startswith("\""):
+            return term
+
+        return self.resolveTerm(term, position)
+
 
-        return self.model.size()
+    def match(self, s=None, p=None, o=None):
+        """ Returns the statements in the graph matching the pattern `s`,
+            `p`, `o` as a list of (s, p, o) tuples of N-Triples terms.
+
+            Terms of the pattern are None, which matches anything, or terms
+            as queryTerm() takes them, e.g.
+
+                anno.match(None, "rdf:type", "oboe:Measurement")
+
+            The graph is indexed the first time it's queried (see query.py)
+            so later queries don't scan it.
+        """
+
+        return self.graphIndex().match(self.queryTerm(s, 's'), self.queryTerm(p, 'p'), self.queryTerm(o, 'o'))
+
+
+    def count(self, s=None, p=None, o=None):
+        """ Returns the number of statements in the graph matching the
+            pattern `s`, `p`, `o` (see match()).
+        """
+
+        return self.graphIndex().count(self.queryTerm(s, 's'), self.queryTerm(p, 'p'), self.queryTerm(o, 'o'))
 
 
     def nvalues(self):
@@ -60,11 +191,33 @@ class Annotation:
         count = 0
 
         for attribute in self.values:
-            count += len(self.values[attribute])
+            count += numpy.count_nonzero(self.values[attribute])
 
         return count
 
 
+    def termCacheStats(self):
+        """ Returns a dict with the number of hits, misses, and entries of
+            the cache used to expand CURIEs and create RDF Nodes.
+        """
+
+        return self.terms.stats()
+
+
+    def beginPhase(self, phase):
+        """ Start timing `phase` of the annotation (see profiling.py). """
+
+        self.profile.begin(phase, self.nadded)
+
+
+    def endPhase(self, nrows=0):
+        """ Stop timing the innermost running phase, which handled `nrows`
+            rows.
+        """
+
+        self.profile.end(self.nadded, nrows)
+
+
     def addStatement(self, s, p, o, literal=False):
         """ Custom addStatement override to make RDF statements as easy as
             possible to add to the graph.
@@ -80,51 +233,36 @@ class Annotation:
         """
 
         # Check types of s, p, and o before continuing
-        if type(s) not in [RDF.Node, RDF.Uri, str]:
+        if type(s) not in TERM_TYPES:
             raise Exception("Subject of triple not Node, Uri, or string.")
 
-        if type(p) not in [RDF.Node, RDF.Uri, str]:
+        if type(p) not in TERM_TYPES:
             raise Exception("Predicate of triple not Node, Uri, or string.")
 
-        if type(o) not in [RDF.Node, RDF.Uri, str]:
+        if type(o) not in TERM_TYPES:
             raise Exception("Object of triple not Node, Uri, or string.")
 
+        self.nadded += 1
 
-        # Process subject
-        if type(s) is str:
-            s_parts = s.split(":")
+        # Writers and stores other than Redland take N-Triples terms
+        if not isinstance(self.model, RDF.Model):
+            s = self.resolveTerm(s, 's') if type(s) is str else rdfutils.ntriplesFromNode(s)
+            p = self.resolveTerm(p, 'p') if type(p) is str else rdfutils.ntriplesFromNode(p)
+            o = self.resolveTerm(o, 'o', literal) if type(o) is str else rdfutils.ntriplesFromNode(o)
 
-            if len(s_parts) == 2:
-                if s_parts[0] == "_":
-                    s = RDF.Node(blank=s_parts[1])
-                else:
-                    s = RDF.Uri(self.ns[s_parts[0]] + s_parts[1])
-            else:
-                s = RDF.Uri(s)
+            self.model.add(s, p, o)
 
-        # Process predidcate
-        if type(p) is str:
-            p_parts = p.split(":")
+            return
 
-            if len(p_parts) == 2:
-                p = RDF.Uri(self.ns[p_parts[0]] + p_parts[1])
-            else:
-                p = RDF.Uri(p)
+        # Process subject, predicate, and object strings (see resolveTerm())
+        if type(s) is str:
+            s = self.terms.node(self.resolveTerm(s, 's'))
+
+        if type(p) is str:
+            p = self.terms.node(self.resolveTerm(p, 'p'))
 
-        # Process object
         if type(o) is str:
-            if not literal:
-                o_parts = o.split(":")
-
-                if len(o_parts) == 2:
-                    if o_parts[0] == "_":
-                        o = RDF.Node(blank=o_parts[1])
-                    else:
-                        o = RDF.Uri(self.ns[o_parts[0]] + o_parts[1])
-                else:
-                    o = RDF.Node(o)
-            else:
-                o = RDF.Node(literal=o)
+            o = self.terms.node(self.resolveTerm(o, 'o', literal))
 
         # Add the statement
         statement = RDF.Statement(s, p, o)
@@ -135,6 +273,31 @@ class Annotation:
         self.model.add_statement(statement)
 
 
+    def resolveTerm(self, term, position, literal=False):
+        """ Returns the N-Triples term for the template string `term`.
+
+            `position` is one of 's', 'p', or 'o' and, together with `literal`,
+            determines how the string is interpreted. See terms.expandTerm().
+        """
+
+        return self.terms.expand(self.ns, term, position, literal)
+
+
+    def addStatements(self, s, p, o):
+        """ Adds many statements at once.
+
+            `s`, `p`, and `o` are N-Triples terms (see resolveTerm()) or numpy
+            arrays of them. Single terms are repeated for every statement.
+        """
+
+        self.nadded += max(numpy.size(s), numpy.size(p), numpy.size(o))
+
+        if not isinstance(self.model, RDF.Model):
+            self.model.addMany(s, p, o)
+        else:
+            rdfutils.addNTriples(self.model, s, p, o, self.terms.node)
+
+
     def createUnionOfNode(self, node):
         """ Create a unionOf class node.
 
@@ -227,11 +390,26 @@ class Annotation:
         """ Parse the annotation template file. Triples that don't need to look
         at the data are created here but triples that do need to look at the
         data are generated in the process() method.
+
+        If the Annotation has a `cache` directory, the parsed template and its
+        emission plans are loaded from there when this template has been
+        parsed before, and saved there otherwise.
         """
 
         if not os.path.isfile(self.template):
             raise Exception("Could not find the template file located at %s." % self.template)
 
+        self.beginPhase("parse")
+
+        if self.cache is not None:
+            compiled = plans.loadTemplate(self.cache, self.template)
+
+            if compiled is not None:
+                self.restoreTemplate(compiled)
+                self.endPhase()
+
+                return
+
         f = open(self.template, "rbU")
         reader = csv.reader(f)
 
@@ -279,7 +457,7 @@ class Annotation:
 
             # Test if it's a heading for a group
 
-            if re.match("META|NAMESPACES|TRIPLES|OBSERVATIONS|MAPPING", header):
+            if re.match("META|NAMESPACES|TRIPLES|OBSERVATIONS|MAPPING|DTYPES", header):
                 if header == "META":
                     state = "META"
                 elif header == "NAMESPACES":
@@ -290,6 +468,8 @@ class Annotation:
                     state = "OBSERVATIONS"
                 elif header == "MAPPINGS":
                     state = "MAPPINGS"
+                elif header == "DTYPES":
+                    state = "DTYPES"
             else:
                 # Do the work in between headers
                 if state == "META":
@@ -359,11 +539,84 @@ class Annotation:
                             self.parseDatatype(row, parent)
                 elif state == "MAPPINGS":
                     self.parseMapping(row)
+                elif state == "DTYPES":
+                    self.parseDtype(row)
 
         f.close()
 
+        self.compilePlans()
+
+        if self.cache is not None:
+            plans.saveTemplate(self.cache, self.template, self.compiledTemplate())
+
+        self.endPhase()
+
+
+    def compiledTemplate(self):
+        """ Returns the parsed sections of the template and the emission
+            plans compiled from them, for caching.
+        """
+
+        compiled = {'plans': self.plans}
+
+        for section in plans.SECTIONS:
+            compiled[section] = getattr(self, section)
+
+        compiled['ns'] = dict(self.ns)
+
+        return compiled
+
+
+    def restoreTemplate(self, compiled):
+        """ Restore the parsed sections and plans from compiledTemplate(). """
+
+        for section in plans.SECTIONS:
+            if section != "ns":
+                setattr(self, section, compiled[section])
+
+        self.ns.clear()
+        self.ns.update(compiled['ns'])
+
+        self.plans = compiled['plans']
+        self.plans_version = self.ns.version
 
-    def process(self):
+
+    def compilePlans(self):
+        """ Compile the emission plan for each measurement that's mapped.
+            Plans that can't be compiled yet, e.g. because a namespace is
+            missing, are left until they're needed.
+        """
+
+        for mapping in self.mappings:
+            if 'key' not in mapping:
+                continue
+
+            try:
+                self.measurementPlan(mapping['key'])
+            except KeyError:
+                pass
+
+
+    def measurementPlan(self, key):
+        """ Returns the emission plan for measurement `key` (see
+            plans.compilePlan()), compiling it if needed. Plans are compiled
+            again if the namespaces change.
+        """
+
+        if self.plans_version != self.ns.version:
+            self.plans = {}
+            self.plans_version = self.ns.version
+
+        plan = self.plans.get(key)
+
+        if plan is None:
+            plan = plans.compilePlan(self, key)
+            self.plans[key] = plan
+
+        return plan
+
+
+    def process(self, validate=True, dataset=None):
         """ Processes what has been read in from the parse() method.
 
             There are 3 major steps in this method.
@@ -371,81 +624,444 @@ class Annotation:
             1. Download+load dataset (optional)
             2. Add parsed triples from TRIPLES section into Model
             3. Process all data mappings
-        """
 
-        # Download (if necessary) and load data
-        if 'data_identifier' in self.meta:
-            url = self.meta['data_identifier']
-            parsed_url = urlparse(url)
+            The statements are kept in the Model (see `storage`), to be
+            serialized afterwards. To write them out as they're generated
+            instead, or process the dataset in chunks, see incremental.py.
 
-            """ Check whether file is local or remote.
-                The check used here is whether urlparse() extracts a scheme."""
+            If the Annotation was created with a `start` row, only rows from
+            `start` onward are annotated and the TRIPLES section is skipped so
+            that the dataset can be split between several Annotations (see
+            parallel.py). Pass `validate` as False to skip validate().
 
-            if len(parsed_url[0]) > 0:
-                # Remote file
-                parsed_paths = parsed_url.path.split('/')
-                filename = parsed_paths[len(parsed_paths)-1]
+            A DataFrame of the template's dataset that's already been loaded,
+            e.g. one shared by several templates (see batch.py), can be given
+            as `dataset` so it isn't located and loaded again.
 
-                # Check if file exists in the current directory
-                # If not, download and save
-                if not os.path.isfile(filename):
-                    r = requests.get(url)
+            The whole run is captured by the profile's cProfile/tracemalloc
+            if they're enabled.
+        """
 
-                    if r.status_code != 200:
-                        raise Exception("Status code was not 200. Download must have failed.")
+        self.profile.capture()
 
-                    with open(filename, "wb") as f:
-                        f.write(r.text)
+        try:
+            # Download (if necessary) and load data
+            if dataset is not None:
+                self.trackValues()
 
-                    print "Retreiving data from URL: %s" % url
+                self.beginPhase("load")
+                self.useDataset(dataset)
+                self.endPhase(self.nrows)
             else:
-                # Local file
+                self.beginPhase("download")
+                filename = self.locateDataset()
+                self.endPhase()
+
+                if filename is not None:
+                    self.beginPhase("load")
+                    self.loadDataset(filename)
+                    self.endPhase(self.nrows)
+
+            # Process triples
+            if self.start == 0:
+                self.beginPhase("processTriples")
+                self.processTriples()
+                self.endPhase()
+
+            # Process the mappings present
+            self.processMappings()
+
+            if validate:
+                self.beginPhase("validate")
+                self.validate()
+                self.endPhase(self.nrows or 0)
+
+            self.beginPhase("serialize")
+            self.flush()
+            self.endPhase()
+        finally:
+            self.profile.release()
+
+            # Unmap a fixed-width dataset we loaded, not one we were given
+            if dataset is None:
+                fixedwidth.closeFrame(self.dataset)
+
+
+    def locateDataset(self):
+        """ Find the file for the dataset in `data_identifier`, downloading it
+            first if it's remote and not already present in the current
+            directory. If the Annotation has a `cache` directory, remote
+            datasets are kept up to date in the cache instead (see
+            downloads.DatasetCache).
+
+            Returns the filename of the dataset or None if the template doesn't
+            have a `data_identifier`. Also sets up value tracking for the
+            mapped attributes.
+        """
+
+        if 'data_identifier' not in self.meta:
+            return None
+
+        url = self.meta['data_identifier']
+        parsed_url = urlparse(url)
+
+        """ Check whether file is local or remote.
+            The check used here is whether urlparse() extracts a scheme."""
+
+        if len(parsed_url[0]) > 0 and self.cache is not None:
+            # Remote file, kept up to date in the cache
+            filename = downloads.DatasetCache(os.path.join(self.cache, "datasets")).fetch(url)
+        elif len(parsed_url[0]) > 0:
+            # Remote file
+            parsed_paths = parsed_url.path.split('/')
+            filename = parsed_paths[len(parsed_paths)-1]
+
+            # Check if file exists in the current directory
+            # If not, download and save
+            if not os.path.isfile(filename):
+                print "Retreiving data from URL: %s" % url
+
+                try:
+                    downloads.download(url, filename + ".partial")
+                except:
+                    if os.path.isfile(filename + ".partial"):
+                        os.remove(filename + ".partial")
+
+                    raise
+
+                os.rename(filename + ".partial", filename)
+        else:
+            # Local file
+
+            # Raise exception if the data_identifier doesn't exist
+            if not os.path.isfile(url):
+                raise Exception("data_identifier found but couldn't download or locate on disk: %s" % url)
+
+            filename = url
+
+        self.trackValues()
+
+        return filename
+
+
+    def trackValues(self):
+        """ Set up value tracking dict
+            We only track and validate the usage of mapped attribtues.
+            Each attribute has an array of whether the value in each row
+            (from `self.start`) has been used.
+        """
+
+        self.values = {}
+        self.described = {}
+
+        for mapping in self.mappings:
+            self.values[mapping['attribute']] = numpy.zeros(self.nrows or 0, dtype=bool)
+
+
+    def mappedAttributes(self):
+        """ Returns the attributes (columns) of the dataset used by the
+            mappings, in the order they're first mapped.
+        """
+
+        attributes = []
+        seen = set()
+
+        for mapping in self.mappings:
+            if mapping['attribute'] not in seen:
+                attributes.append(mapping['attribute'])
+                seen.add(mapping['attribute'])
+
+        return attributes
+
+
+    def readDataset(self, filename, chunksize=None, skip=0, columns=None, dtypes=None):
+        """ Read the dataset at `filename` with pandas, autodetecting whether
+            it's a delimited (CSV, TSV, ...) or fixed-width file from its
+            first few KB (see sniffFormat()).
+
+            Reading starts at row `self.start` (plus `skip` rows) and only
+            `self.nrows` rows (less `skip`) are read, if set. When `chunksize`
+            is given, an iterator over DataFrames of (at most) `chunksize`
+            rows is returned instead of a single DataFrame.
+
+            Only the `columns` (by default, the mapped attributes) are read,
+            or just the first column if none of them are in the dataset, so
+            the rows can still be counted. Columns are read with the pandas
+            dtype given for them in `dtypes` (by default, the template's
+            DTYPES section) and inferred otherwise.
+
+            Fixed-width files whose lines are all the same length are
+            memory-mapped and read lazily instead (see fixedwidth.py), so
+            LazyFrames are returned in place of DataFrames.
+
+            If the Annotation has a `cache` directory, parsed columns are
+            cached there (see columncache.py) and LazyFrames of the cached columns
+            are returned. The columns are parsed for every row, to be cached,
+            the first time they're read, except when reading in chunks.
+        """
+
+        format = self.sniffFormat(filename)
+
+        if columns is None:
+            columns = self.mappedAttributes()
+
+        if dtypes is None:
+            dtypes = self.dtypes
+
+        # Select the columns to read by position in the header
+        columns = set(columns)
+        positions = [i for i, name in enumerate(format['columns']) if name in columns] or [0]
+        names = [format['columns'][i] for i in positions]
+
+        first = self.start + skip
+        nrows = self.nrows - skip if self.nrows is not None else None
+
+        if self.cache is not None:
+            cache = columncache.ColumnCache(os.path.join(self.cache, "columns"))
+            options = dict((names[i], self.columnOptions(format, position, dtypes))
+                           for i, position in enumerate(positions))
+
+            def parse(missing):
+                missing = set(missing)
+
+                return self.parseDataset(filename, format, [position for position in positions
+                                                            if format['columns'][position] in missing], 0, None, None, dtypes)
+
+            dataset = cache.read(filename, names, options, parse if chunksize is None else None, first, nrows, chunksize)
+
+            if dataset is not None:
+                return dataset
+
+        return self.parseDataset(filename, format, positions, first, nrows, chunksize, dtypes)
 
-                # Raise exception if the data_identifier doesn't exist
-                if not os.path.isfile(url):
-                    raise Exception("data_identifier found but couldn't download or locate on disk: %s" % url)
 
-                filename = url
+    def columnOptions(self, format, position, dtypes):
+        """ Returns the options the column at `position` of a dataset in
+            `format` is read with, which its cached copy is keyed by.
+        """
+
+        name = format['columns'][position]
+
+        return {
+            'format': format['format'],
+            'delimiter': format['delimiter'],
+            'position': position,
+            'colspec': format['colspecs'][position] if format['colspecs'] is not None else None,
+            'dtype': dtypes.get(name),
+            'category_ratio': CATEGORY_RATIO
+        }
+
+
+    def parseDataset(self, filename, format, positions, first=0, nrows=None, chunksize=None, dtypes=None):
+        """ Parse the columns at `positions` of the dataset `filename` in
+            `format`, from row `first` on (`nrows` of them, if given). See
+            readDataset().
+        """
+
+        names = [format['columns'][i] for i in positions]
+        dtypes = dtypes or {}
+
+        if format['delimiter'] is None:
+            try:
+                return fixedwidth.readFixedWidth(filename, names, [format['colspecs'][i] for i in positions], first,
+                                                 nrows, chunksize, dtypes, categorizeColumn)
+            except Exception as e:
+                print "Reading %s with pandas instead: %s" % (filename, e)
+
+            # Columns were inferred from the top of the file, not wherever
+            # we start
+            reader = pandas.read_fwf
+            options = {'colspecs': [format['colspecs'][i] for i in positions]}
+        else:
+            reader = pandas.read_csv
+            options = {'sep': format['delimiter'], 'usecols': positions}
+
+        declared = dict((name, dtypes[name]) for name in names if name in dtypes)
+
+        if len(declared) > 0:
+            options['dtype'] = declared
+
+        options['nrows'] = nrows
+        options['chunksize'] = chunksize
+
+        # Skip to the first row, keeping the column names from the header
+        if first > 0:
+            options['skiprows'] = skipLines(filename, first, format['delimiter'])
+            options['header'] = None
+            options['names'] = names
+
+        dataset = reader(filename, **options)
+
+        if chunksize is not None:
+            return itertools.imap(categorize, dataset)
+
+        return categorize(dataset)
+
+
+    def sniffFormat(self, filename):
+        """ Returns the format of the dataset at `filename` (see
+            sniff.sniffFormat()), which is only detected once for each file.
+        """
 
-            # Load the data file with pandas (autodetect format)
-            with open(filename, "rb") as f:
-                header_line = f.readline()
+        if filename not in self.formats:
+            self.formats[filename] = sniff.sniffFormat(filename)
 
-                if len(header_line.split(",")) > 1:          #CSV
-                    self.dataset = pandas.read_csv(filename)
-                elif len(header_line.split("\t")) > 1:       # TSV
-                    self.dataset = pandas.read_table(filename)
-                else:
-                    self.dataset = pandas.read_fwf(filename) #FWF
+        return self.formats[filename]
 
-            # Trim the dataset to only the number of rows the user specified
-            if self.nrows is not None:
-                self.dataset = self.dataset[0:self.nrows]
+
+    def loadDataset(self, filename, skip=0, columns=None, dtypes=None):
+        """ Load the entire dataset at `filename` into memory, except for
+            the first `skip` rows (see readDataset()).
+        """
+
+        self.useDataset(self.readDataset(filename, skip=skip, columns=columns, dtypes=dtypes), skip)
+
+
+    def useDataset(self, dataset, skip=0):
+        """ Use the DataFrame `dataset`, read from row `self.start` (plus
+            `skip` rows) of the dataset, as the dataset to annotate.
+        """
+
+        # Trim the dataset to only the number of rows the user specified
+        if self.nrows is not None:
+            dataset = dataset[0:self.nrows - skip]
+
+        self.nrows = skip + dataset.shape[0]
+
+        # Number rows from the start of the file, without changing a
+        # DataFrame that might be shared
+        self.dataset = dataset.copy(deep=False)
+        self.dataset.index = pandas.RangeIndex(self.start + skip, self.start + self.nrows)
+
+
+    def processMappings(self, skip=0, done=None):
+        """ Process each mapping against the current dataset, except for the
+            first `skip` mappings, e.g. because they were already processed
+            before a checkpoint. After each mapping that's processed, `done`
+            is called, if given, with the first row of the dataset and the
+            number of mappings processed (e.g. to save a checkpoint, see
+            incremental.py).
+
+            Value mappings with an 'eq' condition on the same attribute and
+            key are processed together by processEqualityMappings().
+
+            Each mapping (or group) is timed as its own phase, named after
+            its index and attribute, and the loop is captured by the
+            profile's cProfile/tracemalloc if they're enabled (for the whole
+            run when it's called from process() or an IncrementalRun).
+        """
+
+        if self.dataset is None:
+            return
+
+        groups = self.groupEqualityMappings()
+        nrows = self.dataset.shape[0]
+        first = self.start + self.nrows - nrows # First row of the dataset
+        index = 1
+
+        self.profile.capture()
+
+        for mapping in self.mappings:
+            group_key = (mapping['attribute'], mapping['key'])
+
+            if index <= skip:
+                pass
+            elif index in groups.get(group_key, {}).values():
+                # Process the whole group when we reach its first mapping
+                if index == min(groups[group_key].values()):
+                    self.beginPhase("processEqualityMappings:%d:%s" % (index, mapping['attribute']))
+                    self.processEqualityMappings(groups[group_key])
+                    self.endPhase(nrows)
             else:
-                self.nrows = self.dataset.shape[0]
+                self.beginPhase("processMapping:%d:%s" % (index, mapping['attribute']))
+                self.processMapping(mapping, index)
+                self.endPhase(nrows)
 
-            """ Set up value tracking dict
-                We only track and validate the usage of mapped attribtues.
-            """
+            if done is not None and index > skip:
+                done(first, index)
 
-            self.values = {}
+            index += 1
+
+        self.profile.release()
 
-            for mapping in self.mappings:
-                self.values[mapping['attribute']] = set([])
 
+    def groupEqualityMappings(self):
+        """ Find value mappings of the form 'attribute eq X' that share an
+            attribute and key.
 
-        # Process triples
-        self.processTriples()
+            Returns a dict of (attribute, key) -> {X: mapping index}. Only
+            groups of two or more mappings with distinct X's are included.
+        """
 
-        # Process the mappings present
+        groups = {}
+        conditions = {}
         index = 1
 
         for mapping in self.mappings:
-            self.processMapping(mapping, index)
+            if 'condition' in mapping and 'value' in mapping:
+                condition = mapping['condition'].split(" ")
+
+                if len(condition) == 3 and condition[1] == "eq":
+                    group_key = (mapping['attribute'], mapping['key'])
+
+                    groups.setdefault(group_key, {})[condition[2]] = index
+                    conditions[group_key] = conditions.get(group_key, 0) + 1
+
             index += 1
 
+        return dict((group_key, groups[group_key]) for group_key in groups
+                    if conditions[group_key] > 1 and len(groups[group_key]) == conditions[group_key])
+
+
+    def processEqualityMappings(self, group):
+        """ Process a group of 'eq' value mappings on the same attribute and
+            key (see groupEqualityMappings()) in one pass over the column.
+
+            Each value in the column is looked up in a table of condition
+            value -> mapping instead of comparing the column against each
+            condition in turn.
+        """
+
+        dataset = self.dataset
+        first = self.mappings[min(group.values()) - 1]
+        attrib = first['attribute']
+
+        if attrib not in dataset:
+            print "Couldn't find attribute %s in dataset with columns %s. Moving to next row." % (attrib, dataset.columns)
+            return
+
+        column = dataset[attrib]
+        indexes = column.map(group)
+        matched = indexes.notnull().values
+
+        # Report the rows no mapping in the group matched all at once
+        nunmatched = len(column) - matched.sum()
+
+        if nunmatched > 0:
+            unmatched_values = pandas.unique(column.values[~matched])
+
+            print "%d of %d values of attribute %s matched none of its %d 'eq' mappings for %s, e.g. %s." % \
+                (nunmatched, len(column), attrib, len(group), first['key'], ", ".join(str(v) for v in unmatched_values[:10]))
 
-        self.validate()
+        if not matched.any():
+            return
+
+        indexes = indexes[matched].astype(int)
+        values = indexes.map(dict((index, str(self.mappings[index - 1]['value'])) for index in group.values()))
+
+        self.addValues(first, indexes.values, column[matched], values)
+
+
+    def flush(self):
+        """ Write out whatever the Model has buffered: stores other than
+            Redland's (and writers, see incremental.py) are flushed, and
+            Redland stores on disk synced.
+        """
+
+        if not isinstance(self.model, RDF.Model):
+            self.model.flush()
+        elif self.storage != "memory":
+            self.model.sync()
 
 
     def validate(self):
@@ -476,21 +1092,81 @@ class Annotation:
         self.validateValueUse()
 
 
+    def validateGraph(self, filename=None):
+        """ Check the structure of the generated graph in one pass over its
+            statements (see validation.py): that Measurements have a value,
+            characteristic, and standard, and Observations an entity and a
+            measurement.
+
+            The statements are read from the graph or, if they were written
+            out during processing, from `filename` (the output file by
+            default), which must be N-Triples.
+
+            Returns the number of nodes and of violations for each key, class,
+            and missing predicate (see GraphValidator.violations()), where
+            Measurements are counted under the key of their mapping and
+            Observations under their own key.
+        """
+
+        if filename is None:
+            filename = self.outfile
+
+        terms = dict((name, self.resolveTerm(plans.PREDICATES[name], 'p')) for name in plans.PREDICATES)
+        terms.update((name, self.resolveTerm(plans.CLASSES[name], 'o')) for name in plans.CLASSES)
+
+        if filename is not None:
+            batches = validation.readNTriples(filename)
+        elif isinstance(self.model, RDF.Model):
+            batches = query.redlandBatches(self.model)
+        else:
+            batches = self.model.batches()
+
+        self.beginPhase("validateGraph")
+
+        validator = validation.GraphValidator(terms)
+        validator.check(batches)
+        violations = validator.violations(self.nodeKey)
+
+        self.endPhase()
+
+        return violations
+
+
+    def nodeKey(self, node):
+        """ Returns the key of the mapping a Measurement's blank node `node`
+            was generated for, the key of the Observation an Observation's
+            blank node was generated for, or else `node` itself.
+        """
+
+        match = MEASUREMENT_NODE.match(node)
+
+        if match is not None and 0 < int(match.group(1)) <= len(self.mappings):
+            return self.mappings[int(match.group(1)) - 1]['key']
+
+        match = OBSERVATION_NODE.match(node)
+
+        if match is not None:
+            return match.group(1)
+
+        return node
+
+
     def validateValueUse(self):
         """ Check if we added all the values we were supposed to.
-            Each attribute should have exactly 'self.nrows' values in it
+            Each attribute should have exactly 'self.nrows' values in it.
+            (Values used more than once are caught as they're added, see
+            trackUseOfValues().) The rows that weren't used are reported as
+            ranges.
         """
 
 
         if self.dataset is not None:
             for attribute in self.values:
-                expected = self.nrows
-                actual = len(self.values[attribute])
+                used = trimRows(self.values[attribute], self.nrows)
+                unused = numpy.flatnonzero(~used)
 
-                if actual > expected:
-                    raise Exception("Too many values used from attribute %s. (Expected %d, Actual %s)" % (attribute, expected, actual))
-                elif actual < expected:
-                    raise Exception("Too few values used from attribute %s. (Expected %d, Actual %s)" % (attribute, expected, actual))
+                if len(unused) > 0:
+                    raise Exception("Too few values used from attribute %s. (Expected %d, Actual %d, Rows not used: %s)" % (attribute, self.nrows, self.nrows - len(unused), formatRowRanges(unused + self.start)))
 
 
     def parseMeta(self, row):
@@ -652,6 +1328,22 @@ class Annotation:
         self.datatypes[parent] = row[3]
 
 
+    def parseDtype(self, row):
+        """ Validate and parse a row from the DTYPES section.
+
+            e.g., row = ['cast', 'int16']
+                  row = ['spp', 'category']
+        """
+
+        if len(row) < 2 or len(row[0]) < 1 or len(row[1]) < 1:
+            print "Warning: Failed to parse row from DTYPES section: `%s`." % row
+
+            return
+
+
+        self.dtypes[row[0]] = row[1]
+
+
     def parseContext(self, row, parent):
         """ Validate and parse a row containing a Context statement from
             within the OBSERVATIONS section.
@@ -753,18 +1445,24 @@ class Annotation:
                 print "Condition format error. Expected three tokens, separated by a space. Moving to next row. Found %s." % mapping
                 return
 
+            column = dataset[attrib]
+
+            # Unordered categoricals can only be compared for equality
+            if condition[1] not in ["eq", "neq"] and pandas.api.types.is_categorical_dtype(column):
+                column = column.astype(object)
+
             if condition[1] == "eq":
-                matched_data = dataset[attrib][dataset[attrib] == condition[2]]
+                matched_data = column[column == condition[2]]
             elif condition[1] == "neq":
-                matched_data = dataset[attrib][dataset[attrib] != condition[2]]
+                matched_data = column[column != condition[2]]
             elif condition[1] == "lt":
-                matched_data = dataset[attrib][dataset[attrib] < condition[2]]
+                matched_data = column[column < condition[2]]
             elif condition[1] == "gt":
-                matched_data = dataset[attrib][dataset[attrib] > condition[2]]
+                matched_data = column[column > condition[2]]
             elif condition[1] == "lte":
-                matched_data = dataset[attrib][dataset[attrib] >= condition[2]]
+                matched_data = column[column >= condition[2]]
             elif condition[1] == "gte":
-                matched_data = dataset[attrib][dataset[attrib] <= condition[2]]
+                matched_data = column[column <= condition[2]]
             else:
                 print "Unrecognized comparison operator. Try one of eq|neq|lt|gt|lte|gte. Moving to next row. Found %s." % condition[1]
                 return
@@ -774,7 +1472,7 @@ class Annotation:
         self.addValues(mapping, index, matched_data)
 
 
-    def addValues(self, mapping, mapping_index, data):
+    def addValues(self, mapping, mapping_index, data, values=None):
         """ Adds values from the dataset to the Model.
 
             Blank nodes are used throughout this method to link statements. A
@@ -797,86 +1495,125 @@ class Annotation:
                 '_:m1_row0_characteristic'
 
             A similar pattern is followed for other concepts.
+
+            Rather than working row-by-row, each kind of statement is built for
+            all rows at once as columns of N-Triples terms which are then added
+            together with addStatements().
+
+            `mapping_index` may also be an array with the index of the mapping
+            for each row, and `values` a Series of the replacement value for
+            each row, when several value mappings are added together.
         """
 
-        mapping_value = None
+        if len(data) == 0:
+            return
+
         attrib = mapping['attribute']
         key = mapping['key']
 
-        # Handle maps with values
-        if 'value' in mapping:
-            mapping_value = mapping['value']
+        # Keep track of adding these values to the graph
+        self.trackUseOfValues(attrib, data.index, key)
 
-        data_index = data.index
+        rows = data.index.values.astype(str).astype(object)
 
-        for i in range(len(data)):
-            # Keep track of adding this value to the graph
-            self.trackUseOfValue(attrib, data_index[i])
-
-            # Create measurement blank node identifier
-            measurement = "_:m%d_row%d" % (mapping_index, data_index[i])
+        # Create measurement blank node identifiers
+        if isinstance(mapping_index, numpy.ndarray):
+            measurement = "_:m" + mapping_index.astype(str).astype(object) + "_row" + rows
+        else:
+            measurement = ("_:m%d_row" % mapping_index) + rows
 
-            # Value Mapping: Replace with mapping value if needed
-            if mapping_value is None:
-                node_value = str(data[i])
+        # Value Mapping: Replace with mapping value if needed
+        if values is None:
+            if 'value' in mapping:
+                values = pandas.Series(str(mapping['value']), index=data.index)
             else:
-                node_value = str(mapping_value)
+                values = pandas.Series(numpy.asarray(data.values).astype(str), index=data.index)
+
+        # Terms for this measurement's observation, entity, etc.
+        plan = self.measurementPlan(key)
 
-            # Datatype: Use RDF datatype, if present
-            if key in self.datatypes:
-                value_node = RDF.Node(literal=node_value, datatype=RDF.Uri(self.datatypes[key]))
+        # Datatype: Use RDF datatype, if present
+        value_nodes = rdfutils.ntriplesLiterals(values, plan['datatype'])
+
+        # Use language, if present
+        # TODO
+
+        # Columns of statements to add, and statements that are the same
+        # for every row, which are added on their own
+        statements = []
+        constants = []
+
+        def add(s, p, o):
+            if type(s) is str and type(p) is str and type(o) is str:
+                constants.append((s, p, o))
             else:
-                value_node = RDF.Node(literal=node_value)
+                statements.append(rdfutils.broadcastTerms(s, p, o))
 
-            # Use language, if present
-            # TODO
+        rdf_type = plan['type']
+        rdf_label = plan['label']
 
+        # Create Measurement
+        add(measurement, rdf_type, plan['Measurement'])
+        add(measurement, plan['hasValue'], value_nodes)
+        add(measurement, rdf_label, rdfutils.ntriplesLiteral(attrib))
 
-            # Create Measurement
-            self.addStatement(measurement, 'rdf:type', 'oboe:Measurement')
-            self.addStatement(measurement, 'oboe:hasValue', value_node)
-            self.addStatement(measurement, 'rdf:label', RDF.Node(literal=attrib))
+        # Create Observation
 
-            # Create Observation
+        if plan['observation'] is not None:
+            observation = plan['observation'] + rows
 
-            if key in self.observations:
-                observation = "_:" + self.observations[key] + "row" + str(data_index[i])
+            # Observation-hasMeasurement-Measurement
+            add(observation, plan['hasMeasurement'], measurement)
 
-                self.addStatement(observation, 'rdf:type', 'oboe:Observation')
-                self.addStatement(observation, 'rdf:label', RDF.Node(literal=observation))
+            # The Observation's own statements are only added by the first
+            # mapping of its measurements to reach each row
+            new = self.describeRows(self.observations[key], data.index)
 
-                # Observation-hasMeasurement-Measurement
-                self.addStatement(observation, 'oboe:hasMeasurement', measurement)
+            if new.any():
+                described = observation[new]
 
-                # Observation-hasContext-Observation
-                if self.observations[key] in self.contexts:
-                    other_observation = "_:" + self.contexts[self.observations[key]] + "row" + str(data_index[i])
+                add(described, rdf_type, plan['Observation'])
+                add(described, rdf_label, '"' + described + '"')
 
-                    self.addStatement(observation, 'oboe:hasContext', other_observation)
+                # Observation-hasContext-Observation
+                if plan['context'] is not None:
+                    add(described, plan['hasContext'], plan['context'] + rows[new])
 
                 # Observation-ofEntity-Entity
-                if self.observations[key] in self.entities:
-                    entity = "_:" + self.observations[key] + "_entity"
+                if plan['entity'] is not None:
+                    add(described, plan['ofEntity'], plan['entity'])
 
-                    self.addStatement(entity, 'rdf:type', self.entities[self.observations[key]])
-                    self.addStatement(observation, 'oboe:ofEntity', entity)
+            # The Entity is the same for every row so it's only typed once
+            if plan['entity'] is not None:
+                add(plan['entity'], rdf_type, plan['entity_type'])
 
-            # Measurement-ofCharacteristic-Characteristic
-            if key in self.characteristics:
-                characteristic = measurement + "_characteristic"
+        # Measurement-ofCharacteristic-Characteristic
+        if plan['characteristic_type'] is not None:
+            characteristic = measurement + "_characteristic"
 
-                self.addStatement(characteristic, 'rdf:type', RDF.Uri(self.characteristics[key]))
-                self.addStatement(measurement, 'oboe:ofCharacteristic', characteristic)
+            add(characteristic, rdf_type, plan['characteristic_type'])
+            add(measurement, plan['ofCharacteristic'], characteristic)
 
-            # Measurement-usesStandard-Standard
-            if key in self.standards:
-                standard = measurement + "_standard"
+        # Measurement-usesStandard-Standard
+        if plan['standard_type'] is not None:
+            standard = measurement + "_standard"
 
-                self.addStatement(standard, 'rdf:type', self.standards[key])
-                self.addStatement(measurement, 'oboe:usesStandard', standard)
+            add(standard, rdf_type, plan['standard_type'])
+            add(measurement, plan['usesStandard'], standard)
 
-            # TODO: Conversions
-            # if key in self.conversions:
+        # TODO: Conversions
+        # if key in self.conversions:
+
+        self.addStatements(*[numpy.concatenate(column) for column in zip(*statements)])
+
+        for statement in constants:
+            if self.constants is not None:
+                if statement in self.constants:
+                    continue
+
+                self.constants.add(statement)
+
+            self.addStatements(*statement)
 
 
     def trackUseOfValue(self, attribute, row_num):
@@ -887,26 +1624,216 @@ class Annotation:
                 - Each value only once
         """
 
+        self.trackUseOfValues(attribute, [row_num])
+
+
+    def trackUseOfValues(self, attribute, row_nums, key=None):
+        """ Track the use of each row number in `row_nums` in column
+            `attribute` in the dataset, by the mapping for measurement `key`.
+            See trackUseOfValue().
+
+            Uses are marked in a boolean array per attribute which is grown as
+            needed and checked by validateValueUse().
+        """
+
         if attribute not in self.values:
             raise Exception("Invalid attribute to track the use of values for. (%s)" % attribute)
 
-        if row_num in self.values[attribute]:
-            raise Exception("Attempted to use a value we've already added. (attribute: %s, row num: %s)" % (attribute, row_num))
+        rows = numpy.asarray(row_nums, dtype=numpy.int64) - self.start
 
-        if row_num not in self.values[attribute]:
-            self.values[attribute].add(row_num)
+        if len(rows) == 0:
+            return
+
+        used = self.values[attribute]
+        needed = rows.max() + 1
+
+        if needed > len(used):
+            used = growRows(used, needed)
+            self.values[attribute] = used
+
+        # Rows used before, or more than once by this mapping
+        rows = numpy.sort(rows)
+        reused = rows[used[rows] | numpy.concatenate([[False], numpy.diff(rows) == 0])]
+
+        if len(reused) > 0:
+            raise Exception("Attempted to use a value we've already added. (attribute: %s, mapping: %s, rows: %s)" % \
+                (attribute, key, formatRowRanges(numpy.unique(reused) + self.start)))
+
+        used[rows] = True
+
+
+    def describeRows(self, observation, row_nums):
+        """ Returns a boolean array of which rows in `row_nums` the
+            statements of the Observation keyed `observation` itself (its
+            type, label, context, and entity) haven't been added for yet, and
+            marks them as added.
+
+            However many mappings share an Observation, its statements are
+            only added once for each row, with the first of them, so
+            streamed output doesn't repeat them.
+        """
+
+        rows = numpy.asarray(row_nums, dtype=numpy.int64) - self.start
+        described = self.described.get(observation, numpy.zeros(0, dtype=bool))
+
+        if len(rows) > 0 and rows.max() + 1 > len(described):
+            described = growRows(described, rows.max() + 1)
+
+        self.described[observation] = described
+
+        new = ~described[rows]
+        described[rows] = True
+
+        return new
 
 
     def serialize(self, filename, format=None):
-        """ Serialize the Model to file. """
+        """ Serialize the Model to file, compressed if `filename` ends in .gz
+            or .zst (see writers.py).
+        """
 
+        # Statements were already written out while processing (see incremental.py)
+        if self.outfile is not None:
+            if filename != self.outfile:
+                raise Exception("Statements were already written to %s during processing." % self.outfile)
 
-        if format == None:
-            format = "turtle"
+            return
+
+        self.beginPhase("serialize")
+
+        # Stores other than Redland are written out with a writer
+        if not isinstance(self.model, RDF.Model):
+            writer = writers.createWriter(filename, format, self.ns)
 
-        serializer=RDF.Serializer(name=format)
+            for batch in self.model.batches():
+                writer.addMany(*[numpy.array(column, dtype=object) for column in zip(*batch)])
+
+            writer.close()
+        else:
+            serializer=RDF.Serializer(name=writers.formatName(format))
+
+            for prefix in self.ns:
+                serializer.set_namespace(prefix, RDF.Uri(self.ns[prefix]))
+
+            if writers.compression(filename) is None:
+                serializer.serialize_model_to_file(filename, self.model)
+            else:
+                # Redland can only write uncompressed files
+                serializer.serialize_model_to_file(filename + ".partial", self.model)
+                writers.compressFile(filename + ".partial", filename)
+                os.remove(filename + ".partial")
+
+        self.endPhase()
+
+
+def blankRecords(filename, delimiter=None):
+    """ Yields whether each record of `filename`, from the header on, is
+        blank. Records of a file with a `delimiter` are read the way pandas
+        reads them, with the csv module, so a quoted field's newlines are
+        part of its record. Records of a fixed-width file are its lines.
+    """
+
+    with open(filename, "rb") as f:
+        if delimiter is None:
+            for line in f:
+                yield len(line.strip()) == 0
+        else:
+            for record in csv.reader(f, delimiter=delimiter):
+                yield len(record) == 0 or (len(record) == 1 and len(record[0].strip()) == 0)
+
+
+def skipLines(filename, rows, delimiter=None):
+    """ Returns the number of records (see blankRecords()) of `filename` to
+        skip to get past its header and first `rows` rows. pandas skips
+        blank lines when it reads rows but counts them in `skiprows`, so
+        they're counted here too.
+    """
+
+    lines = 0
+    nonblank = 0
+
+    for blank in blankRecords(filename, delimiter):
+        if nonblank > rows:
+            break
+
+        lines += 1
+
+        if not blank:
+            nonblank += 1
+
+    return lines
+
+
+def categorize(dataset):
+    """ Convert the string columns of `dataset` with few distinct values to
+        categoricals (see categorizeColumn()).
+    """
+
+    for name in dataset.columns:
+        dataset[name] = categorizeColumn(dataset[name])
+
+    return dataset
+
+
+def categorizeColumn(column):
+    """ Returns the Series `column` as a categorical, which stores each
+        distinct value once, if it's a string column with few distinct values
+        (see CATEGORY_RATIO), and as it is otherwise.
+    """
+
+    if column.dtype != object or len(column) == 0:
+        return column
+
+    if len(pandas.unique(column.values)) <= CATEGORY_RATIO * len(column):
+        return column.astype("category")
+
+    return column
+
+
+def growRows(flags, size):
+    """ Returns a copy of the per-row array `flags` extended with False to
+        at least `size` entries, leaving room to grow.
+    """
+
+    grown = numpy.zeros(max(size, 2 * len(flags)), dtype=flags.dtype)
+    grown[:len(flags)] = flags
+
+    return grown
+
+
+def trimRows(flags, size):
+    """ Returns the per-row array `flags` with exactly `size` entries. """
+
+    if len(flags) < size:
+        return growRows(flags, size)[:size]
+
+    return flags[:size]
+
+
+def formatRowRanges(rows, limit=20):
+    """ Formats a sorted array of row numbers as compressed ranges, e.g.
+        [0, 1, 2, 5, 7, 8] as '0-2, 5, 7-8'. Only the first `limit` ranges
+        are listed.
+    """
+
+    rows = numpy.asarray(rows)
+
+    if len(rows) == 0:
+        return ""
+
+    breaks = numpy.flatnonzero(numpy.diff(rows) != 1)
+    starts = rows[numpy.concatenate([[0], breaks + 1])]
+    ends = rows[numpy.concatenate([breaks, [len(rows) - 1]])]
+
+    ranges = []
+
+    for start, end in zip(starts[:limit], ends[:limit]):
+        if start == end:
+            ranges.append("%d" % start)
+        else:
+            ranges.append("%d-%d" % (start, end))
 
-        for prefix in self.ns:
-            serializer.set_namespace(prefix, RDF.Uri(self.ns[prefix]))
+    if len(starts) > limit:
+        ranges.append("... (%d ranges in all)" % len(starts))
 
-        serializer.serialize_model_to_file(filename, self.model)
+    return ", ".join(ranges)
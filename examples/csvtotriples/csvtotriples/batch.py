@@ -0,0 +1,290 @@
+""" batch.py
+
+    Annotate many templates at once.
+
+    Each template is parsed once, and the templates are grouped by their
+    `data_identifier` so each dataset is only downloaded and loaded once,
+    however many templates use it. Datasets are loaded a few at a time, in
+    the main process, and the templates using them are annotated by a pool
+    of worker processes which share the parsed Annotations and loaded
+    DataFrames (workers are forked after the datasets are loaded). Within a
+    worker, templates with the same namespaces share a TermCache.
+"""
+
+import os
+import time
+import multiprocessing
+
+from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import fixedwidth
+from csvtotriples import writers
+
+
+# Parsed Annotations of the templates being annotated, by template
+ANNOTATIONS = {}
+
+# Datasets loaded for the templates being annotated, by data_identifier
+DATASETS = {}
+
+# TermCaches shared by templates with the same namespaces, by namespaces
+TERMS = {}
+
+
+def findTemplates(paths):
+    """ Returns the templates in `paths`, which are templates or directories
+        of templates (.csv files).
+    """
+
+    templates = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".csv"):
+                    templates.append(os.path.join(path, name))
+        else:
+            templates.append(path)
+
+    return templates
+
+
+def outputFilename(template, format, directory=None, compression=None):
+    """ Returns the output file for `template`: the template's name with a
+        .nt or .ttl extension (plus .gz or .zst for `compression`), in
+        `directory` if given.
+    """
+
+    extension = ".nt" if writers.formatName(format) == "ntriples" else ".ttl"
+    filename = writers.compressedFilename(os.path.splitext(template)[0] + extension, compression)
+
+    if directory is not None:
+        filename = os.path.join(directory, os.path.basename(filename))
+
+    return filename
+
+
+def outputFilenames(templates, format, directory=None, compression=None):
+    """ Returns the output file for each of `templates` (see
+        outputFilename()), by template.
+
+        Raises an Exception if two templates would be written to the same
+        file, e.g. templates with the same name in different directories
+        written to one `directory`.
+    """
+
+    outfiles = {}
+    owners = {} # Template written to each output file
+
+    for template in templates:
+        outfile = outputFilename(template, format, directory, compression)
+        key = os.path.abspath(outfile)
+
+        if key in owners:
+            raise Exception("Templates %s and %s would both be written to %s. Rename one of them or annotate them separately." % \
+                (owners[key], template, outfile))
+
+        owners[key] = template
+        outfiles[template] = outfile
+
+    return outfiles
+
+
+def groupTemplates(templates, nrows=None, cache=None):
+    """ Parse `templates` into Annotations with the options `nrows` and
+        `cache` (see annotation.Annotation), kept in ANNOTATIONS, and group
+        them by dataset.
+
+        Returns a list of (data_identifier, [templates]) in the order the
+        datasets first appear. Templates without a dataset are grouped
+        under None.
+    """
+
+    groups = []
+    index = {}
+
+    for template in templates:
+        anno = annotation.Annotation(template, nrows=nrows, cache=cache)
+        anno.parse()
+        ANNOTATIONS[template] = anno
+
+        data_identifier = anno.meta.get('data_identifier')
+
+        if data_identifier not in index:
+            index[data_identifier] = len(groups)
+            groups.append((data_identifier, []))
+
+        groups[index[data_identifier]][1].append(template)
+
+    return groups
+
+
+def waves(groups, jobs):
+    """ Split `groups` into waves of at most `jobs` datasets, ending a wave
+        early once it has `jobs` templates to keep the workers busy.
+    """
+
+    wave = []
+    ntemplates = 0
+
+    for group in groups:
+        wave.append(group)
+        ntemplates += len(group[1])
+
+        if len(wave) >= jobs or ntemplates >= jobs:
+            yield wave
+
+            wave = []
+            ntemplates = 0
+
+    if len(wave) > 0:
+        yield wave
+
+
+def loadDataset(templates):
+    """ Locate and load the dataset shared by `templates`, with the columns
+        and dtypes any of them use, using their parsed Annotations.
+    """
+
+    columns = []
+    dtypes = {}
+
+    for template in templates:
+        anno = ANNOTATIONS[template]
+
+        columns.extend(anno.mappedAttributes())
+        dtypes.update(anno.dtypes)
+
+    return anno.readDataset(anno.locateDataset(), columns=columns, dtypes=dtypes)
+
+
+def annotateTemplate(task):
+    """ Worker: annotate one template, using its parsed Annotation from
+        ANNOTATIONS and its dataset from DATASETS.
+
+        Returns a summary dict of the template, output file, rows, statements,
+        time taken, and any error.
+    """
+
+    template, outfile, format, stream, bloom = task
+
+    summary = {'template': template, 'outfile': outfile, 'rows': 0, 'statements': 0, 'error': None}
+    start = time.time()
+
+    try:
+        anno = ANNOTATIONS[template]
+
+        # Share expanded terms and nodes between templates with the same
+        # namespaces. The cache compares namespaces by content, so each
+        # template keeps its own Namespaces and the plans compiled for them.
+        anno.terms = TERMS.setdefault(frozenset(anno.ns.items()), anno.terms)
+
+        dataset = DATASETS.get(anno.meta.get('data_identifier'))
+
+        if stream:
+            incremental.IncrementalRun(anno, stream=True, bloom=bloom).process(outfile, format, dataset=dataset)
+        else:
+            anno.process(dataset=dataset)
+            anno.serialize(outfile, format)
+
+        summary['rows'] = anno.nrows or 0
+        summary['statements'] = anno.size()
+    except Exception as e:
+        summary['error'] = "%s: %s" % (type(e).__name__, e)
+
+    summary['seconds'] = time.time() - start
+
+    return summary
+
+
+def annotate(paths, jobs=1, directory=None, format=None, nrows=None, stream=False, cache=None, bloom=None,
+             compression=None):
+    """ Annotate every template in `paths` (templates or directories of
+        them) with `jobs` worker processes, writing each template's
+        statements to its own file (see outputFilename()), compressed with
+        `compression` if given. Raises an Exception, before annotating
+        anything, if two templates would be written to the same file.
+
+        Returns a list of summaries (see annotateTemplate()), in the order
+        of the templates. A template that fails doesn't stop the others.
+    """
+
+    templates = findTemplates(paths)
+    outfiles = outputFilenames(templates, format, directory, compression)
+
+    if directory is not None and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    print "Annotating %d templates with %d processes." % (len(templates), jobs)
+
+    summaries = {}
+
+    for wave in waves(groupTemplates(templates, nrows, cache), jobs):
+        tasks = []
+
+        for data_identifier, group in wave:
+            if data_identifier is not None:
+                start = time.time()
+
+                try:
+                    DATASETS[data_identifier] = loadDataset(group)
+                except Exception as e:
+                    for template in group:
+                        summaries[template] = {'template': template, 'outfile': None, 'rows': 0, 'statements': 0,
+                                               'seconds': 0.0, 'error': "Loading dataset failed: %s" % e}
+                    continue
+
+                print "Loaded %s (%d rows) in %.2fs for %d templates." % \
+                    (data_identifier, DATASETS[data_identifier].shape[0], time.time() - start, len(group))
+
+            for template in group:
+                tasks.append((template, outfiles[template], format, stream, bloom))
+
+        if jobs > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(min(jobs, len(tasks)))
+
+            try:
+                results = pool.map(annotateTemplate, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [annotateTemplate(task) for task in tasks]
+
+        for summary in results:
+            summaries[summary['template']] = summary
+
+        for dataset in DATASETS.values():
+            fixedwidth.closeFrame(dataset)
+
+        DATASETS.clear()
+
+        for data_identifier, group in wave:
+            for template in group:
+                del ANNOTATIONS[template]
+
+    return [summaries[template] for template in templates if template in summaries]
+
+
+def formatSummary(summaries):
+    """ Returns a table of the rows, statements, and time taken for each
+        template, with totals.
+    """
+
+    width = max([len("Template")] + [len(summary['template']) for summary in summaries])
+    line = "%-" + str(width) + "s  %10s  %12s  %9s  %s"
+
+    lines = [line % ("Template", "Rows", "Statements", "Seconds", "Status")]
+
+    for summary in summaries:
+        status = "ok" if summary['error'] is None else summary['error']
+        lines.append(line % (summary['template'], summary['rows'], summary['statements'], "%.2f" % summary['seconds'], status))
+
+    nfailed = len([summary for summary in summaries if summary['error'] is not None])
+
+    lines.append(line % ("Total", sum(summary['rows'] for summary in summaries),
+                         sum(summary['statements'] for summary in summaries),
+                         "%.2f" % sum(summary['seconds'] for summary in summaries),
+                         "%d failed" % nfailed))
+
+    return "\n".join(lines)
@@ -0,0 +1,146 @@
+""" checkpoint.py
+
+    Checkpoints for resuming interrupted annotations.
+
+    While an annotation writes its output incrementally (streaming or in
+    chunks), it can save its progress every so often: the first row of the
+    chunk being processed, how many of the mappings have been done for that
+    chunk, how far into the output file the statements for those got, the
+    values used so far, and which statements have been written already
+    (the constant statements, the rows each Observation has been described
+    for, and, when deduplicating, the Bloom filter) so they aren't written
+    again. A later run of the same template on the
+    same dataset can then cut the output off at that point and carry on from
+    there instead of starting over.
+
+    Checkpoints are kept in a single .npz file named after a hash of the
+    template and dataset, which is replaced atomically on every save and
+    removed once the annotation finishes.
+"""
+
+import os
+import json
+import time
+import hashlib
+import numpy
+
+
+def checkpointKey(template, dataset, blocksize=1 << 20):
+    """ Returns a hash identifying the `template` and `dataset` files.
+
+        The whole template is hashed but, so that large datasets don't have
+        to be read in full, only the size and the first and last `blocksize`
+        bytes of the dataset are.
+    """
+
+    digest = hashlib.sha1()
+
+    with open(template, "rb") as f:
+        digest.update(f.read())
+
+    size = os.path.getsize(dataset)
+    digest.update(str(size))
+
+    with open(dataset, "rb") as f:
+        digest.update(f.read(blocksize))
+        f.seek(max(size - blocksize, 0))
+        digest.update(f.read(blocksize))
+
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """ The saved progress of an annotation.
+
+        `run` is a dict describing the annotation (output file, format, ...)
+        which must be the same for a checkpoint to be resumed. Saves happen
+        at most every `interval` seconds unless forced.
+    """
+
+    def __init__(self, directory, key, run, interval=300):
+        self.filename = os.path.join(directory, "%s.checkpoint.npz" % key)
+        self.run = run
+        self.interval = interval
+        self.last = time.time()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+
+    def due(self):
+        """ Whether it's been `interval` seconds since the last save. """
+
+        return time.time() - self.last >= self.interval
+
+
+    def save(self, progress, values, constants=(), bloom=None, described={}):
+        """ Save `progress` (a dict with the row, mapping, output offset, and
+            number of statements so far), the values used `values`, the
+            constant statements written `constants`, the bits of the
+            dedup.BloomFilter of per-row statements written `bloom`, if any,
+            and the rows each Observation's own statements were written for
+            `described`.
+        """
+
+        state = dict(self.run, **progress)
+        state['attributes'] = sorted(values)
+        state['observations'] = sorted(described)
+        state['constants'] = sorted(constants)
+        state['time'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+        arrays = dict(("count%d" % i, values[attribute]) for i, attribute in enumerate(state['attributes']))
+        arrays.update(("described%d" % i, described[observation]) for i, observation in enumerate(state['observations']))
+        arrays['state'] = numpy.array(json.dumps(state))
+
+        if bloom is not None:
+            arrays['bloom'] = bloom
+
+        partial = self.filename + ".partial"
+
+        with open(partial, "wb") as f:
+            numpy.savez(f, **arrays)
+
+        os.rename(partial, self.filename)
+
+        self.last = time.time()
+
+
+    def load(self):
+        """ Returns the saved progress, values used, constant statements,
+            Bloom filter bits (or None), and described rows of each
+            Observation, or None if there is no checkpoint.
+        """
+
+        if not os.path.isfile(self.filename):
+            return None
+
+        arrays = numpy.load(self.filename)
+        state = json.loads(str(arrays['state']))
+
+        for field in self.run:
+            if state[field] != self.run[field]:
+                raise Exception("Can't resume from checkpoint %s, it was saved with %s %s instead of %s." % \
+                    (self.filename, field, state[field], self.run[field]))
+
+        values = {}
+
+        for i, attribute in enumerate(state['attributes']):
+            values[attribute] = arrays["count%d" % i].astype(bool)
+
+        described = {}
+
+        for i, observation in enumerate(state.pop('observations', [])):
+            described[observation.encode("utf-8")] = arrays["described%d" % i]
+
+        # JSON turns the statements into lists of unicode strings
+        constants = set(tuple(term.encode("utf-8") for term in statement) for statement in state.pop('constants'))
+        bloom = arrays['bloom'] if 'bloom' in arrays.files else None
+
+        arrays.close()
+
+        return state, values, constants, bloom, described
+
+
+    def remove(self):
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
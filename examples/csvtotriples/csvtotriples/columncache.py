@@ -0,0 +1,213 @@
+""" columncache.py
+
+    A cache of parsed dataset columns.
+
+    Parsing a large dataset is usually the slowest part of a run, and it's
+    repeated on every run even when the dataset hasn't changed. With a
+    ColumnCache, each column is saved the first time it's parsed as a .npy
+    array (plus a pickle of its categories, for categoricals) named after a
+    hash of the dataset's content, the column, and the options it was read
+    with. Later runs memory-map the cached arrays instead of parsing the
+    dataset again and only read the rows they need from them.
+
+    Columns of strings that aren't categoricals can't be memory-mapped and
+    are pickled instead.
+"""
+
+import os
+import json
+import hashlib
+import numpy
+import pandas
+import cPickle as pickle
+
+from csvtotriples import downloads
+from csvtotriples import fixedwidth
+
+
+# Bump when the way columns are stored changes to invalidate caches
+VERSION = 1
+
+
+class ColumnCache:
+    """ A cache of parsed dataset columns in `directory`.
+
+        Columns are stored as <key>.npy (and <key>.categories.pickle or
+        <key>.pickle) with a <key>.json entry describing them, written last.
+        The SHA-256 of each dataset is kept in files/<sha1 of path>.json with
+        the dataset's size and modification time, so it's only computed again
+        when the dataset changes.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        for subdirectory in ["", "files"]:
+            path = os.path.join(directory, subdirectory)
+
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+
+    def checksum(self, filename):
+        """ Returns the SHA-256 of the content of `filename`. """
+
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        entry_filename = os.path.join(self.directory, "files", "%s.json" % hashlib.sha1(path).hexdigest())
+
+        if os.path.isfile(entry_filename):
+            with open(entry_filename, "rb") as f:
+                entry = json.load(f)
+
+            if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                return entry['sha256']
+
+        entry = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': downloads.fileChecksum(path)}
+        writeAtomically(entry_filename, lambda f: json.dump(entry, f, indent=2))
+
+        return entry['sha256']
+
+
+    def columnKey(self, checksum, name, options):
+        """ Returns the key of column `name` of the dataset with content
+            `checksum`, read with the loader `options` (a dict).
+        """
+
+        digest = hashlib.sha1(str(VERSION))
+        digest.update(checksum)
+        digest.update(json.dumps([name, options], sort_keys=True))
+
+        return digest.hexdigest()
+
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+
+    def entry(self, key):
+        """ Returns the entry for the column cached under `key`, or None. """
+
+        if not os.path.isfile(self.path(key, ".json")):
+            return None
+
+        with open(self.path(key, ".json"), "rb") as f:
+            return json.load(f)
+
+
+    def save(self, key, values):
+        """ Cache the column `values` (an array or Categorical) under `key`. """
+
+        if isinstance(values, pandas.Categorical):
+            kind = "categorical"
+            writeAtomically(self.path(key, ".npy"), lambda f: numpy.save(f, values.codes))
+            writeAtomically(self.path(key, ".categories.pickle"),
+                            lambda f: pickle.dump(values.categories, f, pickle.HIGHEST_PROTOCOL))
+        elif values.dtype == object:
+            kind = "object"
+            writeAtomically(self.path(key, ".pickle"), lambda f: pickle.dump(values, f, pickle.HIGHEST_PROTOCOL))
+        else:
+            kind = "array"
+            writeAtomically(self.path(key, ".npy"), lambda f: numpy.save(f, values))
+
+        entry = {'kind': kind, 'length': len(values)}
+        writeAtomically(self.path(key, ".json"), lambda f: json.dump(entry, f))
+
+
+    def load(self, key, entry):
+        """ Returns the column cached under `key`, memory-mapped if it's an
+            array or categorical.
+        """
+
+        if entry['kind'] == "object":
+            with open(self.path(key, ".pickle"), "rb") as f:
+                return pickle.load(f)
+
+        values = numpy.load(self.path(key, ".npy"), mmap_mode="r")
+
+        if entry['kind'] == "categorical":
+            with open(self.path(key, ".categories.pickle"), "rb") as f:
+                categories = pickle.load(f)
+
+            return pandas.Categorical.from_codes(values, categories)
+
+        return values
+
+
+    def read(self, filename, names, options, parse=None, first=0, nrows=None, chunksize=None):
+        """ Returns a LazyFrame (see fixedwidth.py) of columns `names` of the
+            dataset `filename`, from row `first` on (`nrows` of them, if
+            given), read from the cache. When `chunksize` is given, an
+            iterator over LazyFrames of (at most) `chunksize` rows is
+            returned instead.
+
+            `options` are the loader options for each column and `parse` is
+            called with the names of any columns that aren't cached yet to
+            parse all of their rows, which are then cached. Without `parse`,
+            None is returned if any of the columns aren't cached.
+        """
+
+        checksum = self.checksum(filename)
+        keys = dict((name, self.columnKey(checksum, name, options[name])) for name in names)
+        entries = dict((name, self.entry(keys[name])) for name in names)
+        missing = [name for name in names if entries[name] is None]
+
+        if len(missing) > 0 and parse is None:
+            return None
+
+        if len(missing) > 0:
+            print "Caching %d columns of %s." % (len(missing), filename)
+
+            dataset = parse(missing)
+
+            for name in missing:
+                self.save(keys[name], dataset[name].values)
+                entries[name] = self.entry(keys[name])
+
+            fixedwidth.closeFrame(dataset)
+
+        records = CachedRecords(self, names, keys, entries, first, nrows)
+
+        if chunksize is None:
+            return fixedwidth.LazyFrame(records)
+
+        return (fixedwidth.LazyFrame(records, start, min(start + chunksize, records.nrows))
+                for start in xrange(0, records.nrows, chunksize))
+
+
+class CachedRecords:
+    """ Rows `first` on (`nrows` of them, if given) of the cached columns
+        `names`, which are loaded from the ColumnCache `cache` when they're
+        first used (see fixedwidth.LazyFrame).
+    """
+
+    def __init__(self, cache, names, keys, entries, first=0, nrows=None):
+        self.cache = cache
+        self.names = names
+        self.keys = keys
+        self.entries = entries
+
+        length = entries[names[0]]['length']
+
+        self.first = min(first, length)
+        self.nrows = length - self.first
+
+        if nrows is not None:
+            self.nrows = min(self.nrows, nrows)
+
+
+    def parseColumn(self, name, first, stop):
+        values = self.cache.load(self.keys[name], self.entries[name])
+
+        return values[self.first + first:self.first + stop]
+
+
+def writeAtomically(filename, write):
+    """ Call `write` with a file that replaces `filename` once it's written. """
+
+    partial = "%s.%d.partial" % (filename, os.getpid())
+
+    with open(partial, "wb") as f:
+        write(f)
+
+    os.rename(partial, filename)
@@ -0,0 +1,183 @@
+""" dedup.py
+
+    Duplicate statement suppression for streamed output.
+
+    A Redland Model only stores each statement once, but writers (see
+    writers.py) write whatever they're given. Some statements are added over
+    and over during an annotation:
+
+    - Constant statements, e.g. '_:o1_entity rdf:type foo:Entity', are added
+      once for every mapping (and chunk) of the observation. There are only
+      ever a few of these so they're kept in an exact set.
+    - Per-row statements are only repeated by templates that map the same
+      measurement of a row more than once. (An Observation's own statements,
+      e.g. '_:o1row0 rdf:type oboe:Observation', are only added by the first
+      of its mappings for each row, see Annotation.describeRows().) There are
+      too many of these to keep, so they can optionally be checked against a
+      Bloom filter of a fixed size instead. A Bloom filter can mistake a new
+      statement for one it has seen (and drop it), more often the fuller it
+      gets, so give it plenty of memory for the number of statements
+      expected.
+"""
+
+import numpy
+from pandas.util import hash_array
+
+from csvtotriples import rdfutils
+
+
+# Keys for the two independent hashes of each statement
+HASH_KEYS = ["csvtotriples-ha1", "csvtotriples-hb2"]
+
+
+def hashStatements(s, p, o, hash_key):
+    """ Returns a uint64 hash of each statement in the arrays of N-Triples
+        terms `s`, `p`, and `o`.
+    """
+
+    hs = hash_array(s, hash_key=hash_key)
+    hp = hash_array(p, hash_key=hash_key)
+    ho = hash_array(o, hash_key=hash_key)
+
+    # Multiply so the same terms in different positions hash differently
+    return hs ^ (hp * numpy.uint64(0x9E3779B97F4A7C15)) ^ (ho * numpy.uint64(0xC2B2AE3D27D4EB4F))
+
+
+class BloomFilter:
+    """ A Bloom filter of statements using `memory` bytes and `nhashes` bit
+        positions per statement.
+    """
+
+    def __init__(self, memory, nhashes=4):
+        self.bits = numpy.zeros(max(int(memory), 8), dtype=numpy.uint8)
+        self.nbits = numpy.uint64(len(self.bits) * 8)
+        self.nhashes = nhashes
+
+
+    def addMany(self, s, p, o):
+        """ Add the statements in the arrays `s`, `p`, and `o`.
+
+            Returns a boolean array of which statements were (probably)
+            already added, either earlier or earlier in the arrays.
+        """
+
+        h1 = hashStatements(s, p, o, HASH_KEYS[0])
+        h2 = hashStatements(s, p, o, HASH_KEYS[1])
+
+        # Bit positions by double hashing: h1 + i * h2
+        steps = numpy.arange(self.nhashes, dtype=numpy.uint64)
+        positions = (h1[:, numpy.newaxis] + steps * h2[:, numpy.newaxis]) % self.nbits
+
+        byte = (positions >> numpy.uint64(3)).astype(numpy.intp)
+        mask = (numpy.uint8(1) << (positions & numpy.uint64(7)).astype(numpy.uint8))
+
+        seen = ((self.bits[byte] & mask) != 0).all(axis=1)
+
+        # Statements repeated within the arrays haven't set their bits yet
+        first = numpy.zeros(len(h1), dtype=bool)
+        first[numpy.unique(h1, return_index=True)[1]] = True
+        seen |= ~first
+
+        numpy.bitwise_or.at(self.bits, byte[~seen].ravel(), mask[~seen].ravel())
+
+        return seen
+
+
+    def falsePositiveRate(self):
+        """ Returns the chance that a new statement is taken for one that's
+            already been added, at the filter's current fill.
+        """
+
+        filled = numpy.unpackbits(self.bits).sum() / float(self.nbits)
+
+        return filled ** self.nhashes
+
+
+class DedupWriter:
+    """ Wraps a writer (or any store that takes N-Triples terms) and only
+        passes on statements it hasn't seen before.
+
+        Constant statements, added on their own or with addMany() with three
+        single terms, are always checked exactly. Statements added as arrays
+        are checked against a BloomFilter of `memory` bytes if `memory` is
+        given, and passed on as they are otherwise.
+
+        With `hold` set, constant statements aren't passed on at all, only
+        kept in `constants` to be written elsewhere.
+    """
+
+    def __init__(self, writer, memory=None, hold=False):
+        self.writer = writer
+        self.constants = set()
+        self.bloom = BloomFilter(memory) if memory else None
+        self.hold = hold
+
+        # Number of duplicates suppressed by each part
+        self.nconstant = 0
+        self.nrow = 0
+
+
+    def size(self):
+        return self.writer.size()
+
+
+    def add(self, s, p, o):
+        if (s, p, o) in self.constants:
+            self.nconstant += 1
+            return
+
+        self.constants.add((s, p, o))
+
+        if not self.hold:
+            self.writer.add(s, p, o)
+
+
+    def addMany(self, s, p, o):
+        if type(s) is str and type(p) is str and type(o) is str:
+            self.add(s, p, o)
+            return
+
+        if self.bloom is not None:
+            s, p, o = rdfutils.broadcastTerms(s, p, o)
+            seen = self.bloom.addMany(s, p, o)
+
+            if seen.any():
+                self.nrow += int(seen.sum())
+                s, p, o = s[~seen], p[~seen], o[~seen]
+
+        self.writer.addMany(s, p, o)
+
+
+    def add_statement(self, statement):
+        self.add(rdfutils.ntriplesFromNode(statement.subject),
+                 rdfutils.ntriplesFromNode(statement.predicate),
+                 rdfutils.ntriplesFromNode(statement.object))
+
+
+    def suppressed(self):
+        """ Returns the number of duplicate statements suppressed. """
+
+        return self.nconstant + self.nrow
+
+
+    def report(self):
+        """ Returns a summary of the duplicates suppressed. """
+
+        report = "Suppressed %d duplicate statements (%d constant" % (self.suppressed(), self.nconstant)
+
+        if self.bloom is not None:
+            report += ", %d per-row, estimated false positive rate %.2g" % (self.nrow, self.bloom.falsePositiveRate())
+
+        return report + ")."
+
+
+    def flush(self):
+        self.writer.flush()
+
+
+    def checkpoint(self):
+        return self.writer.checkpoint()
+
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,226 @@
+""" downloads.py
+
+    Downloading remote datasets.
+
+    Datasets are streamed to disk a block at a time instead of being read
+    into memory. With a DatasetCache, downloads are kept in a cache directory
+    named after the SHA-256 of their content, with an index of which URL
+    they came from. A cached dataset is revalidated with the server (using
+    its ETag and Last-Modified date) before it's used again and only
+    downloaded again if it has changed.
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import tempfile
+import requests
+
+
+# Size of the blocks downloads are written and hashed in
+BLOCKSIZE = 1 << 20
+
+
+def download(url, filename, entry=None):
+    """ Stream `url` to `filename`, checking the length and, if the server
+        sends one, the checksum of what was received.
+
+        If `entry` is the cache entry (see DatasetCache) for an earlier copy,
+        the request is made conditional on the copy being out of date.
+
+        Returns the response and the SHA-256 of the content, or None for the
+        SHA-256 if the earlier copy is still up to date, in which case
+        nothing is written.
+    """
+
+    headers = {}
+
+    if entry is not None:
+        if entry.get('etag') is not None:
+            headers['If-None-Match'] = entry['etag']
+
+        if entry.get('last_modified') is not None:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    r = requests.get(url, headers=headers, stream=True)
+
+    # Without an earlier copy there's nothing to be up to date with
+    if r.status_code == 304 and entry is None:
+        r.close()
+
+        raise Exception("Status code was 304 for an unconditional request. Download of %s must have failed." % url)
+
+    if r.status_code == 304 or (r.status_code == 200 and unchanged(r, entry)):
+        r.close()
+
+        return r, None
+
+    if r.status_code != 200:
+        raise Exception("Status code was %d, not 200. Download of %s must have failed." % (r.status_code, url))
+
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    size = 0
+
+    with open(filename, "wb") as f:
+        for block in r.iter_content(BLOCKSIZE):
+            f.write(block)
+            sha256.update(block)
+            md5.update(block)
+            size += len(block)
+
+    # Check we got everything the server said it sent
+    length = r.headers.get('content-length')
+
+    if length is not None and 'content-encoding' not in r.headers and int(length) != size:
+        raise Exception("Download of %s was incomplete: got %d of %s bytes." % (url, size, length))
+
+    content_md5 = r.headers.get('content-md5')
+
+    if content_md5 is not None and base64.b64decode(content_md5) != md5.digest():
+        raise Exception("Download of %s doesn't match its Content-MD5 checksum." % url)
+
+    for digest in r.headers.get('digest', "").split(","):
+        algorithm, _, value = digest.strip().partition("=")
+
+        if algorithm.lower() == "sha-256" and base64.b64decode(value) != sha256.digest():
+            raise Exception("Download of %s doesn't match its SHA-256 Digest." % url)
+
+    return r, sha256.hexdigest()
+
+
+def unchanged(r, entry):
+    """ Whether the response `r` is for the same content as the cache
+        `entry`, for servers that ignore conditional requests: the ETag or
+        Last-Modified date and the length must match.
+    """
+
+    if entry is None or r.headers.get('content-length') != str(entry['size']):
+        return False
+
+    if entry.get('etag') is not None:
+        return r.headers.get('etag') == entry['etag']
+
+    return entry.get('last_modified') is not None and r.headers.get('last-modified') == entry['last_modified']
+
+
+def fileChecksum(filename):
+    """ Returns the SHA-256 of the content of `filename`. """
+
+    sha256 = hashlib.sha256()
+
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(BLOCKSIZE), ""):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+class DatasetCache:
+    """ A cache of downloaded datasets in `directory`.
+
+        Datasets are stored as objects/<sha256> and each URL has an entry in
+        urls/<sha1 of url>.json recording the object it was last downloaded
+        to and the ETag and Last-Modified date the server sent with it.
+
+        When `verify` is set, the checksum of a cached object is checked
+        every time it's used, not just when it's downloaded.
+    """
+
+    def __init__(self, directory, verify=False):
+        self.directory = directory
+        self.verify = verify
+
+        for subdirectory in ["objects", "urls"]:
+            path = os.path.join(directory, subdirectory)
+
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+
+    def objectFilename(self, checksum):
+        return os.path.join(self.directory, "objects", checksum)
+
+
+    def entryFilename(self, url):
+        return os.path.join(self.directory, "urls", "%s.json" % hashlib.sha1(url).hexdigest())
+
+
+    def entry(self, url):
+        """ Returns the cache entry for `url` if its object is present and
+            intact, or None.
+        """
+
+        filename = self.entryFilename(url)
+
+        if not os.path.isfile(filename):
+            return None
+
+        with open(filename, "rb") as f:
+            entry = json.load(f)
+
+        path = self.objectFilename(entry['sha256'])
+
+        if not os.path.isfile(path) or os.path.getsize(path) != entry['size']:
+            return None
+
+        if self.verify and fileChecksum(path) != entry['sha256']:
+            print "Cached copy of %s is corrupt, downloading it again." % url
+            return None
+
+        return entry
+
+
+    def fetch(self, url):
+        """ Returns the filename of an up to date copy of `url`, downloading
+            it only if it isn't cached or the server says it has changed.
+            If the server can't be reached, a cached copy is used as it is.
+        """
+
+        entry = self.entry(url)
+
+        partial = tempfile.NamedTemporaryFile(dir=os.path.join(self.directory, "objects"), suffix=".partial", delete=False)
+        partial.close()
+
+        try:
+            r, checksum = download(url, partial.name, entry)
+        except Exception as e:
+            os.remove(partial.name)
+
+            if entry is None or not isinstance(e, requests.exceptions.RequestException):
+                raise
+
+            print "Couldn't revalidate %s (%s), using the cached copy." % (url, e)
+
+            return self.objectFilename(entry['sha256'])
+
+        if checksum is None:
+            os.remove(partial.name)
+            print "Using cached copy of %s." % url
+
+            return self.objectFilename(entry['sha256'])
+
+        path = self.objectFilename(checksum)
+        os.rename(partial.name, path)
+
+        entry = {
+            'url': url,
+            'sha256': checksum,
+            'size': os.path.getsize(path),
+            'etag': r.headers.get('etag'),
+            'last_modified': r.headers.get('last-modified'),
+            'downloaded': time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+
+        filename = self.entryFilename(url)
+
+        with open(filename + ".partial", "wb") as f:
+            json.dump(entry, f, indent=2)
+
+        os.rename(filename + ".partial", filename)
+
+        print "Downloaded %s to %s." % (url, path)
+
+        return path
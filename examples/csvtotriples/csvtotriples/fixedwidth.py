@@ -0,0 +1,263 @@
+""" fixedwidth.py
+
+    A fast reader for fixed-width datasets with fixed-length records.
+
+    Instrument dumps like the Sargasso CTD profiles pad every line to the same
+    length, so where each row and field starts is known without scanning the
+    file for newlines. The file is memory-mapped and each field is read as a
+    strided view of the mapped buffer (a fixed-size string per row, a record
+    length apart) which is parsed straight into a NumPy array.
+
+    Columns are only parsed when they're first used (see LazyFrame). Integers
+    are parsed by NumPy and decimals by pandas.to_numeric(), which converts
+    them the same way pandas.read_fwf does (NumPy rounds some of them
+    differently, e.g. 33.002 where pandas gives 33.001999999999995). Fields
+    that aren't plain numbers, and columns with a declared dtype, are parsed
+    by pandas.read_fwf itself, so every column comes out the same as it
+    would from pandas.
+"""
+
+import mmap
+import numpy
+import pandas
+from StringIO import StringIO
+
+
+class FixedWidthFile:
+    """ The records of the fixed-width file `filename` from row `first` on
+        (`nrows` of them, if given), with columns `names` at the (start, end)
+        positions `colspecs` (see sniff.sniffColspecs()).
+
+        `dtypes` are the declared pandas dtypes of any of the columns and
+        `convert`, if given, is applied to each column (as a Series) after
+        it's parsed.
+
+        Raises an Exception if the records aren't all the same length.
+
+        The file stays mapped until close() is called (or the
+        FixedWidthFile is used as a context manager). Columns parsed before
+        then don't refer to the map and can still be used.
+    """
+
+    def __init__(self, filename, names, colspecs, first=0, nrows=None, dtypes=None, convert=None):
+        self.filename = filename
+        self.names = names
+        self.colspecs = dict(zip(names, colspecs))
+        self.dtypes = dtypes or {}
+        self.convert = convert
+
+        with open(filename, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self.index(first, nrows)
+        except:
+            self.close()
+            raise
+
+
+    def index(self, first, nrows):
+        """ Find the record length and the range of records to read,
+            checking that the records are all the same length.
+        """
+
+        filename = self.filename
+        size = len(self.buffer)
+        header = self.buffer.find("\n") + 1
+        self.length = self.buffer.find("\n", header) + 1 - header # Record length
+
+        # The last record might not end with a newline
+        if size > 0 and self.buffer[size - 1] != "\n":
+            size += 1
+
+        if header == 0 or self.length <= 0 or (size - header) % self.length != 0:
+            raise Exception("%s doesn't have fixed-length records." % filename)
+
+        nrecords = (size - header) // self.length
+        self.first = min(first, nrecords)
+        self.nrows = nrecords - self.first
+
+        if nrows is not None:
+            self.nrows = min(self.nrows, nrows)
+
+        self.offset = header + self.first * self.length
+
+        # Check that the records in range (but the last in the file) end
+        # where they should
+        newlines = self.fieldView(self.length - 1, self.length, 0, min(self.nrows, max(nrecords - self.first - 1, 0)))
+
+        if not (newlines == "\n").all():
+            raise Exception("%s doesn't have fixed-length records." % filename)
+
+
+    def close(self):
+        """ Unmap the file. """
+
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def fieldView(self, start, end, first, nrows):
+        """ Returns a view of the bytes `start` to `end` of `nrows` records
+            from record `first` (in range) as an array of strings, without
+            copying them.
+        """
+
+        if self.buffer is None:
+            raise Exception("%s has been closed." % self.filename)
+
+        if nrows <= 0:
+            return numpy.zeros(0, dtype="S%d" % (end - start))
+
+        return numpy.ndarray((nrows,), dtype="S%d" % (end - start), buffer=self.buffer,
+                             offset=self.offset + first * self.length + start, strides=(self.length,))
+
+
+    def parseColumn(self, name, first, stop):
+        """ Parse column `name` for records `first` to `stop` (in range) as
+            integers or, failing that, decimals, falling back on
+            pandas.read_fwf for anything else (see above).
+        """
+
+        start, end = self.colspecs[name]
+        view = self.fieldView(start, end, first, stop - first)
+        values = None
+
+        if name not in self.dtypes:
+            try:
+                values = view.astype(numpy.int64)
+            except (ValueError, OverflowError):
+                try:
+                    values = pandas.to_numeric(view)
+                except (ValueError, OverflowError):
+                    pass
+
+        if values is None:
+            options = {'colspecs': [(0, end - start)], 'header': None, 'names': [name], 'skip_blank_lines': False}
+
+            if name in self.dtypes:
+                options['dtype'] = {name: self.dtypes[name]}
+
+            values = pandas.read_fwf(StringIO("\n".join(view.tolist())), **options)[name].values
+
+        if self.convert is not None:
+            values = self.convert(pandas.Series(values)).values
+
+        return values
+
+
+class LazyFrame:
+    """ Records `start` to `stop` of a FixedWidthFile (or anything else with
+        the column `names`, the number of rows, `nrows`, and parseColumn()),
+        standing in for the DataFrame process() works on. Columns are parsed
+        when they're first used and returned as Series with this frame's
+        `index`.
+
+        Frames sliced or copied from one another share their parsed columns
+        (`parsed` is the range of records they're parsed for and a dict of
+        them by name).
+    """
+
+    def __init__(self, records, start=0, stop=None, index=None, parsed=None):
+        self.records = records
+        self.start = start
+        self.stop = records.nrows if stop is None else stop
+        self.index = index if index is not None else pandas.RangeIndex(0, self.stop - self.start)
+        self.columns = pandas.Index(records.names)
+        self.parsed = parsed if parsed is not None else (self.start, self.stop, {})
+
+
+    @property
+    def shape(self):
+        return (self.stop - self.start, len(self.columns))
+
+
+    def __len__(self):
+        return self.stop - self.start
+
+
+    def __contains__(self, name):
+        return name in self.columns
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+
+            if step != 1:
+                raise Exception("Rows of a LazyFrame can only be sliced contiguously.")
+
+            stop = max(start, stop)
+
+            return LazyFrame(self.records, self.start + start, self.start + stop, self.index[start:stop], self.parsed)
+
+        if key not in self.columns:
+            raise KeyError(key)
+
+        first, stop, columns = self.parsed
+
+        if key not in columns:
+            columns[key] = self.records.parseColumn(key, first, stop)
+
+        values = columns[key][self.start - first:self.stop - first]
+
+        return pandas.Series(values, index=self.index, name=key)
+
+
+    def copy(self, deep=False):
+        return LazyFrame(self.records, self.start, self.stop, self.index, self.parsed)
+
+
+    def close(self):
+        """ Close the records behind this frame (and any frames sliced or
+            copied from it), if they need closing. Only the columns already
+            parsed can be used afterwards.
+        """
+
+        if hasattr(self.records, "close"):
+            self.records.close()
+
+
+def closeFrame(dataset):
+    """ Close `dataset` if it's a LazyFrame. DataFrames are left alone. """
+
+    if isinstance(dataset, LazyFrame):
+        dataset.close()
+
+
+def readFixedWidth(filename, names, colspecs, first=0, nrows=None, chunksize=None, dtypes=None, convert=None):
+    """ Read the fixed-width file `filename` (see FixedWidthFile) lazily.
+
+        Returns a LazyFrame of the rows, which should be closed once it's no
+        longer needed (see closeFrame()), or, if `chunksize` is given, an
+        iterator over LazyFrames of (at most) `chunksize` rows, each parsed
+        separately so only one chunk's columns are in memory at a time. The
+        file is closed once the iterator moves past the last chunk (or is
+        closed itself).
+    """
+
+    records = FixedWidthFile(filename, names, colspecs, first, nrows, dtypes, convert)
+
+    if chunksize is None:
+        return LazyFrame(records)
+
+    return readChunks(records, chunksize)
+
+
+def readChunks(records, chunksize):
+    """ Yields LazyFrames of (at most) `chunksize` rows of the
+        FixedWidthFile `records`, closing it after the last one.
+    """
+
+    with records:
+        for start in xrange(0, records.nrows, chunksize):
+            yield LazyFrame(records, start, min(start + chunksize, records.nrows))
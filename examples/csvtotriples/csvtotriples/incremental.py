@@ -0,0 +1,420 @@
+""" incremental.py
+
+    Incremental output of an annotation.
+
+    Annotation.process() adds every statement to the Model, which is
+    serialized once processing is done. Graphs too big for that can be
+    processed by an IncrementalRun instead, which writes the statements out
+    as it goes, in one of two ways:
+
+    - Streaming: the Model is replaced with a writer (see writers.py), behind
+      a dedup.DedupWriter, that writes each statement as soon as it's added.
+    - Chunks: the dataset is read a number of rows at a time and the
+      statements for each chunk are written out before the next chunk is
+      read. Stores that keep the whole graph (see store.keepsChunks()) add
+      each chunk to the store instead.
+
+    Either way, the progress of the output can be saved in checkpoints every
+    so often (see checkpoint.py) so an interrupted run can be resumed.
+"""
+
+import os
+import pandas
+import RDF
+
+from csvtotriples import rdfutils
+from csvtotriples import writers
+from csvtotriples import store
+from csvtotriples import checkpoint
+from csvtotriples import dedup
+from csvtotriples import fixedwidth
+
+
+class IncrementalRun:
+    """ Processes the parsed Annotation `anno`, writing its statements out
+        as they're generated.
+
+        Set `stream` to write statements to the output as they're added
+        and/or `chunksize` to read the dataset that many rows at a time.
+
+        Set `checkpoint` to a number of seconds to save progress that often,
+        in the Annotation's `directory`, and `resume` to continue from the
+        last checkpoint of an earlier run.
+
+        Repeated constant statements are left out of the output. Set `bloom`
+        to a number of bytes to also leave out repeated per-row statements
+        using a Bloom filter of that size (see dedup.py). Set `hold` to hold
+        the constant statements back from streamed output altogether, so
+        they can be written once for several Annotations of the same template
+        (see parallel.py).
+    """
+
+    def __init__(self, anno, stream=False, chunksize=None, checkpoint=None, resume=False, bloom=None, hold=False):
+        self.anno = anno
+        self.stream = stream
+        self.chunksize = chunksize
+        self.bloom = bloom
+        self.hold = hold
+
+        # Output (see openOutput() and flush())
+        self.output = None # Output file, when flushing chunks
+        self.dedup = None
+
+        # Resuming interrupted runs (see openCheckpoint())
+        self.interval = checkpoint
+        self.resume = resume
+        self.checkpoint = None
+        self.written = None # Constant statements and Bloom filter bits resumed
+
+
+    def needsOutput(self):
+        """ Whether statements are written to an output file as they're
+            generated, rather than kept in the Annotation's store.
+        """
+
+        return self.stream or (self.chunksize is not None and not store.keepsChunks(self.anno.storage))
+
+
+    def process(self, outfile=None, format=None, validate=True, dataset=None):
+        """ Processes the Annotation like Annotation.process(), writing the
+            statements to `outfile` in `format` as it goes.
+
+            When streaming, statements are written in `format` as they're
+            generated instead of being stored in the Model. When processing
+            in chunks, the triples generated for each chunk are written out
+            before the next chunk is read, as N-Triples (which is also valid
+            Turtle) unless streaming too. Either way, the Annotation doesn't
+            need to be serialized afterwards. When the graph is stored on disk
+            or in a compact store, chunks are added to the store instead and
+            no output file is needed.
+
+            With a `checkpoint` interval, the progress of the output is saved
+            every so often and, with `resume`, a run that was interrupted is
+            continued from its last checkpoint: the output is cut off where
+            the checkpoint was saved and the rows and mappings before it
+            aren't processed again.
+
+            A DataFrame of the template's dataset that's already been loaded
+            (see batch.py) can be given as `dataset`, unless processing in
+            chunks.
+
+            The whole run is captured by the profile's cProfile/tracemalloc
+            if they're enabled, so chunks are traced together.
+        """
+
+        anno = self.anno
+        incremental = self.needsOutput()
+
+        if incremental and outfile is None:
+            raise Exception("An output file is required when streaming or processing in chunks.")
+
+        # Close the output if processing fails, so it isn't left truncated
+        # mid-batch (or, compressed, without its trailer) with its writer
+        # thread still running
+        finished = False
+        anno.profile.capture()
+
+        try:
+            # Download (if necessary) and load data
+            if dataset is not None:
+                if self.chunksize is not None:
+                    raise Exception("A dataset that's already loaded can't be processed in chunks.")
+
+                filename = None
+                anno.trackValues()
+
+                anno.beginPhase("load")
+                anno.useDataset(dataset)
+                anno.endPhase(anno.nrows)
+            else:
+                anno.beginPhase("download")
+                filename = anno.locateDataset()
+                anno.endPhase()
+
+            progress = None
+
+            if self.interval is not None and filename is not None:
+                if not incremental:
+                    raise Exception("Checkpoints need incremental output: stream or process in chunks.")
+
+                progress = self.openCheckpoint(filename, outfile, format)
+
+            skip = 0 # Rows done before the checkpoint
+            done = 0 # Mappings done for the rows after it
+
+            if progress is not None:
+                skip = progress['row'] - anno.start
+                done = progress['mapping']
+
+            if incremental:
+                self.openOutput(outfile, format, progress['offset'] if progress is not None else None)
+
+            if filename is not None and self.chunksize is None:
+                anno.beginPhase("load")
+                anno.loadDataset(filename, skip)
+                anno.endPhase(anno.nrows - skip)
+
+            # Process triples
+            if anno.start == 0 and progress is None:
+                anno.beginPhase("processTriples")
+                anno.processTriples()
+                anno.endPhase()
+
+            # Statements are only written out as they're added when streaming,
+            # so progress can be saved after each mapping
+            saved = self.saveCheckpoint if self.stream else None
+
+            # Process the mappings present
+            if filename is not None and self.chunksize is not None:
+                chunks = iter(anno.readDataset(filename, chunksize=self.chunksize, skip=skip))
+                anno.nrows = skip
+
+                while True:
+                    anno.beginPhase("load")
+                    chunk = next(chunks, None)
+
+                    if chunk is None:
+                        anno.endPhase()
+                        break
+
+                    anno.endPhase(chunk.shape[0])
+
+                    # Number rows from the start of the file, not the chunk
+                    first = anno.start + anno.nrows
+                    chunk.index = pandas.RangeIndex(first, first + chunk.shape[0])
+
+                    anno.dataset = chunk
+                    anno.nrows += chunk.shape[0]
+                    anno.processMappings(done, saved)
+                    done = 0
+
+                    anno.beginPhase("serialize")
+                    self.flush()
+                    anno.endPhase(chunk.shape[0])
+
+                    self.saveCheckpoint(anno.start + anno.nrows, 0)
+
+                print "Processed %d rows in chunks of %d." % (anno.nrows, self.chunksize)
+            else:
+                anno.processMappings(done, saved)
+
+            if validate:
+                anno.beginPhase("validate")
+                anno.validate()
+                anno.endPhase(anno.nrows or 0)
+
+            anno.beginPhase("serialize")
+
+            if anno.outfile is not None:
+                self.closeOutput()
+            else:
+                self.flush()
+
+            anno.endPhase()
+
+            finished = True
+        finally:
+            if not finished:
+                self.abortOutput()
+
+            anno.profile.release()
+
+            # Unmap a fixed-width dataset we loaded, not one we were given
+            if dataset is None:
+                fixedwidth.closeFrame(anno.dataset)
+
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+
+    def openCheckpoint(self, filename, outfile, format=None):
+        """ Set up checkpoints for annotating the dataset at `filename` into
+            `outfile`, keyed by a hash of the template and dataset.
+
+            When resuming, returns the progress saved in the last checkpoint
+            (see saveCheckpoint()) and restores the values used and number of
+            statements written of the Annotation. The statements already
+            written are kept in `written` for openOutput() to skip. Otherwise,
+            or if there's no checkpoint, returns None.
+        """
+
+        anno = self.anno
+
+        run = {
+            'outfile': os.path.abspath(outfile),
+            'format': writers.formatName(format) if self.stream else "ntriples",
+            'start': anno.start,
+            'nrows': anno.nrows,
+            'chunked': self.chunksize is not None,
+            'bloom': self.bloom if self.stream else None
+        }
+
+        if writers.compression(outfile) is not None:
+            raise Exception("Checkpoints can't be used with compressed output (%s)." % outfile)
+
+        key = checkpoint.checkpointKey(anno.template, filename)
+        self.checkpoint = checkpoint.Checkpoint(anno.directory, key, run, self.interval)
+
+        if not self.resume:
+            # Don't leave a checkpoint for an output we're about to overwrite
+            self.checkpoint.remove()
+
+            return None
+
+        saved = self.checkpoint.load()
+
+        if saved is None:
+            print "No checkpoint found in %s, starting from the beginning." % anno.directory
+
+            return None
+
+        progress, values, constants, bloom, described = saved
+        self.written = (constants, bloom)
+
+        for attribute in values:
+            anno.values[attribute] = values[attribute]
+
+        anno.described = described
+        anno.nflushed = progress['statements']
+
+        print "Resuming from row %d (%d mappings done) with %d statements written to %s." % \
+            (progress['row'], progress['mapping'], progress['statements'], outfile)
+
+        return progress
+
+
+    def saveCheckpoint(self, row, mapping):
+        """ Save a checkpoint, if one is due, after the first `mapping`
+            mappings have been processed for the rows from `row` onward. All
+            statements added so far must be in the output.
+        """
+
+        if self.checkpoint is None or not self.checkpoint.due():
+            return
+
+        anno = self.anno
+        anno.beginPhase("checkpoint")
+
+        # The dedup state is only consistent with the output once the
+        # queued statements are written, which checkpoint() waits for
+        if self.stream:
+            offset = anno.model.checkpoint()
+            constants = self.dedup.constants
+            bloom = self.dedup.bloom.bits if self.dedup.bloom is not None else None
+        else:
+            self.output.flush()
+            offset = self.output.tell()
+            constants = anno.constants
+            bloom = None
+
+        progress = {
+            'row': int(row),
+            'mapping': mapping,
+            'offset': offset,
+            'statements': anno.size()
+        }
+
+        self.checkpoint.save(progress, anno.values, constants, bloom, anno.described)
+        anno.endPhase()
+
+
+    def openOutput(self, filename, format=None, offset=None):
+        """ Open `filename` for incremental output, continuing from
+            `offset` if given (see writers.openOutputFile()).
+
+            When streaming, the Annotation's Model is replaced with a writer
+            for `format`, behind a dedup.DedupWriter, which are both run on a
+            separate thread (see writers.PipelinedWriter). Otherwise,
+            statements are written to the file by flush() as N-Triples,
+            whatever the format, because every chunk must be serialized
+            independently. N-Triples is also valid Turtle. Since the Model
+            only holds one chunk, the constant statements added are kept so
+            they're only added for the first chunk that has them.
+
+            When resuming, the statements written before the checkpoint are
+            taken as already added, so they aren't written again.
+
+            Files ending in .gz or .zst are compressed (see writers.py).
+        """
+
+        anno = self.anno
+
+        if self.stream:
+            writer = writers.createWriter(filename, format, anno.ns, offset)
+            self.dedup = dedup.DedupWriter(writer, self.bloom, self.hold)
+            anno.model = writers.PipelinedWriter(self.dedup)
+        else:
+            writers.formatName(format)
+            self.output = writers.openOutputFile(filename, offset)
+            anno.constants = set()
+
+        if offset is not None and self.written is not None:
+            constants, bloom = self.written
+
+            if self.stream:
+                self.dedup.constants.update(constants)
+
+                if bloom is not None:
+                    self.dedup.bloom.bits[:] = bloom
+            else:
+                anno.constants.update(constants)
+
+        anno.outfile = filename
+
+
+    def closeOutput(self):
+        """ Write any remaining statements and close the output file. """
+
+        self.flush()
+
+        if self.output is not None:
+            self.output.close()
+        else:
+            self.anno.model.close()
+
+        if self.dedup is not None:
+            print self.dedup.report()
+
+
+    def abortOutput(self):
+        """ Close the output file, if one is open, after processing has
+            failed: the statements already queued are written and the writer
+            thread is stopped, but the rest of the Model isn't flushed. Any
+            error closing it is left for the one processing ran into.
+        """
+
+        if self.anno.outfile is None:
+            return
+
+        try:
+            if self.output is not None:
+                self.output.close()
+            else:
+                self.anno.model.close()
+        except Exception as e:
+            print "Couldn't close %s cleanly after an error: %s" % (self.anno.outfile, e)
+
+
+    def flush(self):
+        """ Write the statements currently in the Annotation's Model to the
+            open output file and start over with an empty Model.
+
+            Blank node identifiers are derived from row numbers so statements
+            flushed from different chunks still link up in the output.
+
+            Writers and stores write out whatever they have buffered instead
+            (see Annotation.flush()).
+        """
+
+        anno = self.anno
+
+        if self.output is None or not isinstance(anno.model, RDF.Model):
+            anno.flush()
+            return
+
+        if anno.model.size() == 0:
+            return
+
+        anno.nflushed += anno.model.size()
+        self.output.write(rdfutils.serializeModelToString(anno.model, "ntriples"))
+        anno.model = rdfutils.createModel()
@@ -0,0 +1,197 @@
+""" parallel.py
+
+    Annotate a dataset using several processes.
+
+    The rows of the dataset are split into contiguous ranges and each range
+    is annotated by its own Annotation in a worker process, which streams
+    its statements to a part file. Blank node identifiers are derived from
+    row numbers so the parts can simply be concatenated into the output.
+    Constant statements, which every worker would add, are held back by the
+    workers and written once, in a part of their own that goes first.
+"""
+
+import os
+import shutil
+import multiprocessing
+import numpy
+
+from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import writers
+
+
+def countRows(filename, delimiter=None):
+    """ Returns the number of data rows in `filename` the way pandas reads
+        them, without parsing it: the records after the header, leaving out
+        blank ones. Records of a file with a `delimiter` can span several
+        lines (see annotation.blankRecords()).
+    """
+
+    rows = 0
+
+    for blank in annotation.blankRecords(filename, delimiter):
+        if not blank:
+            rows += 1
+
+    return max(rows - 1, 0)
+
+
+def splitRows(nrows, jobs):
+    """ Split `nrows` rows into at most `jobs` (start, nrows) ranges of about
+        the same size.
+    """
+
+    ranges = []
+    size, remainder = divmod(nrows, jobs)
+    start = 0
+
+    for i in range(jobs):
+        n = size + (1 if i < remainder else 0)
+
+        if n > 0:
+            ranges.append((start, n))
+
+        start += n
+
+    return ranges
+
+
+def annotateRows(task):
+    """ Worker: annotate one range of rows and stream the statements to a
+        part file.
+
+        Returns the number of statements written, the number of rows
+        annotated, which values of each attribute were used, the timings of
+        each phase, and the constant statements held back.
+    """
+
+    template, start, nrows, outfile, format, chunksize, cache, bloom = task
+
+    anno = annotation.Annotation(template, nrows=nrows, start=start, cache=cache)
+    anno.parse()
+
+    run = incremental.IncrementalRun(anno, stream=True, chunksize=chunksize, bloom=bloom, hold=True)
+    run.process(outfile, format, validate=False)
+
+    # Each worker checks the values of its own rows were all used
+    anno.validateValueUse()
+
+    return anno.size(), anno.nrows, anno.values, anno.profile.phases, run.dedup.constants
+
+
+def partFilename(outfile, index):
+    """ Returns the filename of part `index` of `outfile`. Parts of
+        compressed output keep its extension, so they're compressed too and
+        can be joined as they are (gzip and zstd files can be concatenated).
+    """
+
+    if writers.compression(outfile) is not None:
+        root, extension = os.path.splitext(outfile)
+
+        return "%s.part%d%s" % (root, index, extension)
+
+    return "%s.part%d" % (outfile, index)
+
+
+def annotate(template, outfile, jobs, nrows=None, format=None, chunksize=None, profile=None, cache=None, bloom=None):
+    """ Annotate the dataset for `template` with `jobs` worker processes and
+        write the statements to `outfile` in `format`.
+
+        Returns an Annotation that holds the combined row count, statement
+        count, value use, and phase timings (in `profile`, if given) of the
+        workers, which has been validated. The timings of the workers are
+        added up, so they can exceed the wall time of the whole run.
+
+        With a `cache` directory, the template is parsed once and the
+        workers load the parsed template from the cache. Each worker leaves
+        out the duplicate statements it finds itself, with a Bloom filter of
+        `bloom` bytes if given (see dedup.py).
+    """
+
+    anno = annotation.Annotation(template, nrows=nrows, profile=profile, cache=cache)
+    anno.parse()
+
+    # Download the dataset once, before the workers need it
+    filename = anno.locateDataset()
+
+    if filename is None:
+        print "No data_identifier in the template, annotating in a single process."
+
+        anno = annotation.Annotation(template, nrows=nrows, profile=profile, cache=cache)
+        anno.parse()
+
+        incremental.IncrementalRun(anno, stream=True, bloom=bloom).process(outfile, format)
+
+        return anno
+
+    # Parse and cache the dataset's columns once, before the workers need them
+    if cache is not None:
+        anno.readDataset(filename)
+
+    total = countRows(filename, anno.sniffFormat(filename)['delimiter'])
+
+    if nrows is not None:
+        total = min(nrows, total)
+
+    tasks = []
+
+    for i, (start, n) in enumerate(splitRows(total, jobs)):
+        partfile = partFilename(outfile, i)
+        tasks.append((template, start, n, partfile, format, chunksize, cache, bloom))
+
+    print "Annotating %d rows with %d processes." % (total, len(tasks))
+
+    pool = multiprocessing.Pool(jobs)
+
+    try:
+        results = pool.map(annotateRows, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Write the constant statements the workers held back once, first
+    constants = set()
+
+    for result in results:
+        constants.update(result[4])
+
+    partfiles = [partFilename(outfile, len(tasks))] + [task[3] for task in tasks]
+    writer = writers.createWriter(partfiles[0], format, anno.ns)
+
+    for s, p, o in sorted(constants):
+        writer.add(s, p, o)
+
+    writer.close()
+
+    # Merge the part files, in order, into the output
+    with open(outfile, "wb") as f:
+        for partfile in partfiles:
+            with open(partfile, "rb") as part:
+                shutil.copyfileobj(part, f, 1 << 20)
+
+            os.remove(partfile)
+
+    # Combine the accounting from each worker
+    anno.nflushed = len(constants)
+    anno.nrows = 0
+
+    for attribute in anno.values:
+        anno.values[attribute] = numpy.zeros(total, dtype=bool)
+
+    for task, (size, rows, values, phases, held) in zip(tasks, results):
+        start = task[1]
+
+        anno.nflushed += size
+        anno.nrows += rows
+        anno.profile.merge(phases)
+
+        for attribute in values:
+            anno.values[attribute][start:start + rows] = annotation.trimRows(values[attribute], rows)
+
+    anno.outfile = outfile
+
+    anno.beginPhase("validate")
+    anno.validate()
+    anno.endPhase(anno.nrows)
+
+    return anno
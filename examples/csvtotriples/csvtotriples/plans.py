@@ -0,0 +1,139 @@
+""" plans.py
+
+    Compiled annotation templates.
+
+    Parsing a template fills in the sections of an Annotation (namespaces,
+    observations, entities, mappings, ...). addValues() then needs the
+    N-Triples terms for the observation, context, entity, characteristic,
+    standard, and datatype of each measurement it adds values for. An
+    emission plan holds all of those for one measurement key, resolved once
+    instead of looked up and expanded for every mapping.
+
+    Parsed templates and their plans can be cached on disk, keyed by a hash
+    of the template's content, so later runs with the same template don't
+    need to parse it again.
+"""
+
+import os
+import hashlib
+import cPickle as pickle
+
+from csvtotriples import rdfutils
+
+
+# Bump when the parsed sections or plans change shape to invalidate caches
+VERSION = 2
+
+# Sections of a parsed template, as Annotation attributes
+SECTIONS = ["meta", "ns", "triples", "observations", "contexts", "measurements", "entities",
+            "characteristics", "standards", "conversions", "datatypes", "dtypes", "mappings"]
+
+# Predicates and classes used in every plan
+PREDICATES = {
+    'type': 'rdf:type',
+    'label': 'rdf:label',
+    'hasValue': 'oboe:hasValue',
+    'hasMeasurement': 'oboe:hasMeasurement',
+    'hasContext': 'oboe:hasContext',
+    'ofEntity': 'oboe:ofEntity',
+    'ofCharacteristic': 'oboe:ofCharacteristic',
+    'usesStandard': 'oboe:usesStandard'
+}
+
+CLASSES = {
+    'Measurement': 'oboe:Measurement',
+    'Observation': 'oboe:Observation'
+}
+
+
+def compilePlan(anno, key):
+    """ Returns the emission plan for measurement `key` of the parsed
+        Annotation `anno`: a dict of the terms addValues() needs.
+
+        Blank nodes that differ by row ('observation', 'context') are given
+        as the prefix the row number is appended to. Parts the measurement
+        doesn't have are None.
+    """
+
+    plan = {}
+
+    for name in PREDICATES:
+        plan[name] = anno.resolveTerm(PREDICATES[name], 'p')
+
+    for name in CLASSES:
+        plan[name] = anno.resolveTerm(CLASSES[name], 'o')
+
+    plan['observation'] = None
+    plan['context'] = None
+    plan['entity'] = None
+    plan['entity_type'] = None
+
+    if key in anno.observations:
+        observation_key = anno.observations[key]
+        plan['observation'] = "_:" + observation_key + "row"
+
+        if observation_key in anno.contexts:
+            plan['context'] = "_:" + anno.contexts[observation_key] + "row"
+
+        if observation_key in anno.entities:
+            plan['entity'] = "_:" + observation_key + "_entity"
+            plan['entity_type'] = anno.resolveTerm(anno.entities[observation_key], 'o')
+
+    # Characteristics are used as URIs as they are, without expanding them
+    plan['characteristic_type'] = None
+
+    if key in anno.characteristics:
+        plan['characteristic_type'] = rdfutils.ntriplesUri(anno.characteristics[key])
+
+    plan['standard_type'] = None
+
+    if key in anno.standards:
+        plan['standard_type'] = anno.resolveTerm(anno.standards[key], 'o')
+
+    plan['datatype'] = anno.datatypes.get(key)
+
+    return plan
+
+
+def templateKey(template):
+    """ Returns a hash of the content of the file `template`. """
+
+    digest = hashlib.sha1(str(VERSION))
+
+    with open(template, "rb") as f:
+        digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def cacheFilename(directory, template):
+    return os.path.join(directory, "%s.template.pickle" % templateKey(template))
+
+
+def loadTemplate(directory, template):
+    """ Returns the parsed sections and plans cached in `directory` for the
+        content of `template`, or None if they aren't cached.
+    """
+
+    filename = cacheFilename(directory, template)
+
+    if not os.path.isfile(filename):
+        return None
+
+    with open(filename, "rb") as f:
+        return pickle.load(f)
+
+
+def saveTemplate(directory, template, compiled):
+    """ Cache the parsed sections and plans in `compiled` in `directory`. """
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    filename = cacheFilename(directory, template)
+    partial = filename + ".partial"
+
+    with open(partial, "wb") as f:
+        pickle.dump(compiled, f, pickle.HIGHEST_PROTOCOL)
+
+    os.rename(partial, filename)
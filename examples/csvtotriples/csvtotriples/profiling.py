@@ -0,0 +1,215 @@
+""" profiling.py
+
+    Per-phase timing of an annotation.
+
+    An Annotation records the wall time, number of statements added, and
+    number of rows handled by each phase of its work (parse, download, load,
+    processTriples, each mapping, validate, serialize) in a Profile. Phases
+    that run more than once, e.g. a mapping processed chunk by chunk, are
+    added up. A phase that begins while another is running is nested in it,
+    and its time and statements are left out of the outer phase's.
+
+    Optionally, processing can also be run under cProfile and/or tracemalloc
+    to find the functions and lines the time and memory go to. Without
+    tracemalloc (it isn't in Python 2's standard library), the peak resident
+    memory of the process is recorded after each phase instead.
+"""
+
+import sys
+import json
+import time
+import cProfile
+import pstats
+import resource
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class Profile:
+    """ Accumulates timings for the phases of an annotation, in the order
+        they first ran.
+
+        With `calls` set, processing (see capture()) is run under cProfile.
+        With `memory` set, memory allocated during processing is traced with
+        tracemalloc, if it's installed, and the peak memory of the process
+        is recorded for each phase.
+    """
+
+    def __init__(self, calls=False, memory=False):
+        self.phases = []
+        self.index = {} # Phase name -> index in self.phases
+        self.running = [] # [phase, start, statements before, nested seconds, nested statements] of each running phase
+        self.captures = 0 # Number of capture()s not yet released
+
+        self.profiler = cProfile.Profile() if calls else None
+        self.memory = memory
+        self.trace = memory and tracemalloc is not None
+
+        if memory and tracemalloc is None:
+            print "Warning: tracemalloc is not installed, only recording the peak memory of the process."
+
+        self.snapshot = None
+        self.peak = 0
+
+
+    def begin(self, phase, nstatements):
+        """ Start timing `phase`, nested in the phase that's running if there
+            is one. `nstatements` is the number of statements added so far,
+            so the number added during the phase can be found.
+        """
+
+        self.running.append([phase, time.time(), nstatements, 0.0, 0])
+
+
+    def end(self, nstatements, nrows=0):
+        """ Stop timing the innermost running phase, which added statements
+            until there were `nstatements` and handled `nrows` rows.
+        """
+
+        if len(self.running) == 0:
+            return
+
+        phase, start, before, nested_seconds, nested_statements = self.running.pop()
+        seconds = time.time() - start
+
+        # Count the phase's time and statements once, not in its outer phase too
+        if len(self.running) > 0:
+            self.running[-1][3] += seconds
+            self.running[-1][4] += nstatements - before
+
+        peak = peakMemory() if self.memory else None
+
+        self.record(phase, seconds - nested_seconds, nstatements - before - nested_statements, nrows, peak=peak)
+
+
+    def record(self, phase, seconds, nstatements, nrows, calls=1, peak=None):
+        """ Add a run of `phase` to its totals. `peak` is the peak memory of
+            the process, in bytes, once it finished, if it's known.
+        """
+
+        if phase not in self.index:
+            self.index[phase] = len(self.phases)
+            self.phases.append({'phase': phase, 'seconds': 0.0, 'statements': 0, 'rows': 0, 'calls': 0})
+
+        totals = self.phases[self.index[phase]]
+        totals['seconds'] += seconds
+        totals['statements'] += nstatements
+        totals['rows'] += nrows
+        totals['calls'] += calls
+
+        if peak is not None:
+            totals['peak_bytes'] = max(totals.get('peak_bytes', 0), peak)
+
+
+    def merge(self, phases):
+        """ Add the phases of another Profile (e.g. from a worker process) to
+            this one's totals.
+        """
+
+        for totals in phases:
+            self.record(totals['phase'], totals['seconds'], totals['statements'], totals['rows'], totals['calls'],
+                        totals.get('peak_bytes'))
+
+
+    def capture(self):
+        """ Start capturing calls and/or memory. Captures nest: only the
+            first starts capturing, and it goes on until each one has been
+            released.
+        """
+
+        self.captures += 1
+
+        if self.captures > 1:
+            return
+
+        if self.profiler is not None:
+            self.profiler.enable()
+
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+    def release(self):
+        """ Release a capture(). Once they're all released, stop capturing
+            and take the snapshot of memory allocated while capturing.
+        """
+
+        if self.captures == 0:
+            return
+
+        self.captures -= 1
+
+        if self.captures > 0:
+            return
+
+        if self.profiler is not None:
+            self.profiler.disable()
+
+        if self.trace and tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        elif self.memory:
+            self.peak = max(self.peak, peakMemory())
+
+
+    def report(self, limit=30):
+        """ Returns the phases, and the top `limit` functions by cumulative
+            time and lines by memory allocated (or just the peak memory,
+            without tracemalloc) if they were captured, as a dict.
+        """
+
+        report = {
+            'seconds': sum(totals['seconds'] for totals in self.phases),
+            'phases': self.phases
+        }
+
+        if self.profiler is not None:
+            stats = pstats.Stats(self.profiler)
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+
+            report['functions'] = [{
+                'function': "%s:%d(%s)" % function,
+                'calls': ncalls,
+                'seconds': tottime,
+                'cumulative_seconds': cumtime
+            } for function, (primitive, ncalls, tottime, cumtime, callers) in functions[:limit]]
+
+        if self.snapshot is not None:
+            report['memory'] = {
+                'peak_bytes': self.peak,
+                'lines': [{
+                    'line': str(statistic.traceback),
+                    'bytes': statistic.size,
+                    'blocks': statistic.count
+                } for statistic in self.snapshot.statistics("lineno")[:limit]]
+            }
+        elif self.memory:
+            report['memory'] = {
+                'peak_bytes': self.peak,
+                'source': "ru_maxrss"
+            }
+
+        return report
+
+
+    def write(self, filename):
+        """ Write the report to `filename` as JSON. """
+
+        with open(filename, "wb") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def peakMemory():
+    """ Returns the peak resident memory of this process in bytes. """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on OS X and kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak
+
+    return peak * 1024
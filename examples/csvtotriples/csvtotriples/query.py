@@ -0,0 +1,162 @@
+""" query.py
+
+    Triple-pattern queries over generated graphs.
+
+    A TripleIndex numbers the terms of a graph (see store.CompactStore) and
+    keeps its statements sorted three ways: by subject, predicate, object
+    (SPO), by predicate, object, subject (POS), and by object, subject,
+    predicate (OSP). Whichever terms of a pattern are given, they're the
+    leading terms of one of those orders, so the statements matching the
+    pattern are a contiguous range of it, found by binary search without
+    scanning the graph. Each order is only sorted the first time a pattern
+    needs it.
+"""
+
+import numpy
+import RDF
+
+from csvtotriples import rdfutils
+from csvtotriples import store
+
+
+# Positions of the subject, predicate, and object in each sort order
+ORDERS = [
+    ('spo', (0, 1, 2)),
+    ('pos', (1, 2, 0)),
+    ('osp', (2, 0, 1))
+]
+
+# Statements converted at a time when indexing a Redland or SQLite store
+BATCHSIZE = 10000
+
+
+class TripleIndex:
+    """ Pattern queries over the (n, 3) array of term IDs `triples`, with
+        the term IDs `ids` by N-Triples term and the terms by ID, `terms`.
+        The statements must be unique and in SPO order, as a CompactStore
+        keeps them.
+    """
+
+    def __init__(self, triples, ids, terms):
+        self.triples = triples
+        self.ids = ids
+        self.terms = numpy.array(terms, dtype=object)
+        self.orders = {} # (permutation, sorted columns) by order name
+
+
+    def __len__(self):
+        return len(self.triples)
+
+
+    def sortedOrder(self, name, positions):
+        """ Returns the permutation that sorts the statements in the order
+            `name` and the sorted columns at `positions`, sorting them the
+            first time.
+        """
+
+        if name not in self.orders:
+            if name == "spo":
+                permutation = numpy.arange(len(self.triples))
+            else:
+                permutation = store.sortOrder(self.triples, positions)
+
+            columns = [self.triples[permutation, position] for position in positions]
+
+            self.orders[name] = (permutation, columns)
+
+        return self.orders[name]
+
+
+    def rows(self, s=None, p=None, o=None):
+        """ Returns the rows of the statements matching the pattern of
+            N-Triples terms `s`, `p`, and `o`, where None matches anything.
+        """
+
+        pattern = [s, p, o]
+
+        if all(term is None for term in pattern):
+            return numpy.arange(len(self.triples))
+
+        # Terms that aren't in the graph can't match anything
+        ids = [self.ids.get(term) if term is not None else None for term in pattern]
+
+        if any(ids[i] is None for i in range(3) if pattern[i] is not None):
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        nbound = len([term for term in pattern if term is not None])
+
+        for name, positions in ORDERS:
+            if all(pattern[position] is not None for position in positions[:nbound]):
+                break
+
+        permutation, columns = self.sortedOrder(name, positions)
+        start, stop = 0, len(permutation)
+
+        for position, column in zip(positions[:nbound], columns):
+            # Searching for a Python int would convert the whole column
+            value = column.dtype.type(ids[position])
+            first = numpy.searchsorted(column[start:stop], value, "left")
+            last = numpy.searchsorted(column[start:stop], value, "right")
+            start, stop = start + first, start + last
+
+        return permutation[start:stop]
+
+
+    def match(self, s=None, p=None, o=None):
+        """ Returns the statements matching the pattern `s`, `p`, `o` (see
+            rows()) as a list of (s, p, o) tuples of N-Triples terms.
+        """
+
+        return map(tuple, self.terms[self.triples[self.rows(s, p, o)]])
+
+
+    def count(self, s=None, p=None, o=None):
+        """ Returns the number of statements matching the pattern `s`, `p`,
+            `o` (see rows()).
+        """
+
+        return len(self.rows(s, p, o))
+
+
+def indexModel(model):
+    """ Returns a TripleIndex of the statements in `model`, a CompactStore,
+        SQLiteStore, or Redland RDF.Model. Statements in stores other than
+        a CompactStore are numbered into one first.
+    """
+
+    if isinstance(model, store.CompactStore):
+        compact = model
+    else:
+        compact = store.CompactStore(BATCHSIZE)
+
+        if isinstance(model, RDF.Model):
+            batches = redlandBatches(model)
+        else:
+            batches = model.batches()
+
+        for batch in batches:
+            compact.addMany(*[numpy.array(column, dtype=object) for column in zip(*batch)])
+
+    compact.flush()
+
+    return TripleIndex(compact.triples, compact.ids, compact.terms)
+
+
+def redlandBatches(model, batchsize=BATCHSIZE):
+    """ Yields the statements in the RDF.Model `model` as lists of (s, p, o)
+        tuples of N-Triples terms, `batchsize` at a time.
+    """
+
+    batch = []
+
+    for statement in model:
+        batch.append((rdfutils.ntriplesFromNode(statement.subject),
+                      rdfutils.ntriplesFromNode(statement.predicate),
+                      rdfutils.ntriplesFromNode(statement.object)))
+
+        if len(batch) >= batchsize:
+            yield batch
+            batch = []
+
+    if len(batch) > 0:
+        yield batch
@@ -5,17 +5,27 @@
 """
 
 import RDF
+import numpy
 
 
-def createModel():
+def createModel(storage="memory", directory=".", name="autoannotate", new=True):
     """
-        Creates an in-memory RDF store using redland.
+        Creates an RDF store using redland.
         Adapted from previous work by mbjones.
+
+        `storage` is the hash type, either 'memory' or 'bdb' for Berkeley DB
+        files kept in `directory`. Set `new` to False to open an existing
+        'bdb' store instead of starting over.
     """
 
+    if storage not in ["memory", "bdb"]:
+        raise Exception("Unsupported Redland storage %s." % storage)
+
+    options = "new='%s',hash-type='%s',dir='%s'" % ("yes" if new else "no", storage, directory)
+
     storage = RDF.Storage(storage_name="hashes",
-                          name="autoannotate",
-                          options_string="new='yes',hash-type='memory',dir='.'")
+                          name=name,
+                          options_string=options)
 
     if storage is None:
         raise Exception("new RDF.Storage failed")
@@ -45,6 +55,23 @@ def serializeModel(model, ns, filename, format=None):
     serializer.serialize_model_to_file(filename, model)
 
 
+def serializeModelToString(model, format=None, ns=None):
+    """
+        Serializes `model` in `format` and returns the result as a string.
+    """
+
+    if format == None:
+        format = "turtle"
+
+    serializer=RDF.Serializer(name=format)
+
+    if ns is not None:
+        for prefix in ns:
+            serializer.set_namespace(prefix, RDF.Uri(ns[prefix]))
+
+    return serializer.serialize_model_to_string(model)
+
+
 def addStatement(model, s, p, o):
     """
         Adds the triple (s, o, p) to the model (model).
@@ -77,3 +104,151 @@ def addStatement(model, s, p, o):
         raise Exception("new RDF.Statement failed")
 
     model.add_statement(statement)
+
+
+""" N-Triples terms
+
+    Statements generated from the data are built as columns of N-Triples
+    terms, i.e. strings like '<http://foo.org/foo#A>', '_:m1_row0', or
+    '"1.5"^^<http://www.w3.org/2001/XMLSchema#decimal>'. The functions below
+    create terms and convert them to Redland nodes.
+"""
+
+def ntriplesUri(uri):
+    """ Returns the N-Triples term for the URI string `uri`. """
+
+    return "<%s>" % uri
+
+
+def ntriplesBlank(identifier):
+    """ Returns the N-Triples term for the blank node `identifier`. """
+
+    return "_:%s" % identifier
+
+
+def ntriplesEscape(value):
+    """ Escapes `value` for use inside an N-Triples literal. """
+
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+
+
+def ntriplesUnescape(value):
+    """ Reverses ntriplesEscape(). """
+
+    if "\\" not in value:
+        return value
+
+    return value.decode("string_escape")
+
+
+def ntriplesLiteral(value, datatype=None, language=None):
+    """ Returns the N-Triples term for the literal `value`, optionally typed
+        with the datatype URI string `datatype` or tagged with `language`.
+    """
+
+    term = '"%s"' % ntriplesEscape(value)
+
+    if datatype is not None:
+        term += "^^<%s>" % datatype
+    elif language:
+        term += "@%s" % language
+
+    return term
+
+
+def ntriplesLiterals(values, datatype=None):
+    """ Vectorized ntriplesLiteral() for a pandas Series of strings.
+
+        Returns a numpy object array of terms. Escaping is only done for the
+        values that need it.
+    """
+
+    values = values.astype(object)
+    needs_escape = values.str.contains('[\\\\"\n\r]').values
+
+    if needs_escape.any():
+        values[needs_escape] = values[needs_escape].map(ntriplesEscape)
+
+    suffix = '"'
+
+    if datatype is not None:
+        suffix += "^^<%s>" % datatype
+
+    return ('"' + values + suffix).values
+
+
+def nodeFromNTriples(term):
+    """ Returns the RDF.Node for the N-Triples term `term`. """
+
+    if term[0] == "<":
+        return RDF.Node(uri_string=term[1:-1])
+
+    if term[0:2] == "_:":
+        return RDF.Node(blank=term[2:])
+
+    # Literal, possibly with a datatype or language
+    end = term.rindex('"')
+    value = ntriplesUnescape(term[1:end])
+    suffix = term[end+1:]
+
+    if suffix.startswith("^^"):
+        return RDF.Node(literal=value, datatype=RDF.Uri(suffix[3:-1]))
+    elif suffix.startswith("@"):
+        return RDF.Node(literal=value, language=suffix[1:])
+
+    return RDF.Node(literal=value)
+
+
+def ntriplesFromNode(node):
+    """ Returns the N-Triples term for the RDF.Node or RDF.Uri `node`. """
+
+    if isinstance(node, RDF.Uri):
+        return ntriplesUri(str(node))
+
+    if node.is_resource():
+        return ntriplesUri(str(node.uri))
+
+    if node.is_blank():
+        return ntriplesBlank(node.blank_identifier)
+
+    literal = node.literal_value
+    datatype = literal['datatype']
+
+    if datatype is not None:
+        datatype = str(datatype)
+
+    return ntriplesLiteral(literal['string'], datatype, literal['language'])
+
+
+def broadcastTerms(s, p, o):
+    """ Broadcasts any mix of single terms and arrays of terms `s`, `p`, and
+        `o` into three equal-length numpy object arrays.
+    """
+
+    n = max(len(t) if isinstance(t, numpy.ndarray) else 1 for t in (s, p, o))
+    columns = []
+
+    for t in (s, p, o):
+        if isinstance(t, numpy.ndarray):
+            columns.append(t)
+        else:
+            column = numpy.empty(n, dtype=object)
+            column[:] = t
+            columns.append(column)
+
+    return columns
+
+
+def addNTriples(model, s, p, o, node=nodeFromNTriples):
+    """ Adds statements made from the N-Triples terms (or arrays of terms)
+        `s`, `p`, and `o` to the model. Single terms are repeated for every
+        statement.
+
+        `node` is used to convert terms to RDF.Nodes and can be replaced with
+        a cached version (see terms.TermCache).
+    """
+
+    s, p, o = broadcastTerms(s, p, o)
+
+    for i in range(len(s)):
+        model.add_statement(RDF.Statement(node(s[i]), node(p[i]), node(o[i])))
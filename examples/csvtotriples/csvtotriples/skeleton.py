@@ -4,53 +4,30 @@
 """
 
 import sys
-import re
-import pandas
 import csv
 
+from csvtotriples import sniff
+
 
 def main():
-    # Open file with Pandas
     if len(sys.argv) != 2:
-        print "Unexpected number of command line arguments. Expected `python skeleton.py some_dataset.csv`"
+        print "Unexpected number of command line arguments. Expected `python -m csvtotriples.skeleton some_dataset.csv`"
         sys.exit()
 
     filename = sys.argv[1]
 
-    """ Extract the column names
-        First, check if the file is *.csv
-        Use pandas.read_csv because I'm sure pandas is less error-prone
-
-        Otherwise, detect it from what's inside the first line of the file.
+    """ Extract the column names from the header, detecting the format from
+        the first few KB of the file so that large datasets aren't loaded.
     """
 
-    if re.search("\A.+\.csv\Z", filename):
-        dataset = pandas.read_csv(filename)
+    dataset_format = sniff.sniffFormat(filename)
 
-        columns = dataset.columns.tolist()
+    if dataset_format['delimiter'] is None:
+        print "Reading in dataset as FWF."
     else:
-        with open(filename, "rb") as f:
-            header_line = f.readline()
-
-            """ Autodetect file format using these rules:
-
-                CSV: Has commas
-                TSV: Has tabs
-                FWF: Has neither
-            """
+        print "Reading in dataset as %s." % dataset_format['format'].upper()
 
-            # CSV
-            if len(header_line.split(",")) > 1:     #CSV
-                print "Reading in dataset as CSV."
-                dataset = pandas.read_fwf(filename)
-            elif len(header_line.split("\t")) > 1:  # TSV
-                print "Reading in dataset as TSV."
-                dataset = pandas.read_table(filename)
-            else:
-                print "Reading in dataset as FWF."
-                dataset = pandas.read_fwf(filename) #FWF
-
-            columns = dataset.columns.tolist()
+    columns = dataset_format['columns']
 
     # Do work for each column
     outfilename = "skeleton-%s.csv" % filename
@@ -72,9 +49,9 @@ def main():
         index = 1
         for column in columns:
             writer.writerow(['#'+column])
-            writer.writerow(['observation', 'o'+str(index)])
+            writer.writerow(['observation', 'o'+str(index), '', ''])
             writer.writerow(['', 'entity', 'e'+str(index), 'foo:EditMe'])
-            writer.writerow(['', 'measurement', 'm'+str(index)])
+            writer.writerow(['', 'measurement', 'm'+str(index), ''])
             writer.writerow(['', '', 'characteristic', 'foo:EditMe'])
             writer.writerow(['', '', 'standard', 'foo:EditMe'])
             writer.writerow(['', '', 'datatype', 'foo:EditMe'])
@@ -92,17 +69,16 @@ def main():
 
         index = 1
         for column in columns:
-            writer.writerow([column, 'm'+str(index)])
+            writer.writerow([column, 'm'+str(index), '', ''])
             index += 1
 
 
-        # Datatypes
-        writer.writerow(['DATATYPES'])
+        # Dtypes, commented out until they're filled in
+        writer.writerow(['DTYPES'])
+        writer.writerow(['#attribute', 'pandas dtype, e.g. int16, float32, str, or category'])
 
-        index = 1
         for column in columns:
-            writer.writerow([column, 'm'+str(index)])
-            index += 1
+            writer.writerow(['#'+column, ''])
 
     print "Created template at `%s`." % outfilename
 
@@ -0,0 +1,157 @@
+""" sniff.py
+
+    Detecting the format of a dataset from a sample of its first few KB.
+
+    Datasets are delimited (CSV, TSV, ...) or fixed-width text files with a
+    header line of column names. Only the start of the file is read, so the
+    format of a multi-GB dataset can be found without loading it. A header
+    line longer than the sample, e.g. for a dataset with thousands of
+    columns, is read in full.
+"""
+
+import csv
+import re
+import numpy
+
+
+# Bytes read from the start of a dataset
+SAMPLE_SIZE = 64 << 10
+
+# Lines of the sample used to infer fixed-width columns, like pandas.read_fwf
+FWF_LINES = 101
+
+# Delimiters tried, in order of preference
+DELIMITERS = [",", "\t", ";", "|"]
+
+# Names of the formats with common delimiters
+FORMATS = {",": "csv", "\t": "tsv"}
+
+
+def readSample(filename, size=SAMPLE_SIZE):
+    """ Returns the complete lines in the first `size` bytes of `filename`,
+        and at least the first line.
+    """
+
+    with open(filename, "rb") as f:
+        sample = f.read(size)
+
+        # Finish the header line if it's longer than the sample
+        while "\n" not in sample and "\r" not in sample:
+            block = f.read(size)
+
+            if len(block) == 0:
+                break
+
+            sample += block
+
+        complete = len(f.read(1)) == 0
+
+    lines = sample.splitlines()
+
+    # Drop the last line if it was cut off
+    if not complete and not sample.endswith("\n") and len(lines) > 1:
+        lines = lines[:-1]
+
+    return lines
+
+
+def sniffDelimiter(lines):
+    """ Returns the delimiter of the sample `lines`, or None if they don't
+        look delimited (e.g. they're fixed-width).
+
+        A delimiter must split the header into more than one field. The first
+        one that splits every line into as many fields as the header is used,
+        or else the first one that splits the header.
+    """
+
+    candidates = [delimiter for delimiter in DELIMITERS if delimiter in lines[0]]
+
+    for delimiter in candidates:
+        counts = set(len(row) for row in csv.reader(lines, delimiter=delimiter))
+
+        if len(counts) == 1:
+            return delimiter
+
+    if len(candidates) > 0:
+        return candidates[0]
+
+    return None
+
+
+def sniffColspecs(lines, nlines=FWF_LINES):
+    """ Infer the (start, end) character positions of the columns of the
+        fixed-width sample `lines` from the first `nlines` of them, the same
+        way pandas.read_fwf does. Columns are runs of positions where any
+        line has a character other than a space or tab.
+    """
+
+    lines = [line.rstrip("\r\n") for line in lines[:nlines]]
+
+    width = max(len(line) for line in lines)
+    mask = numpy.zeros(width + 1, dtype=int)
+
+    for line in lines:
+        for match in re.finditer("[^ \t]+", line):
+            mask[match.start():match.end()] = 1
+
+    shifted = numpy.roll(mask, 1)
+    shifted[0] = 0
+    edges = numpy.where((mask ^ shifted) == 1)[0]
+
+    return zip(edges[::2].tolist(), edges[1::2].tolist())
+
+
+def columnNames(names):
+    """ Returns the column `names` of a header as pandas reads them: blank
+        names become 'Unnamed: <position>' and repeated names get a '.<n>'
+        suffix.
+    """
+
+    seen = {}
+    columns = []
+
+    for i, name in enumerate(names):
+        if len(name) == 0:
+            name = "Unnamed: %d" % i
+
+        if name in seen:
+            seen[name] += 1
+            name = "%s.%d" % (name, seen[name])
+        else:
+            seen[name] = 0
+
+        columns.append(name)
+
+    return columns
+
+
+def sniffFormat(filename, size=SAMPLE_SIZE):
+    """ Detect the format of the dataset `filename` from its first `size`
+        bytes.
+
+        Returns a dict with the 'format' ('csv', 'tsv', 'delimited', or
+        'fwf'), the 'delimiter' (None if fixed-width), the 'colspecs' of a
+        fixed-width file (None if delimited), and the column names in the
+        header ('columns').
+    """
+
+    lines = readSample(filename, size)
+
+    if len(lines) == 0:
+        raise Exception("Couldn't detect the format of %s, it's empty." % filename)
+
+    delimiter = sniffDelimiter(lines)
+
+    if delimiter is not None:
+        colspecs = None
+        names = next(csv.reader(lines[:1], delimiter=delimiter))
+    else:
+        colspecs = sniffColspecs(lines)
+        names = [lines[0][start:end].strip() for start, end in colspecs]
+
+    return {
+        'format': FORMATS.get(delimiter, "delimited") if delimiter is not None else "fwf",
+        'delimiter': delimiter,
+        'colspecs': colspecs,
+        'columns': columnNames(names)
+    }
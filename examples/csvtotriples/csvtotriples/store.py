@@ -0,0 +1,323 @@
+""" store.py
+
+    Storage backends for annotation graphs.
+
+    Besides Redland's in-memory and Berkeley DB hashes stores (see
+    rdfutils.createModel()), graphs can be stored in a local SQLite table of
+    N-Triples terms. The SQLite store writes statements in batches and can be
+    reopened later to serialize the graph again without regenerating it.
+
+    Graphs that fit in memory can be kept much more compactly than in
+    Redland's hashes by numbering each distinct term once and storing the
+    statements as rows of three term IDs (see CompactStore).
+"""
+
+import os
+import glob
+import numpy
+import pandas
+import sqlite3
+
+from csvtotriples import rdfutils
+
+
+# Storage backends and whether they're kept on disk
+STORAGES = {
+    'memory': False,
+    'compact': False,
+    'bdb': True,
+    'sqlite': True
+}
+
+
+def createStore(storage="memory", directory=".", name="autoannotate", new=True, batchsize=10000):
+    """ Creates (or, if `new` is False, reopens) the store for `storage`.
+
+        'memory' and 'bdb' are Redland stores and return an RDF.Model.
+        'compact' returns a CompactStore and 'sqlite' a SQLiteStore. Stores
+        on disk are kept in `directory` in files named after `name`.
+    """
+
+    if storage not in STORAGES:
+        raise Exception("Unsupported storage %s. Try one of %s." % (storage, "|".join(sorted(STORAGES))))
+
+    if not new and not STORAGES[storage]:
+        raise Exception("A %s store is only kept in memory and can't be reopened." % storage)
+
+    if STORAGES[storage] and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    if storage == "sqlite":
+        return SQLiteStore(directory, name, new, batchsize)
+
+    if storage == "compact":
+        return CompactStore(batchsize)
+
+    # Redland's bdb hashes keep one <name>-<index>.db file per index, and
+    # would otherwise open an empty store when there are none
+    if storage == "bdb" and not new and len(glob.glob(os.path.join(directory, "%s-*.db" % name))) == 0:
+        raise Exception("Could not find an existing store for %s in %s." % (name, directory))
+
+    return rdfutils.createModel(storage, directory, name, new)
+
+
+def keepsChunks(storage):
+    """ Whether the graph of a dataset processed in chunks is kept whole in
+        `storage`. Only the Redland in-memory Model is emptied after each
+        chunk, which has to be written to an output file instead.
+    """
+
+    return storage != "memory"
+
+
+def sortOrder(triples, positions=(0, 1, 2)):
+    """ Returns the permutation that sorts the rows of the (n, 3) array of
+        term IDs `triples` by their columns at `positions`.
+
+        When the IDs are small enough, the three columns are packed into one
+        int64 key and sorted at once, which is many times faster than
+        numpy.lexsort. Otherwise the rows are sorted by the last column and
+        then, stably, by the first two packed together.
+    """
+
+    bits = int(triples.max()).bit_length() if len(triples) > 0 else 0
+    columns = [triples[:, position].astype(numpy.int64) for position in positions]
+
+    if 3 * bits <= 63:
+        return numpy.argsort((columns[0] << (2 * bits)) | (columns[1] << bits) | columns[2])
+
+    order = numpy.argsort(columns[2], kind="mergesort")
+
+    return order[numpy.argsort(((columns[0] << 31) | columns[1])[order], kind="mergesort")]
+
+
+class SQLiteStore:
+    """ A set of statements stored in a SQLite table of N-Triples terms.
+
+        Statements are buffered and inserted `batchsize` at a time, each
+        batch in its own transaction. Like a Redland Model, duplicate
+        statements are only stored once.
+    """
+
+    def __init__(self, directory=".", name="autoannotate", new=True, batchsize=10000):
+        self.filename = os.path.join(directory, "%s.sqlite" % name)
+        self.batchsize = batchsize
+        self.pending = []
+
+        if new:
+            if os.path.isfile(self.filename):
+                os.remove(self.filename)
+        elif not os.path.isfile(self.filename):
+            raise Exception("Could not find an existing store at %s." % self.filename)
+
+        self.connection = sqlite3.connect(self.filename)
+        self.connection.text_factory = str
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS triples "
+                                "(s TEXT NOT NULL, p TEXT NOT NULL, o TEXT NOT NULL, PRIMARY KEY (s, p, o))")
+        self.connection.commit()
+
+
+    def size(self):
+        """ Returns the number of statements in the store. """
+
+        self.flush()
+
+        return self.connection.execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+
+
+    def add(self, s, p, o):
+        """ Add the statement made of the N-Triples terms `s`, `p`, `o`. """
+
+        self.pending.append((s, p, o))
+
+        if len(self.pending) >= self.batchsize:
+            self.flush()
+
+
+    def addMany(self, s, p, o):
+        """ Add many statements at once. `s`, `p`, and `o` are N-Triples
+            terms or numpy arrays of them.
+        """
+
+        s, p, o = rdfutils.broadcastTerms(s, p, o)
+
+        self.pending.extend(zip(s, p, o))
+
+        if len(self.pending) >= self.batchsize:
+            self.flush()
+
+
+    def add_statement(self, statement):
+        """ Add a Redland RDF.Statement, for compatibility with RDF.Model. """
+
+        self.add(rdfutils.ntriplesFromNode(statement.subject),
+                 rdfutils.ntriplesFromNode(statement.predicate),
+                 rdfutils.ntriplesFromNode(statement.object))
+
+
+    def flush(self):
+        """ Insert any buffered statements, batchsize at a time. """
+
+        while len(self.pending) > 0:
+            batch = self.pending[:self.batchsize]
+            del self.pending[:self.batchsize]
+
+            self.connection.executemany("INSERT OR IGNORE INTO triples VALUES (?, ?, ?)", batch)
+            self.connection.commit()
+
+
+    def batches(self):
+        """ Yields the stored statements as lists of (s, p, o) tuples of
+            N-Triples terms, batchsize at a time.
+        """
+
+        self.flush()
+
+        cursor = self.connection.execute("SELECT s, p, o FROM triples")
+
+        while True:
+            batch = cursor.fetchmany(self.batchsize)
+
+            if len(batch) == 0:
+                break
+
+            yield batch
+
+
+    def __iter__(self):
+        for batch in self.batches():
+            for statement in batch:
+                yield statement
+
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+class CompactStore:
+    """ A set of statements kept in memory as rows of three term IDs.
+
+        Each distinct N-Triples term is stored once, in a dictionary that
+        numbers terms in the order they're first added, and statements are
+        rows of an (n, 3) int32 array of those numbers, which costs 12 bytes a
+        statement rather than the hundreds a Redland hashes store uses.
+        Generated graphs repeat a few predicates and classes over and over,
+        so the dictionary stays small next to the statements.
+
+        New statements are appended to a buffer of arrays. Once the buffer
+        holds at least `batchsize` statements and as many as are stored, it's
+        merged in and duplicates are dropped by sorting the rows and keeping
+        the unique ones, so statements come out in (s, p, o) order.
+    """
+
+    def __init__(self, batchsize=10000):
+        self.batchsize = batchsize
+        self.ids = {} # Term IDs by term
+        self.terms = [] # Terms by ID
+        self.triples = numpy.zeros((0, 3), dtype=numpy.int32)
+        self.pending = []
+        self.npending = 0
+
+
+    def encode(self, terms):
+        """ Returns the IDs of the numpy array of N-Triples `terms`, numbering
+            any new terms.
+        """
+
+        codes, uniques = pandas.factorize(terms)
+        ids = numpy.empty(len(uniques), dtype=numpy.int32)
+
+        for i, term in enumerate(uniques):
+            number = self.ids.get(term)
+
+            if number is None:
+                if len(self.terms) == numpy.iinfo(numpy.int32).max:
+                    raise Exception("Too many distinct terms for a compact store.")
+
+                number = self.ids[term] = len(self.terms)
+                self.terms.append(term)
+
+            ids[i] = number
+
+        return ids[codes]
+
+
+    def size(self):
+        """ Returns the number of statements in the store. """
+
+        self.flush()
+
+        return len(self.triples)
+
+
+    def add(self, s, p, o):
+        """ Add the statement made of the N-Triples terms `s`, `p`, `o`. """
+
+        self.addMany(s, p, o)
+
+
+    def addMany(self, s, p, o):
+        """ Add many statements at once. `s`, `p`, and `o` are N-Triples
+            terms or numpy arrays of them.
+        """
+
+        columns = [self.encode(column) for column in rdfutils.broadcastTerms(s, p, o)]
+
+        self.pending.append(numpy.column_stack(columns))
+        self.npending += len(columns[0])
+
+        if self.npending >= max(self.batchsize, len(self.triples)):
+            self.flush()
+
+
+    def add_statement(self, statement):
+        """ Add a Redland RDF.Statement, for compatibility with RDF.Model. """
+
+        self.add(rdfutils.ntriplesFromNode(statement.subject),
+                 rdfutils.ntriplesFromNode(statement.predicate),
+                 rdfutils.ntriplesFromNode(statement.object))
+
+
+    def flush(self):
+        """ Merge the buffered statements into the store, dropping
+            duplicates.
+        """
+
+        if self.npending == 0:
+            return
+
+        triples = numpy.concatenate([self.triples] + self.pending)
+        self.pending = []
+        self.npending = 0
+
+        triples = triples[sortOrder(triples)]
+
+        unique = numpy.ones(len(triples), dtype=bool)
+        unique[1:] = (triples[1:] != triples[:-1]).any(axis=1)
+
+        self.triples = triples[unique]
+
+
+    def batches(self):
+        """ Yields the stored statements as lists of (s, p, o) tuples of
+            N-Triples terms, batchsize at a time.
+        """
+
+        self.flush()
+
+        terms = numpy.array(self.terms, dtype=object)
+
+        for start in xrange(0, len(self.triples), self.batchsize):
+            yield map(tuple, terms[self.triples[start:start + self.batchsize]])
+
+
+    def __iter__(self):
+        for batch in self.batches():
+            for statement in batch:
+                yield statement
+
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,211 @@
+""" terms.py
+
+    Caches for turning the strings used in annotation templates (CURIEs like
+    'rdf:type', blank node labels like '_:m1_row0', and plain URIs) into
+    N-Triples terms and Redland nodes.
+
+    A handful of predicates and classes are used for almost every statement
+    so those are kept forever. Blank node labels and literals are mostly
+    unique per row so they're kept in a bounded least-recently-used cache.
+"""
+
+from collections import OrderedDict
+
+from csvtotriples import rdfutils
+
+
+class Namespaces(dict):
+    """ A dict of prefix -> namespace URI that counts how many times it has
+        been changed so caches built from it know when to start over.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.version += 1
+
+    def clear(self):
+        dict.clear(self)
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.version += 1
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.version += 1
+
+
+def expandTerm(ns, term, position, literal=False):
+    """ Returns the N-Triples term for the template string `term`.
+
+        `position` is one of 's', 'p', or 'o' and, together with `literal`,
+        determines how `term` is interpreted:
+
+        - Literal objects are always literals
+        - 'prefix:local' is expanded with `ns` unless prefix is '_', in which
+          case it's a blank node (except for predicates)
+        - Anything else is a URI, except for objects which become literals
+    """
+
+    if literal:
+        return rdfutils.ntriplesLiteral(term)
+
+    parts = term.split(":")
+
+    if len(parts) == 2:
+        if parts[0] == "_" and position != "p":
+            return rdfutils.ntriplesBlank(parts[1])
+        else:
+            return rdfutils.ntriplesUri(ns[parts[0]] + parts[1])
+
+    if position == "o":
+        return rdfutils.ntriplesLiteral(term)
+
+    return rdfutils.ntriplesUri(term)
+
+
+class TermCache:
+    """ Memoizes expandTerm() and rdfutils.nodeFromNTriples().
+
+        URIs are cached without limit. Blank nodes and literals are cached in
+        an LRU holding at most `maxsize` entries. `hits` and `misses` count
+        lookups across both kinds of entries.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._ns = None
+        self._ns_version = None
+        self._ns_items = None # Contents of the namespaces the cache was built with
+
+        self.clear()
+
+
+    def clear(self):
+        """ Empty the cache. Hit and miss counts are kept. """
+
+        self.expanded = {'s': {}, 'p': {}, 'o': {}, 'l': {}}
+        self.nodes = {}
+        self.lru = OrderedDict()
+
+
+    def __len__(self):
+        return sum(len(cache) for cache in self.expanded.values()) + len(self.nodes) + len(self.lru)
+
+
+    def stats(self):
+        """ Returns a dict of the hit, miss, and entry counts. """
+
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+
+    def _getLRU(self, key):
+        """ Returns the LRU entry for `key` (marking it as recently used) or
+            None if it isn't cached.
+        """
+
+        value = self.lru.pop(key, None)
+
+        if value is not None:
+            self.lru[key] = value
+
+        return value
+
+
+    def _putLRU(self, key, value):
+        """ Adds an LRU entry, evicting the least recently used if full. """
+
+        self.lru[key] = value
+
+        if len(self.lru) > self.maxsize:
+            self.lru.popitem(last=False)
+
+
+    def expand(self, ns, term, position, literal=False):
+        """ Cached expandTerm(). The cache is cleared whenever the namespaces
+            in `ns` differ from those of the last call, so Annotations with
+            the same namespaces can share a TermCache (see batch.py).
+            Namespaces are only compared when `ns` is a different dict, or
+            the same Namespaces dict has changed, since the last call.
+        """
+
+        if ns is not self._ns or getattr(ns, 'version', None) != self._ns_version:
+            items = dict(ns)
+
+            if items != self._ns_items:
+                self.clear()
+
+            self._ns = ns
+            self._ns_version = getattr(ns, 'version', None)
+            self._ns_items = items
+
+        cache = self.expanded['l' if literal else position]
+        result = cache.get(term)
+
+        if result is not None:
+            self.hits += 1
+            return result
+
+        lru_key = (position, literal, term)
+        result = self._getLRU(lru_key)
+
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = expandTerm(ns, term, position, literal)
+
+        if result[0] == "<":
+            cache[term] = result
+        else:
+            self._putLRU(lru_key, result)
+
+        return result
+
+
+    def node(self, term):
+        """ Cached rdfutils.nodeFromNTriples(). """
+
+        result = self.nodes.get(term)
+
+        if result is not None:
+            self.hits += 1
+            return result
+
+        result = self._getLRU(term)
+
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = rdfutils.nodeFromNTriples(term)
+
+        if term[0] == "<":
+            self.nodes[term] = result
+        else:
+            self._putLRU(term, result)
+
+        return result
@@ -0,0 +1,222 @@
+""" validation.py
+
+    Structural checks of generated graphs.
+
+    Annotation.validate() checks the parsed template. A GraphValidator
+    checks the statements that were actually generated: every
+    oboe:Measurement should have a value (oboe:hasValue), a characteristic
+    (oboe:ofCharacteristic), and a standard (oboe:usesStandard), and every
+    oboe:Observation an entity (oboe:ofEntity) and at least one measurement
+    (oboe:hasMeasurement).
+
+    The graph is read once, in any order. The predicates and classes being
+    checked are looked up in a hash table that gives each one a bit, and the
+    bits seen for each subject are OR-ed together in a hash table of
+    subjects, so the time taken grows linearly with the number of statements
+    and only the subjects of the statements being checked are kept.
+"""
+
+import gzip
+import itertools
+import collections
+
+from csvtotriples import writers
+
+
+# Predicates each class of node must have, by their names in plans.PREDICATES
+REQUIRED = collections.OrderedDict([
+    ('Measurement', ['hasValue', 'ofCharacteristic', 'usesStandard']),
+    ('Observation', ['ofEntity', 'hasMeasurement'])
+])
+
+# Statements read from a file at a time
+BATCHSIZE = 10000
+
+
+class GraphValidator:
+    """ Checks the structure of a graph, given its statements a batch at a
+        time (see check()).
+
+        `terms` are the N-Triples terms for rdf:type and for the classes and
+        predicates in REQUIRED, by name, like the ones in an emission plan
+        (see plans.compilePlan()).
+    """
+
+    def __init__(self, terms):
+        self.type = terms['type']
+        self.bits = {} # Bits of the classes and predicates, by name
+        self.classes = {} # Bits of the classes, by term
+        self.predicates = {} # Bits of the predicates, by term
+        self.flags = {} # Bits of the classes and predicates seen, by subject
+        self.nstatements = 0
+
+        for name in REQUIRED:
+            self.bits[name] = 1 << len(self.bits)
+            self.classes[terms[name]] = self.bits[name]
+
+        for name in REQUIRED:
+            for predicate in REQUIRED[name]:
+                if predicate not in self.bits:
+                    self.bits[predicate] = 1 << len(self.bits)
+                    self.predicates[terms[predicate]] = self.bits[predicate]
+
+
+    def check(self, batches):
+        """ Note the classes and predicates of the subjects of the lists of
+            (s, p, o) tuples of N-Triples terms in `batches`.
+        """
+
+        rdf_type = self.type
+        classes = self.classes
+        predicates = self.predicates
+        flags = self.flags
+
+        for batch in batches:
+            self.nstatements += len(batch)
+
+            for s, p, o in batch:
+                if p == rdf_type:
+                    bit = classes.get(o)
+                else:
+                    bit = predicates.get(p)
+
+                if bit is not None:
+                    flags[s] = flags.get(s, 0) | bit
+
+
+    def violations(self, keyOf=None):
+        """ Returns the number of nodes of each class that are missing each
+            required predicate, as a dict of (key, class, predicate) ->
+            count, where `keyOf` gives the key (e.g. of the mapping) each
+            node was generated for. Without `keyOf`, the key is None.
+
+            Nodes of each class are counted with None for the predicate.
+        """
+
+        counts = collections.Counter()
+
+        for subject, flags in self.flags.iteritems():
+            for name in REQUIRED:
+                if flags & self.bits[name] == 0:
+                    continue
+
+                key = keyOf(subject) if keyOf is not None else None
+                counts[(key, name, None)] += 1
+
+                for predicate in REQUIRED[name]:
+                    if flags & self.bits[predicate] == 0:
+                        counts[(key, name, predicate)] += 1
+
+        return dict(counts)
+
+
+def readNTriples(filename, batchsize=BATCHSIZE):
+    """ Yields the statements in the N-Triples file `filename` (compressed
+        if its extension says so, see writers.compression()) as lists of
+        (s, p, o) tuples of N-Triples terms, for `batchsize` lines at a time.
+
+        Blank lines and comments are skipped. Raises an Exception at the
+        first line that isn't a statement, e.g. if the file is Turtle.
+    """
+
+    compression = writers.compression(filename)
+
+    if compression == "gzip":
+        f = gzip.open(filename, "rb")
+    elif compression == "zstd":
+        if writers.zstandard is None:
+            raise Exception("Reading %s needs the zstandard module." % filename)
+
+        f = writers.zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"))
+        f = LineReader(f)
+    else:
+        f = open(filename, "rb")
+
+    number = 0 # Lines read before this batch
+
+    try:
+        while True:
+            lines = list(itertools.islice(f, batchsize))
+
+            if len(lines) == 0:
+                break
+
+            batch = [line.rstrip("\r\n").split(" ", 2) for line in lines]
+
+            if not all(len(parts) == 3 and parts[1].startswith("<") and parts[2].endswith(" .") for parts in batch):
+                batch = checkStatements(filename, number, lines, batch)
+
+            yield [(s, p, o[:-2]) for s, p, o in batch]
+
+            number += len(lines)
+    finally:
+        f.close()
+
+
+def checkStatements(filename, number, lines, batch):
+    """ Returns the statements among the `lines` (split into `batch`) from
+        line `number` of `filename`, leaving out blank lines and comments,
+        or raises an Exception at the first line that isn't either.
+    """
+
+    statements = []
+
+    for i, parts in enumerate(batch):
+        line = lines[i].strip()
+
+        if len(line) == 0 or line.startswith("#"):
+            continue
+
+        if len(parts) < 3 or not parts[1].startswith("<") or not parts[2].endswith(" ."):
+            raise Exception("Line %d of %s isn't an N-Triples statement: %s" % (number + i + 1, filename, line[:80]))
+
+        statements.append(parts)
+
+    return statements
+
+
+class LineReader:
+    """ Lines of a stream that can only be read() from. """
+
+    def __init__(self, stream, blocksize=1 << 20):
+        self.stream = stream
+        self.blocksize = blocksize
+
+
+    def __iter__(self):
+        rest = ""
+
+        for block in iter(lambda: self.stream.read(self.blocksize), ""):
+            lines = (rest + block).split("\n")
+            rest = lines.pop()
+
+            for line in lines:
+                yield line + "\n"
+
+        if len(rest) > 0:
+            yield rest
+
+
+    def close(self):
+        self.stream.close()
+
+
+def formatViolations(violations):
+    """ Returns a table of the number of nodes of each class for each key,
+        and how many of them are missing each required predicate (see
+        GraphValidator.violations()).
+    """
+
+    keys = sorted(set((key, name) for key, name, predicate in violations))
+    width = max([len("Key")] + [len(str(key)) for key, name in keys])
+    line = "%-" + str(width) + "s  %-12s  %10s  %s"
+
+    lines = [line % ("Key", "Class", "Nodes", "Missing")]
+
+    for key, name in keys:
+        missing = ["%s: %d" % (predicate, violations[(key, name, predicate)]) for predicate in REQUIRED[name]
+                   if (key, name, predicate) in violations]
+
+        lines.append(line % (key, name, violations[(key, name, None)], ", ".join(missing) or "-"))
+
+    return "\n".join(lines)
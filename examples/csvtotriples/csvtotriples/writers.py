@@ -0,0 +1,488 @@
+""" writers.py
+
+    Emit-only outputs for annotation graphs.
+
+    Writers stand in for the Redland Model when the graph only needs to be
+    written to disk: each statement is written to a buffered file as soon as
+    it's added instead of being stored and serialized at the end. Statements
+    are given as N-Triples terms (see rdfutils.py).
+
+    Unlike a Redland Model, writers don't remove duplicate statements.
+
+    Output files ending in .gz are compressed with gzip, and files ending in
+    .zst with zstd (if the zstandard module is installed). A PipelinedWriter
+    hands statements to a writer on a separate thread so they're formatted,
+    compressed, and written while the next ones are being generated.
+"""
+
+import os
+import re
+import sys
+import zlib
+import shutil
+import threading
+import Queue
+
+from csvtotriples import rdfutils
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Output formats and their aliases
+FORMATS = {
+    'ntriples': 'ntriples',
+    'nt': 'ntriples',
+    'turtle': 'turtle',
+    'ttl': 'turtle'
+}
+
+# Compressions and the filename extensions they're used for
+COMPRESSIONS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd'
+}
+
+# Compression levels: gzip's default, and zstd's
+LEVELS = {
+    'gzip': 6,
+    'zstd': 3
+}
+
+# Number of batches of statements a PipelinedWriter queues up
+QUEUE_DEPTH = 8
+
+RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+
+
+def formatName(format):
+    """ Returns the canonical name for `format` (e.g. 'nt' -> 'ntriples'). """
+
+    if format is None:
+        return "turtle"
+
+    if format not in FORMATS:
+        raise Exception("Unsupported output format %s. Try one of %s." % (format, "|".join(sorted(FORMATS))))
+
+    return FORMATS[format]
+
+
+def createWriter(filename, format=None, ns=None, offset=None):
+    """ Creates a writer for `filename` in `format` (default: turtle). `ns`
+        is a dict of prefixes used to abbreviate Turtle output. See
+        openOutputFile() for `offset`.
+    """
+
+    format = formatName(format)
+
+    if format == "ntriples":
+        return NTriplesWriter(filename, offset=offset)
+    else:
+        return TurtleWriter(filename, ns, offset=offset)
+
+
+def compressedFilename(filename, compression=None):
+    """ Returns `filename` with the extension for `compression` ('gzip' or
+        'zstd') added, if it doesn't have it already.
+    """
+
+    if compression is None:
+        return filename
+
+    extension = dict((COMPRESSIONS[extension], extension) for extension in COMPRESSIONS)[compression]
+
+    if filename.endswith(extension):
+        return filename
+
+    return filename + extension
+
+
+def compression(filename):
+    """ Returns the compression ('gzip' or 'zstd') `filename` should be
+        written with, going by its extension, or None.
+    """
+
+    return COMPRESSIONS.get(os.path.splitext(filename)[1])
+
+
+def openOutputFile(filename, offset=None, buffering=-1):
+    """ Open `filename` for writing, compressed if its extension calls for
+        it (see compression()). If `offset` is given, the file is kept, cut
+        off after `offset` bytes, and written to from there instead, e.g. to
+        pick up where an interrupted run left off.
+    """
+
+    if compression(filename) is not None:
+        if offset is not None:
+            raise Exception("Can't continue writing the compressed file %s from byte %d." % (filename, offset))
+
+        return CompressedFile(filename, compression(filename), buffering if buffering > 0 else 1 << 20)
+
+    if offset is None:
+        return open(filename, "wb", buffering)
+
+    if not os.path.isfile(filename) or os.path.getsize(filename) < offset:
+        raise Exception("Can't continue writing %s from byte %d, the file is missing or shorter." % (filename, offset))
+
+    f = open(filename, "r+b", buffering)
+    f.truncate(offset)
+    f.seek(offset)
+
+    return f
+
+
+def compressFile(source, filename):
+    """ Copy the file `source` to `filename`, compressing it (see
+        openOutputFile()).
+    """
+
+    f = openOutputFile(filename)
+
+    try:
+        with open(source, "rb") as uncompressed:
+            shutil.copyfileobj(uncompressed, f, 1 << 20)
+    finally:
+        f.close()
+
+
+class CompressedFile:
+    """ A file that compresses what's written to it with `compression`
+        ('gzip' or 'zstd'), `buffering` bytes at a time.
+    """
+
+    def __init__(self, filename, compression, buffering=1 << 20):
+        if compression == "gzip":
+            # A gzip header and trailer rather than zlib's
+            self.compressor = zlib.compressobj(LEVELS['gzip'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif compression == "zstd":
+            if zstandard is None:
+                raise Exception("Can't write %s, zstd compression needs the zstandard module." % filename)
+
+            self.compressor = zstandard.ZstdCompressor(level=LEVELS['zstd']).compressobj()
+        else:
+            raise Exception("Unsupported compression %s." % compression)
+
+        self.file = open(filename, "wb")
+        self.buffering = buffering
+        self.pending = []
+        self.npending = 0
+        self.nwritten = 0 # Uncompressed bytes written
+        self.closed = False
+
+
+    def write(self, data):
+        self.pending.append(data)
+        self.npending += len(data)
+        self.nwritten += len(data)
+
+        if self.npending >= self.buffering:
+            self.compress()
+
+
+    def compress(self):
+        """ Compress and write out what's been written since last time. """
+
+        if self.npending > 0:
+            self.file.write(self.compressor.compress("".join(self.pending)))
+            self.pending = []
+            self.npending = 0
+
+
+    def flush(self):
+        self.compress()
+        self.file.flush()
+
+
+    def tell(self):
+        return self.nwritten
+
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.compress()
+        self.file.write(self.compressor.flush())
+        self.file.close()
+        self.closed = True
+
+
+class Writer:
+    """ Base class for writers. Subclasses implement write() and writeMany(). """
+
+    def __init__(self, filename, buffering=1 << 20, offset=None):
+        self.filename = filename
+        self.file = openOutputFile(filename, offset, buffering)
+        self.count = 0
+
+
+    def size(self):
+        """ Returns the number of statements written so far. """
+
+        return self.count
+
+
+    def add(self, s, p, o):
+        """ Write the statement made of the N-Triples terms `s`, `p`, `o`. """
+
+        self.count += 1
+        self.write(s, p, o)
+
+
+    def addMany(self, s, p, o):
+        """ Write many statements at once. `s`, `p`, and `o` are N-Triples
+            terms or numpy arrays of them. Single terms are repeated for every
+            statement.
+        """
+
+        s, p, o = rdfutils.broadcastTerms(s, p, o)
+
+        if len(s) == 0:
+            return
+
+        self.count += len(s)
+        self.writeMany(s, p, o)
+
+
+    def add_statement(self, statement):
+        """ Write a Redland RDF.Statement, for compatibility with RDF.Model. """
+
+        self.add(rdfutils.ntriplesFromNode(statement.subject),
+                 rdfutils.ntriplesFromNode(statement.predicate),
+                 rdfutils.ntriplesFromNode(statement.object))
+
+
+    def flush(self):
+        self.file.flush()
+
+
+    def checkpoint(self):
+        """ Flush everything written so far and return the offset in the
+            file that writing can be continued from later (see
+            openOutputFile()).
+        """
+
+        self.flush()
+
+        return self.file.tell()
+
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class NTriplesWriter(Writer):
+    """ Writes statements as N-Triples, one per line. """
+
+    def write(self, s, p, o):
+        self.file.write("%s %s %s .\n" % (s, p, o))
+
+
+    def writeMany(self, s, p, o):
+        self.file.write("".join(s + " " + p + " " + o + " .\n"))
+
+
+class TurtleWriter(Writer):
+    """ Writes statements as Turtle.
+
+        Consecutive statements about the same subject are grouped together
+        and URIs in one of the namespaces in `ns` are written as prefixed
+        names. Statements added with addMany() are grouped by subject first.
+    """
+
+    # Local names that can safely be written as prefix:local
+    local_name = re.compile(r"\A[A-Za-z_][A-Za-z0-9_\-]*\Z")
+
+
+    def __init__(self, filename, ns=None, buffering=1 << 20, offset=None):
+        Writer.__init__(self, filename, buffering, offset)
+
+        self.ns = ns if ns is not None else {}
+        self.names = {}
+        self.subject = None
+        self.started = bool(offset) # Whether the prefixes have been written
+
+
+    def writePrefixes(self):
+        for prefix in sorted(self.ns):
+            self.file.write("@prefix %s: <%s> .\n" % (prefix, self.ns[prefix]))
+
+        self.file.write("\n")
+
+
+    def name(self, term):
+        """ Returns the prefixed name for the URI term `term` if it's in one
+            of the namespaces, otherwise `term`.
+        """
+
+        if term[0] != "<":
+            return term
+
+        name = self.names.get(term)
+
+        if name is not None:
+            return name
+
+        name = term
+        uri = term[1:-1]
+        matched = ""
+
+        for prefix in sorted(self.ns):
+            namespace = self.ns[prefix]
+
+            if uri.startswith(namespace) and len(namespace) > len(matched):
+                local = uri[len(namespace):]
+
+                if self.local_name.match(local):
+                    name = "%s:%s" % (prefix, local)
+                    matched = namespace
+
+        self.names[term] = name
+
+        return name
+
+
+    def write(self, s, p, o):
+        if not self.started:
+            self.writePrefixes()
+            self.started = True
+
+        if p == RDF_TYPE:
+            p = "a"
+        else:
+            p = self.name(p)
+
+        if s == self.subject:
+            self.file.write(" ;\n    %s %s" % (p, self.name(o)))
+        else:
+            if self.subject is not None:
+                self.file.write(" .\n\n")
+
+            self.subject = s
+            self.file.write("%s %s %s" % (self.name(s), p, self.name(o)))
+
+
+    def checkpoint(self):
+        """ End the statements about the current subject so the output is
+            complete up to the offset returned.
+        """
+
+        if self.subject is not None:
+            self.file.write(" .\n\n")
+            self.subject = None
+
+        return Writer.checkpoint(self)
+
+
+    def writeMany(self, s, p, o):
+        order = s.argsort(kind="mergesort")
+
+        for i in order:
+            self.write(s[i], p[i], o[i])
+
+
+    def close(self):
+        if self.subject is not None and not self.file.closed:
+            self.file.write(" .\n")
+
+        Writer.close(self)
+
+
+class PipelinedWriter:
+    """ Wraps a writer (or anything else that takes N-Triples terms, like a
+        dedup.DedupWriter) and adds statements to it on a separate thread.
+
+        Statements are passed to the thread through a queue of at most
+        `depth` batches, so generating statements only waits for the writer
+        when it falls that far behind. Errors in the thread are raised on
+        the next call. size(), flush(), and checkpoint() wait for the queued
+        statements to be written first.
+    """
+
+    def __init__(self, writer, depth=QUEUE_DEPTH):
+        self.writer = writer
+        self.queue = Queue.Queue(depth)
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+
+            try:
+                if item is None:
+                    return
+
+                # Drop everything after an error, it's raised by check()
+                if self.error is None:
+                    method, args = item
+                    method(*args)
+            except Exception:
+                self.error = sys.exc_info()
+            finally:
+                self.queue.task_done()
+
+
+    def check(self):
+        """ Raise the error the thread ran into, if any. """
+
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+
+
+    def wait(self):
+        """ Wait until all the queued statements have been written. """
+
+        self.queue.join()
+        self.check()
+
+
+    def size(self):
+        self.wait()
+
+        return self.writer.size()
+
+
+    def add(self, s, p, o):
+        self.check()
+        self.queue.put((self.writer.add, (s, p, o)))
+
+
+    def addMany(self, s, p, o):
+        self.check()
+        self.queue.put((self.writer.addMany, (s, p, o)))
+
+
+    def add_statement(self, statement):
+        self.add(rdfutils.ntriplesFromNode(statement.subject),
+                 rdfutils.ntriplesFromNode(statement.predicate),
+                 rdfutils.ntriplesFromNode(statement.object))
+
+
+    def flush(self):
+        self.wait()
+        self.writer.flush()
+
+
+    def checkpoint(self):
+        self.wait()
+
+        return self.writer.checkpoint()
+
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+        try:
+            self.check()
+        finally:
+            self.writer.close()
@@ -0,0 +1,92 @@
+import pytest
+from csvtotriples import annotation
+from csvtotriples import plans
+from csvtotriples import batch
+
+
+def test_batch(tmpdir):
+    templates = ["tests/test_templates/test_valueadding.csv", "tests/test_templates/test_eqmappings.csv"]
+
+    groups = batch.groupTemplates(templates)
+
+    assert(len(groups) == 1)
+    assert(groups[0][1] == templates)
+
+    summaries = batch.annotate(templates, jobs=2, directory=str(tmpdir), format="nt", stream=True)
+
+    assert(len(summaries) == 2)
+
+    for template, summary in zip(templates, summaries):
+        assert(summary['template'] == template)
+        assert(summary['error'] is None)
+        assert(summary['rows'] > 0)
+        assert(summary['statements'] > 0)
+        assert(len(open(summary['outfile']).readlines()) == summary['statements'])
+
+    assert(sorted(tmpdir.listdir()) == sorted([tmpdir.join("test_valueadding.nt"), tmpdir.join("test_eqmappings.nt")]))
+
+
+def test_batch_failure(tmpdir):
+    missing = str(tmpdir.join("missing.csv"))
+    open(missing, "w").write("META\ndata_identifier,%s\n" % tmpdir.join("missing-data.csv"))
+
+    summaries = batch.annotate([missing, "tests/test_templates/test_valueadding.csv"], directory=str(tmpdir))
+
+    assert(summaries[0]['error'] is not None)
+    assert(summaries[1]['error'] is None)
+    assert("1 failed" in batch.formatSummary(summaries))
+
+
+def test_batch_output_collision(tmpdir):
+    first = tmpdir.mkdir("first").join("template.csv")
+    second = tmpdir.mkdir("second").join("template.csv")
+
+    for template in [first, second]:
+        template.write(open("tests/test_templates/test_valueadding.csv").read())
+
+    outputs = str(tmpdir.join("out"))
+
+    with pytest.raises(Exception):
+        batch.annotate([str(first), str(second)], directory=outputs)
+
+    # Next to the templates, they don't collide
+    summaries = batch.annotate([str(first), str(second)])
+
+    assert([summary['error'] for summary in summaries] == [None, None])
+    assert(summaries[0]['outfile'] != summaries[1]['outfile'])
+
+
+def test_batch_parses_once(tmpdir, monkeypatch):
+    templates = [str(tmpdir.join("first.csv")), str(tmpdir.join("second.csv"))]
+
+    for template in templates:
+        open(template, "w").write(open("tests/test_templates/test_valueadding.csv").read())
+
+    parse = annotation.Annotation.parse
+    compilePlan = plans.compilePlan
+    calls = {'parse': 0, 'compile': 0}
+
+    def countParse(anno):
+        calls['parse'] += 1
+        parse(anno)
+
+    def countCompile(anno, key):
+        calls['compile'] += 1
+        return compilePlan(anno, key)
+
+    monkeypatch.setattr(annotation.Annotation, "parse", countParse)
+    monkeypatch.setattr(plans, "compilePlan", countCompile)
+
+    for template in templates:
+        annotation.Annotation(template).parse()
+
+    compiled = calls['compile']
+    calls.update(parse=0, compile=0)
+
+    summaries = batch.annotate(templates, directory=str(tmpdir.join("out")), format="nt", stream=True)
+
+    # Templates with the same namespaces share a TermCache without their
+    # plans being compiled again
+    assert([summary['error'] for summary in summaries] == [None, None])
+    assert(calls == {'parse': 2, 'compile': compiled})
+    assert(batch.ANNOTATIONS == {})
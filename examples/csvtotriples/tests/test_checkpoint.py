@@ -0,0 +1,86 @@
+import os
+import pytest
+from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import checkpoint
+
+
+def test_resume(tmpdir):
+    template = "tests/test_templates/test_valueadding.csv"
+    complete = str(tmpdir.join("complete.nt"))
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation(template)
+    anno.parse()
+    incremental.IncrementalRun(anno, chunksize=2, stream=True).process(complete, "nt")
+
+    # Interrupt a run, which checkpoints as often as it can, on its second chunk
+    anno = annotation.Annotation(template, directory=str(tmpdir))
+    anno.parse()
+    run = incremental.IncrementalRun(anno, chunksize=2, stream=True, checkpoint=0)
+
+    flush = run.flush
+    flushes = []
+
+    def interrupt():
+        flush()
+        flushes.append(1)
+
+        if len(flushes) == 2:
+            raise KeyboardInterrupt()
+
+    run.flush = interrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        run.process(outfile, "nt")
+
+    anno = annotation.Annotation(template, directory=str(tmpdir))
+    anno.parse()
+    run = incremental.IncrementalRun(anno, chunksize=2, stream=True, checkpoint=0, resume=True)
+    run.process(outfile, "nt")
+
+    assert(anno.nvalues() == 5)
+    assert(anno.size() == len(open(complete).readlines()))
+    assert(sorted(open(outfile).readlines()) == sorted(open(complete).readlines()))
+    assert(not os.path.isfile(run.checkpoint.filename))
+
+
+@pytest.mark.parametrize("options, mapping", [({'stream': True, 'bloom': 1 << 16}, 1), ({}, 0)])
+def test_resume_dedup(tmpdir, monkeypatch, options, mapping):
+    template = "tests/test_templates/test_constants.csv"
+    complete = str(tmpdir.join("complete.nt"))
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation(template)
+    anno.parse()
+    incremental.IncrementalRun(anno, chunksize=2, **options).process(complete, "nt")
+
+    # Interrupt a run in its second chunk, after the constant statements and
+    # (when streaming) the observations' per-row statements were written
+    save = checkpoint.Checkpoint.save
+
+    def interrupt(self, progress, *args):
+        save(self, progress, *args)
+
+        if progress['row'] == 2 and progress['mapping'] == mapping:
+            raise KeyboardInterrupt()
+
+    monkeypatch.setattr(checkpoint.Checkpoint, "save", interrupt)
+
+    anno = annotation.Annotation(template, directory=str(tmpdir))
+    anno.parse()
+
+    with pytest.raises(KeyboardInterrupt):
+        incremental.IncrementalRun(anno, chunksize=2, checkpoint=0, **options).process(outfile, "nt")
+
+    monkeypatch.undo()
+
+    # They're not written again
+    anno = annotation.Annotation(template, directory=str(tmpdir))
+    anno.parse()
+    incremental.IncrementalRun(anno, chunksize=2, checkpoint=0, resume=True, **options).process(outfile, "nt")
+
+    lines = open(outfile).readlines()
+
+    assert(len(set(lines)) == len(lines))
+    assert(sorted(lines) == sorted(open(complete).readlines()))
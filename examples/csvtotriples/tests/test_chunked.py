@@ -0,0 +1,38 @@
+import pytest
+from csvtotriples import annotation
+from csvtotriples import incremental
+
+
+def test_chunked(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+    incremental.IncrementalRun(anno, chunksize=2).process(outfile)
+
+    assert(anno.nrows == 5)
+    assert(anno.nvalues() == 5)
+    assert(anno.size() == 15)
+    assert(len(open(outfile).readlines()) == 15)
+
+
+def test_chunked_constants(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+    template = "tests/test_templates/test_constants.csv"
+
+    anno = annotation.Annotation(template)
+    anno.parse()
+    anno.process()
+
+    expected = anno.size()
+
+    # The entity's type is only written with the first chunk
+    anno = annotation.Annotation(template)
+    anno.parse()
+    incremental.IncrementalRun(anno, chunksize=2).process(outfile)
+
+    lines = open(outfile).readlines()
+
+    assert(anno.size() == expected)
+    assert(len(lines) == expected)
+    assert(len(set(lines)) == expected)
@@ -0,0 +1,40 @@
+import pytest
+import pandas
+from csvtotriples import annotation
+from csvtotriples import columncache
+
+
+def test_column_cache(tmpdir):
+    cache = str(tmpdir.join("cache"))
+    dataset = tmpdir.join("data.csv")
+    dataset.write("site,spp,note\n1,King,a\n1,Coho,b\n2,King,c\n2,King,d\n2,King,e\n")
+
+    template = tmpdir.join("template.csv")
+    template.write("META\ndata_identifier,%s\nMAPPINGS\nsite,m1,,\nspp,m1,,\nnote,m1,,\n" % dataset)
+
+    anno = annotation.Annotation(str(template), cache=cache)
+    anno.parse()
+
+    first = anno.readDataset(str(dataset))
+    second = anno.readDataset(str(dataset), skip=1)
+
+    assert(isinstance(second.records, columncache.CachedRecords))
+    assert(list(first['site']) == [1, 1, 2, 2, 2])
+    assert(list(second['spp']) == ["Coho", "King", "King", "King"])
+    assert(pandas.api.types.is_categorical_dtype(second['spp']))
+    assert(list(second['note']) == ["b", "c", "d", "e"])
+
+    # Cached columns are used when nothing changed and parsed again otherwise
+    columns = columncache.ColumnCache(str(tmpdir.join("cache", "columns")))
+    options = {'site': anno.columnOptions(anno.sniffFormat(str(dataset)), 0, {})}
+
+    assert(columns.read(str(dataset), ["site"], options) is not None)
+
+    dataset.write("site,spp,note\n3,King,a\n")
+
+    assert(columns.read(str(dataset), ["site"], options) is None)
+
+    anno = annotation.Annotation(str(template), cache=cache)
+    anno.parse()
+
+    assert(list(anno.readDataset(str(dataset))['site']) == [3])
@@ -0,0 +1,23 @@
+import pytest
+import numpy
+from csvtotriples import writers
+from csvtotriples import dedup
+
+
+def test_dedup_writer(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+
+    writer = dedup.DedupWriter(writers.createWriter(outfile, "nt"), memory=1 << 16)
+
+    rows = numpy.array(["_:o1row0", "_:o1row1", "_:o1row0"], dtype=object)
+
+    writer.addMany("_:o1_entity", "<http://example.com/type>", "<http://example.com/Entity>")
+    writer.addMany("_:o1_entity", "<http://example.com/type>", "<http://example.com/Entity>")
+    writer.addMany(rows, "<http://example.com/type>", "<http://example.com/Observation>")
+    writer.addMany(rows[:2], "<http://example.com/type>", "<http://example.com/Observation>")
+    writer.close()
+
+    assert(writer.nconstant == 1)
+    assert(writer.nrow == 3)
+    assert(writer.size() == 3)
+    assert(len(open(outfile).readlines()) == 3)
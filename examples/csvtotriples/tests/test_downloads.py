@@ -0,0 +1,88 @@
+import os
+import hashlib
+import threading
+import BaseHTTPServer
+import pytest
+from csvtotriples import downloads
+
+
+class DatasetHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Serves `content` with an ETag, answering conditional requests (or,
+        with `not_modified` set, every request) with 304.
+    """
+
+    content = "a,b\n1,2\n"
+    requests = []
+    not_modified = False
+
+    def do_GET(self):
+        etag = '"%s"' % hashlib.md5(self.content).hexdigest()
+        DatasetHandler.requests.append(self.headers.get('If-None-Match'))
+
+        if self.headers.get('If-None-Match') == etag or self.not_modified:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), DatasetHandler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield "http://127.0.0.1:%d/data.csv" % httpd.server_address[1]
+
+    httpd.shutdown()
+
+
+def test_dataset_cache(tmpdir, server):
+    cache = downloads.DatasetCache(str(tmpdir), verify=True)
+    DatasetHandler.content = "a,b\n1,2\n"
+    DatasetHandler.requests = []
+
+    first = cache.fetch(server)
+
+    assert(open(first).read() == DatasetHandler.content)
+    assert(os.path.basename(first) == hashlib.sha256(DatasetHandler.content).hexdigest())
+
+    # Unchanged datasets are revalidated but not downloaded again
+    mtime = os.path.getmtime(first)
+
+    assert(cache.fetch(server) == first)
+    assert(os.path.getmtime(first) == mtime)
+    assert(DatasetHandler.requests[1] is not None)
+
+    # Changed datasets are
+    DatasetHandler.content = "a,b\n3,4\n"
+
+    second = cache.fetch(server)
+
+    assert(second != first)
+    assert(open(second).read() == DatasetHandler.content)
+
+
+def test_dataset_cache_not_modified(tmpdir, server):
+    cache = downloads.DatasetCache(str(tmpdir), verify=True)
+    DatasetHandler.requests = []
+    DatasetHandler.not_modified = True
+
+    # Nothing is cached, so a 304 can't be answered with a cached copy
+    try:
+        with pytest.raises(Exception) as error:
+            cache.fetch(server)
+    finally:
+        DatasetHandler.not_modified = False
+
+    assert("304" in str(error.value))
+    assert(DatasetHandler.requests == [None])
@@ -0,0 +1,18 @@
+import pytest
+from csvtotriples import annotation
+from csvtotriples import incremental
+
+
+def test_eqmappings(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation("tests/test_templates/test_eqmappings.csv")
+    anno.parse()
+    incremental.IncrementalRun(anno, stream=True).process(outfile, "nt")
+
+    output = open(outfile).read()
+
+    assert(anno.nvalues() == 10)
+    assert('_:m1_row0 <http://ecoinformatics.org/oboe/oboe.1.0/oboe-core.owl#hasValue> "Oncorhynchus tshawytscha" .' in output)
+    assert('_:m3_row1 <http://ecoinformatics.org/oboe/oboe.1.0/oboe-core.owl#hasValue> "Oncorhynchus kisutch" .' in output)
+    assert('_:m4_row' not in output)
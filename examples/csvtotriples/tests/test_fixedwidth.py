@@ -0,0 +1,78 @@
+import pytest
+import pandas
+from csvtotriples import sniff
+from csvtotriples import fixedwidth
+
+
+LINES = ["cast  depth   temp    spp   ",
+         "1     4.0     18.740  King  ",
+         "1     5.0             Coho  ",
+         "2     6.0     18.738  King  ",
+         "2     7.5     18.700  King  "]
+
+
+def test_fixedwidth(tmpdir):
+    dataset = tmpdir.join("data.txt")
+    dataset.write("\n".join(LINES) + "\n")
+
+    format = sniff.sniffFormat(str(dataset))
+    frame = fixedwidth.readFixedWidth(str(dataset), format['columns'], format['colspecs'], first=1)
+    expected = pandas.read_fwf(str(dataset), colspecs=format['colspecs'])[1:]
+
+    assert(frame.shape == (3, 4))
+    assert("temp" in frame)
+
+    for name in format['columns']:
+        column = frame[name]
+
+        assert(column.dtype == expected[name].dtype)
+        assert(list(column.astype(str)) == list(expected[name].astype(str)))
+
+    # Slices and copies share the parsed columns
+    assert(list(frame[1:3].copy()['cast']) == [2, 2])
+
+    # Columns parsed before the file is closed can still be used
+    frame.close()
+
+    assert(list(frame['cast']) == [1, 2, 2])
+
+    frame = fixedwidth.readFixedWidth(str(dataset), format['columns'], format['colspecs'])
+    frame.close()
+
+    with pytest.raises(Exception):
+        frame['depth']
+
+    # Chunks are read as they're reached, and the file is closed after the last one
+    chunks = []
+
+    for chunk in fixedwidth.readFixedWidth(str(dataset), format['columns'], format['colspecs'], chunksize=3):
+        chunks.append((len(chunk), list(chunk['spp'])))
+
+    assert(chunks == [(3, ["King", "Coho", "King"]), (1, ["King"])])
+    assert(chunk.records.buffer is None)
+
+
+def test_fixedwidth_floats(tmpdir):
+    # Decimals that NumPy and pandas round differently
+    dataset = tmpdir.join("data.txt")
+    dataset.write("\n".join(["lat       lon       O2_ml_L  "] +
+                            ["%-10.3f%-10.3f%-9.3f" % (33.002 + i * 0.001, -64.005 - i * 0.001, 5.39 - i * 0.0007)
+                             for i in range(200)]) + "\n")
+
+    format = sniff.sniffFormat(str(dataset))
+    frame = fixedwidth.readFixedWidth(str(dataset), format['columns'], format['colspecs'])
+    expected = pandas.read_fwf(str(dataset), colspecs=format['colspecs'])
+
+    for name in format['columns']:
+        assert(frame[name].dtype == expected[name].dtype)
+        assert((frame[name].values == expected[name].values).all())
+
+
+def test_fixedwidth_ragged(tmpdir):
+    dataset = tmpdir.join("data.txt")
+    dataset.write("\n".join(line.replace("Coho", "Co").rstrip() for line in LINES) + "\n")
+
+    format = sniff.sniffFormat(str(dataset))
+
+    with pytest.raises(Exception):
+        fixedwidth.readFixedWidth(str(dataset), format['columns'], format['colspecs'])
@@ -0,0 +1,24 @@
+import pytest
+import pandas
+from csvtotriples import annotation
+
+
+def test_loading(tmpdir):
+    template = tmpdir.join("template.csv")
+    template.write(open("tests/test_templates/test_eqmappings.csv").read() + "DTYPES\nsite,int8\n")
+
+    anno = annotation.Annotation(str(template))
+    anno.parse()
+
+    assert(anno.dtypes == {'site': 'int8'})
+
+    dataset = anno.readDataset("tests/test_data/test_valueadding.csv")
+
+    # Only mapped attributes are loaded and spp only has two values
+    assert(list(dataset.columns) == ["site", "spp"])
+    assert(dataset['site'].dtype == "int8")
+    assert(pandas.api.types.is_categorical_dtype(dataset['spp']))
+
+    anno.process()
+
+    assert(anno.nvalues() == 10)
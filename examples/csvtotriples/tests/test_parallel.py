@@ -0,0 +1,95 @@
+import pytest
+from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import parallel
+
+
+def test_parallel(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = parallel.annotate("tests/test_templates/test_valueadding.csv", outfile, 2, format="nt")
+
+    assert(anno.nrows == 5)
+    assert(anno.nvalues() == 5)
+    assert(len(open(outfile).readlines()) == 15)
+
+
+def test_split_rows():
+    assert(parallel.splitRows(5, 2) == [(0, 3), (3, 2)])
+    assert(parallel.splitRows(2, 4) == [(0, 1), (1, 1)])
+
+
+def test_parallel_constants(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+    template = "tests/test_templates/test_constants.csv"
+
+    anno = parallel.annotate(template, outfile, 3, format="nt")
+
+    lines = open(outfile).readlines()
+
+    # Statements that aren't about a row are written once, not by every worker
+    assert(anno.size() == len(lines))
+    assert(len(set(lines)) == len(lines))
+    assert(len([line for line in lines if line.startswith("<http://foo.org/foo#Fish>")]) == 1)
+
+
+def test_count_rows(tmpdir):
+    dataset = tmpdir.join("data.csv")
+    dataset.write("a,b\n1,2\n\n3,4\n   \n5,6\r\n\r\n7,8")
+
+    assert(parallel.countRows(str(dataset)) == 4)
+    assert(parallel.countRows(str(dataset), ",") == 4)
+
+    # Quoted fields can span lines
+    dataset.write('a,b\n1,"two\nlines"\n\n3,"4\n\n5"\n6,7\n')
+
+    assert(parallel.countRows(str(dataset), ",") == 3)
+    assert(annotation.skipLines(str(dataset), 2, ",") == 4)
+
+
+def test_parallel_blank_lines(tmpdir):
+    dataset = tmpdir.join("data.csv")
+    dataset.write("site,spp,length_cm\n1,King,100\n\n1,Coho,80\n2,King,101\n   \n2,King,98\n2,King,88\n")
+
+    template = tmpdir.join("template.csv")
+    template.write("META\ndata_identifier,%s\n"
+                   "NAMESPACES\noboe,http://ecoinformatics.org/oboe/oboe.1.0/oboe-core.owl#\n"
+                   "rdf,http://www.w3.org/1999/02/22-rdf-syntax-ns#\nrdfs,http://www.w3.org/2000/01/rdf-schema#\n"
+                   "MAPPINGS\nsite,m1,,\nlength_cm,m2,,\n" % dataset)
+
+    serial = str(tmpdir.join("serial.nt"))
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation(str(template))
+    anno.parse()
+    incremental.IncrementalRun(anno, stream=True).process(serial, "nt")
+
+    # Rows are split and numbered the same way, skipping the blank lines
+    anno = parallel.annotate(str(template), outfile, 3, format="nt")
+
+    assert(anno.nrows == 5)
+    assert(sorted(open(outfile).readlines()) == sorted(open(serial).readlines()))
+
+
+def test_parallel_quoted_newlines(tmpdir):
+    dataset = tmpdir.join("data.csv")
+    dataset.write('site,spp,length_cm\n1,"King\nsalmon",100\n1,Coho,80\n2,"King\n\nsalmon",101\n2,King,98\n2,King,88\n')
+
+    template = tmpdir.join("template.csv")
+    template.write("META\ndata_identifier,%s\n"
+                   "NAMESPACES\noboe,http://ecoinformatics.org/oboe/oboe.1.0/oboe-core.owl#\n"
+                   "rdf,http://www.w3.org/1999/02/22-rdf-syntax-ns#\nrdfs,http://www.w3.org/2000/01/rdf-schema#\n"
+                   "MAPPINGS\nsite,m1,,\nlength_cm,m2,,\n" % dataset)
+
+    serial = str(tmpdir.join("serial.nt"))
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation(str(template))
+    anno.parse()
+    incremental.IncrementalRun(anno, stream=True).process(serial, "nt")
+
+    # Each worker's range starts on a record, not a line inside one
+    anno = parallel.annotate(str(template), outfile, 3, format="nt")
+
+    assert(anno.nrows == 5)
+    assert(sorted(open(outfile).readlines()) == sorted(open(serial).readlines()))
@@ -0,0 +1,43 @@
+import os
+import pytest
+from csvtotriples import annotation
+from csvtotriples import plans
+
+
+def test_measurement_plan():
+    anno = annotation.Annotation("tests/test_templates/test_eqmappings.csv")
+    anno.parse()
+
+    plan = anno.plans['m1']
+
+    assert(plan['type'] == '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>')
+    assert(plan['observation'] == '_:o1row')
+    assert(plan['entity'] is None)
+
+    # Plans are compiled again when the namespaces change
+    anno.ns['oboe'] = 'http://example.com/oboe#'
+
+    assert(anno.measurementPlan('m1')['Measurement'] == '<http://example.com/oboe#Measurement>')
+
+
+def test_template_cache(tmpdir):
+    cache = str(tmpdir)
+    template = "tests/test_templates/test_valueadding.csv"
+
+    anno = annotation.Annotation(template, cache=cache)
+    anno.parse()
+    anno.process()
+
+    assert(os.path.isfile(plans.cacheFilename(cache, template)))
+
+    cached = annotation.Annotation(template, cache=cache)
+    cached.parse()
+
+    assert(cached.mappings == anno.mappings)
+    assert(cached.plans == anno.plans)
+    assert(dict(cached.ns) == dict(anno.ns))
+
+    cached.process()
+
+    assert(cached.size() == anno.size())
+    assert(cached.nvalues() == 5)
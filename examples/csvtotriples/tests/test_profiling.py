@@ -0,0 +1,66 @@
+import pytest
+from csvtotriples import annotation
+from csvtotriples import profiling
+
+
+def test_profile_phases():
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+    anno.process()
+
+    phases = dict((totals['phase'], totals) for totals in anno.profile.phases)
+
+    assert('parse' in phases)
+    assert('load' in phases)
+    assert('validate' in phases)
+    assert(phases['load']['rows'] == 5)
+
+    # Both 'eq' mappings are processed together
+    assert(phases['processEqualityMappings:1:spp']['rows'] == 5)
+    assert(phases['processEqualityMappings:1:spp']['statements'] > 0)
+
+
+def test_profile_nested_phases():
+    profile = profiling.Profile()
+
+    profile.begin("outer", 0)
+    profile.begin("inner", 2)
+    profile.end(5)
+    profile.end(6, 4)
+
+    phases = dict((totals['phase'], totals) for totals in profile.phases)
+
+    # The inner phase's statements aren't counted in the outer phase's too
+    assert(phases['inner']['statements'] == 3)
+    assert(phases['outer']['statements'] == 3)
+    assert(phases['outer']['rows'] == 4)
+    assert(profile.running == [])
+
+
+def test_profile_nested_captures():
+    profile = profiling.Profile(calls=True)
+
+    profile.capture()
+    profile.capture()
+    profile.release()
+
+    assert(profile.captures == 1)
+
+    profile.release()
+    profile.release()
+
+    assert(profile.captures == 0)
+    assert('functions' in profile.report())
+
+
+def test_profile_peak_memory():
+    profile = profiling.Profile(memory=True)
+
+    profile.capture()
+    profile.begin("load", 0)
+    profile.end(0, 5)
+    profile.release()
+
+    # With or without tracemalloc, the peak memory is reported
+    assert(profile.phases[0]['peak_bytes'] > 0)
+    assert(profile.report()['memory']['peak_bytes'] > 0)
@@ -0,0 +1,39 @@
+import pytest
+from csvtotriples import annotation
+
+
+@pytest.mark.parametrize("storage", ["memory", "compact"])
+def test_match_patterns(storage):
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv", storage=storage)
+    anno.parse()
+    anno.process()
+
+    assert(anno.count() == 15)
+    assert(sorted(anno.match()) == sorted(anno.index.match()))
+
+    # Every combination of given terms uses one of the indexes
+    assert(anno.count(None, "rdf:type", "oboe:Measurement") == 5)
+    assert(anno.count("_:m1_row0") == 3)
+    assert(anno.count(None, None, "\"spp\"") == 5)
+    assert(anno.count("_:m1_row0", "oboe:hasValue") == 1)
+    assert(anno.count("_:m1_row0", None, "\"spp\"") == 1)
+    assert(anno.count(None, "oboe:hasValue", "Oncorhynchus kisutch") == 1)
+
+    assert(anno.match("_:m2_row1", "oboe:hasValue", None) == [("_:m2_row1", "<oboehasValue>", "\"Oncorhynchus kisutch\"")])
+    assert(anno.match("_:m2_row1", "oboe:hasValue", "\"Oncorhynchus kisutch\"") == anno.match("_:m2_row1", "oboe:hasValue"))
+
+    # Terms that aren't in the graph
+    assert(anno.count(None, "oboe:usesStandard") == 0)
+    assert(anno.match("_:m9_row9", "rdf:type", "oboe:Measurement") == [])
+
+
+def test_match_reindexes():
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv", storage="compact")
+    anno.parse()
+    anno.process()
+
+    assert(anno.count(None, "rdf:type", "oboe:Measurement") == 5)
+
+    anno.addStatement("_:m3_row0", "rdf:type", "oboe:Measurement")
+
+    assert(anno.count(None, "rdf:type", "oboe:Measurement") == 6)
@@ -0,0 +1,23 @@
+import sys
+import pytest
+from csvtotriples import annotation
+from csvtotriples import skeleton
+
+
+def test_skeleton_dtypes(tmpdir, monkeypatch):
+    tmpdir.join("data.csv").write("site,spp\n1,King\n2,Coho\n")
+
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.setattr(sys, "argv", ["skeleton.py", "data.csv"])
+
+    skeleton.main()
+
+    # Declare a dtype by filling in its commented out row
+    template = tmpdir.join("skeleton-data.csv.csv")
+    template.write(template.read().replace("#site,", "site,int8"))
+
+    anno = annotation.Annotation(str(template))
+    anno.parse()
+
+    assert(anno.dtypes == {'site': 'int8'})
+    assert([mapping['attribute'] for mapping in anno.mappings] == ["site", "spp"])
@@ -0,0 +1,39 @@
+import pytest
+from csvtotriples import sniff
+
+
+def test_sniff_delimited(tmpdir):
+    dataset = tmpdir.join("data.txt")
+    dataset.write('site;spp;"note; quoted"\n1;King;a\n2;Coho;b\n')
+
+    format = sniff.sniffFormat(str(dataset))
+
+    assert(format['format'] == "delimited")
+    assert(format['delimiter'] == ";")
+    assert(format['columns'] == ["site", "spp", "note; quoted"])
+
+    format = sniff.sniffFormat("tests/test_data/test_valueadding.csv")
+
+    assert(format['format'] == "csv")
+    assert(format['columns'] == ["site", "spp", "length_cm"])
+
+
+def test_sniff_fwf(tmpdir):
+    dataset = tmpdir.join("data.txt")
+    dataset.write("cast  depth   temp\n1     4.0     18.740\n1     5.0     18.744\n")
+
+    format = sniff.sniffFormat(str(dataset))
+
+    assert(format['format'] == "fwf")
+    assert(format['colspecs'] == [(0, 4), (6, 11), (14, 20)])
+    assert(format['columns'] == ["cast", "depth", "temp"])
+
+
+def test_sniff_wide_header(tmpdir):
+    dataset = tmpdir.join("wide.csv")
+    dataset.write(",".join(["c"] * 5000) + "\n" + ",".join(["1"] * 5000) + "\n")
+
+    format = sniff.sniffFormat(str(dataset), size=1024)
+
+    assert(len(format['columns']) == 5000)
+    assert(format['columns'][:3] == ["c", "c.1", "c.2"])
@@ -0,0 +1,82 @@
+import numpy
+import pytest
+from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import store
+
+
+def test_sqlite_storage(tmpdir):
+    directory = str(tmpdir.join("store"))
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv", storage="sqlite", directory=directory)
+    anno.parse()
+    incremental.IncrementalRun(anno, chunksize=2).process()
+
+    assert(anno.size() == 15)
+
+    # Reopen the store and serialize it without processing again
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv", storage="sqlite", directory=directory, reopen=True)
+    anno.parse()
+
+    assert(anno.size() == 15)
+
+    anno.serialize(outfile, "nt")
+
+    assert(len(open(outfile).readlines()) == 15)
+
+
+def test_compact_storage(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv", storage="compact")
+    anno.parse()
+    anno.process()
+
+    assert(anno.size() == 15)
+
+    anno.serialize(outfile, "nt")
+
+    expected = annotation.Annotation("tests/test_templates/test_valueadding.csv", storage="sqlite", directory=str(tmpdir))
+    expected.parse()
+    expected.process()
+
+    assert(sorted(open(outfile).readlines()) == sorted("%s %s %s .\n" % statement for statement in expected.model))
+
+
+def test_compact_store_dedup():
+    compact = store.CompactStore(batchsize=2)
+
+    compact.add("<http://example.com/s>", "<http://example.com/p>", "\"1\"")
+    compact.addMany(numpy.array(["_:b1", "_:b0", "_:b1"], dtype=object), "<http://example.com/p>",
+                    numpy.array(["\"1\"", "\"2\"", "\"1\""], dtype=object))
+    compact.add("<http://example.com/s>", "<http://example.com/p>", "\"1\"")
+
+    assert(compact.size() == 3)
+    assert(len(compact.terms) == 6)
+    assert(list(compact) == [("<http://example.com/s>", "<http://example.com/p>", "\"1\""),
+                             ("_:b1", "<http://example.com/p>", "\"1\""),
+                             ("_:b0", "<http://example.com/p>", "\"2\"")])
+
+
+def test_compact_storage_chunked(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv", storage="compact")
+    anno.parse()
+    incremental.IncrementalRun(anno, chunksize=2).process()
+
+    assert(anno.size() == 15)
+
+    anno.serialize(outfile, "nt")
+
+    lines = open(outfile).readlines()
+
+    assert(len(lines) == 15)
+    assert(len(set(lines)) == 15)
+
+
+@pytest.mark.parametrize("storage", ["memory", "compact", "sqlite", "bdb"])
+def test_reopen_missing(tmpdir, storage):
+    with pytest.raises(Exception):
+        store.createStore(storage, str(tmpdir), new=False)
@@ -0,0 +1,18 @@
+import pytest
+from csvtotriples import annotation
+
+
+def test_term_cache():
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+    anno.process()
+
+    stats = anno.termCacheStats()
+
+    assert(stats['hits'] > stats['misses'])
+    assert(anno.resolveTerm('owl:Thing', 'o') == '<http://www.w3.org/2002/07/owl#Thing>')
+
+    # Changing a namespace invalidates the cached expansions
+    anno.ns['owl'] = 'http://example.com/owl#'
+
+    assert(anno.resolveTerm('owl:Thing', 'o') == '<http://example.com/owl#Thing>')
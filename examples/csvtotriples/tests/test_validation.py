@@ -0,0 +1,77 @@
+import pytest
+from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import validation
+
+
+TERMS = {
+    'type': "<rdf:type>",
+    'Measurement': "<oboe:Measurement>",
+    'Observation': "<oboe:Observation>",
+    'hasValue': "<oboe:hasValue>",
+    'ofCharacteristic': "<oboe:ofCharacteristic>",
+    'usesStandard': "<oboe:usesStandard>",
+    'ofEntity': "<oboe:ofEntity>",
+    'hasMeasurement': "<oboe:hasMeasurement>"
+}
+
+
+def test_graph_validator():
+    statements = [
+        ("_:m1_row0", "<oboe:hasValue>", "\"1\""),
+        ("_:m1_row0", "<rdf:type>", "<oboe:Measurement>"),
+        ("_:m1_row0", "<oboe:usesStandard>", "_:m1_row0_standard"),
+        ("_:m1_row1", "<rdf:type>", "<oboe:Measurement>"),
+        ("_:m1_row1", "<oboe:ofCharacteristic>", "_:m1_row1_characteristic"),
+        ("_:o1row0", "<rdf:type>", "<oboe:Observation>"),
+        ("_:o1row0", "<oboe:hasMeasurement>", "_:m1_row0"),
+        ("_:other", "<oboe:hasValue>", "\"2\"")
+    ]
+
+    validator = validation.GraphValidator(TERMS)
+    validator.check([statements[:3], statements[3:]])
+
+    violations = validator.violations(lambda node: node[2:4])
+
+    assert(validator.nstatements == 8)
+    assert(violations == {
+        ('m1', 'Measurement', None): 2,
+        ('m1', 'Measurement', 'ofCharacteristic'): 1,
+        ('m1', 'Measurement', 'hasValue'): 1,
+        ('m1', 'Measurement', 'usesStandard'): 1,
+        ('o1', 'Observation', None): 1,
+        ('o1', 'Observation', 'ofEntity'): 1
+    })
+
+
+def test_validate_graph_output(tmpdir):
+    outfile = str(tmpdir.join("out.nt.gz"))
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+    anno.process()
+
+    expected = {
+        ('m1', 'Measurement', None): 5,
+        ('m1', 'Measurement', 'ofCharacteristic'): 5,
+        ('m1', 'Measurement', 'usesStandard'): 5
+    }
+
+    assert(anno.validateGraph() == expected)
+
+    # Read back from streamed output
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+    incremental.IncrementalRun(anno, stream=True).process(outfile, "nt")
+
+    assert(anno.validateGraph() == expected)
+
+
+def test_read_ntriples_rejects_turtle(tmpdir):
+    filename = str(tmpdir.join("out.ttl"))
+
+    with open(filename, "wb") as f:
+        f.write("@prefix oboe: <http://example.com/oboe#> .\n")
+
+    with pytest.raises(Exception):
+        list(validation.readNTriples(filename))
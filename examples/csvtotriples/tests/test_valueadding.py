@@ -8,3 +8,24 @@ def test_unionof():
     anno.process()
 
     assert(anno.nvalues() == 5)
+
+
+def test_value_use_ranges():
+    assert(annotation.formatRowRanges([0, 1, 2, 5, 7, 8]) == "0-2, 5, 7-8")
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+    anno.loadDataset(anno.locateDataset())
+
+    anno.trackUseOfValues('spp', [0, 1, 3], 'm1')
+
+    # Reusing a value fails at the mapping that reuses it
+    with pytest.raises(Exception) as error:
+        anno.trackUseOfValues('spp', [1, 4, 4], 'm2')
+
+    assert("mapping: m2, rows: 1, 4" in str(error.value))
+
+    with pytest.raises(Exception) as error:
+        anno.validateValueUse()
+
+    assert("Rows not used: 2, 4" in str(error.value))
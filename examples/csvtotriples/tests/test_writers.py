@@ -0,0 +1,96 @@
+import gzip
+import pytest
+from csvtotriples import annotation
+from csvtotriples import incremental
+from csvtotriples import writers
+
+
+def test_stream_ntriples(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+    incremental.IncrementalRun(anno, stream=True).process(outfile, "nt")
+
+    assert(anno.size() == 15)
+    assert(len(open(outfile).readlines()) == 15)
+
+
+def test_stream_turtle(tmpdir):
+    outfile = str(tmpdir.join("out.ttl"))
+
+    anno = annotation.Annotation("tests/test_templates/test_unionof.csv")
+    anno.parse()
+    incremental.IncrementalRun(anno, stream=True).process(outfile, "turtle")
+
+    output = open(outfile).read()
+
+    assert(anno.size() == 7)
+    assert("@prefix owl: <http://www.w3.org/2002/07/owl#> ." in output)
+    assert("foo:A owl:equivalentClass _:" in output)
+
+
+def test_stream_observations(tmpdir):
+    outfile = str(tmpdir.join("out.nt"))
+
+    # Two mappings share each row's Observation, which is only described once
+    memory = annotation.Annotation("tests/test_templates/test_constants.csv")
+    memory.parse()
+    memory.process()
+
+    anno = annotation.Annotation("tests/test_templates/test_constants.csv")
+    anno.parse()
+    incremental.IncrementalRun(anno, stream=True).process(outfile, "nt")
+
+    lines = open(outfile).readlines()
+
+    assert(len(set(lines)) == len(lines))
+    assert(anno.size() == len(lines))
+    assert(anno.size() == memory.size())
+
+
+def test_stream_gzip(tmpdir):
+    outfile = str(tmpdir.join("out.nt.gz"))
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+    incremental.IncrementalRun(anno, stream=True).process(outfile, "nt")
+
+    assert(anno.size() == 15)
+    assert(len(gzip.open(outfile).readlines()) == 15)
+
+
+def test_pipelined_writer_error(tmpdir):
+    writer = writers.PipelinedWriter(writers.createWriter(str(tmpdir.join("out.nt")), "nt"))
+
+    writer.add("<http://example.com/a>", "<http://example.com/b>", "<http://example.com/c>")
+
+    assert(writer.size() == 1)
+
+    # Errors in the writer's thread are raised in the caller's
+    writer.addMany(None, None, None)
+
+    with pytest.raises(Exception):
+        writer.flush()
+
+    with pytest.raises(Exception):
+        writer.close()
+
+
+def test_stream_gzip_error(tmpdir):
+    outfile = str(tmpdir.join("out.nt.gz"))
+
+    anno = annotation.Annotation("tests/test_templates/test_valueadding.csv")
+    anno.parse()
+
+    def fail():
+        raise ValueError("Failed after the mappings")
+
+    anno.validate = fail
+
+    with pytest.raises(ValueError):
+        incremental.IncrementalRun(anno, stream=True).process(outfile, "nt")
+
+    # The writer's thread is stopped and the output is closed, trailer and all
+    assert(not anno.model.thread.is_alive())
+    assert(len(gzip.open(outfile).readlines()) == 15)
@@ -0,0 +1,560 @@
+""" closure.py
+
+    Precomputed class closure for alignment ontologies.
+
+    Finding the individuals of a class across alignments with a SPARQL
+    property path like
+
+        ?i a/(rdfs:subClassOf|owl:equivalentClass|^owl:equivalentClass)* obo:A
+
+    (see examples/classify-non-hierarchical/bruteforce.rq) walks the class
+    graph again for every individual. Instead, the closure is computed once:
+
+    - Classes linked by owl:equivalentClass (in either direction), or by a
+      cycle of rdfs:subClassOf, are merged into equivalence sets with
+      union-find.
+    - The superclasses of each set, as a bitset of classes, are propagated
+      along rdfs:subClassOf over the DAG of sets, superclasses first.
+
+    The rdf:type statements implied for each individual can then be read off
+    its classes' bitsets and materialized. The closure can be saved to a
+    cache file and is updated in place, without starting over, when an
+    alignment statement is added.
+
+    Usage:
+
+        python closure.py test-equivclass.owl --query http://example.com/A
+        python closure.py --cache closure.pickle -o inferred.nt OBOE-OMlite.ttl obs-model-alignment-axioms.ttl
+        python closure.py --snapshots .ontology-cache OBOE-OMlite.ttl obs-model-alignment-axioms.ttl
+"""
+
+import os
+import time
+import hashlib
+import argparse
+import cPickle as pickle
+
+import RDF
+
+import parse
+
+
+RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+RDFS_SUBCLASSOF = "<http://www.w3.org/2000/01/rdf-schema#subClassOf>"
+OWL_EQUIVALENTCLASS = "<http://www.w3.org/2002/07/owl#equivalentClass>"
+
+# Classes in these namespaces (owl:Class, owl:NamedIndividual, ...) describe
+# the ontology itself, so statements typing things with them are left out
+SCHEMA_NAMESPACES = ("<http://www.w3.org/2002/07/owl#",
+                     "<http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+                     "<http://www.w3.org/2000/01/rdf-schema#")
+
+# Bump when what's saved in a cache file changes shape
+VERSION = 1
+
+
+def termFromNode(node):
+    """ Returns the N-Triples term for the URI or blank RDF.Node `node`, or
+        None for a literal.
+    """
+
+    if node.is_resource():
+        return "<%s>" % node.uri
+
+    if node.is_blank():
+        return "_:%s" % node.blank_identifier
+
+    return None
+
+
+def parseStatements(filename, cache=None):
+    """ Yields the statements in the ontology `filename` (RDF/XML, Turtle,
+        or N-Triples, going by its extension) as (s, p, o) N-Triples terms,
+        leaving out those with a literal object. With a `cache` directory,
+        the ontology is loaded from a snapshot (see parse.loadOntology()).
+    """
+
+    model, snapshot = parse.loadOntology(filename, cache)
+
+    for statement in model:
+        o = termFromNode(statement.object)
+
+        if o is not None:
+            yield termFromNode(statement.subject), termFromNode(statement.predicate), o
+
+
+def filesKey(filenames):
+    """ Returns a hash of the content of `filenames`, in order. """
+
+    digest = hashlib.sha1(str(VERSION))
+
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+
+    return digest.hexdigest()
+
+
+class UnionFind:
+    """ Disjoint sets of the integers 0 to n - 1, growing as they're used. """
+
+    def __init__(self):
+        self.parent = []
+        self.rank = []
+
+
+    def add(self):
+        """ Add a new set of one element and return the element. """
+
+        self.parent.append(len(self.parent))
+        self.rank.append(0)
+
+        return len(self.parent) - 1
+
+
+    def find(self, x):
+        """ Returns the representative of the set `x` is in. """
+
+        parent = self.parent
+
+        while parent[x] != x:
+            parent[x] = parent[parent[x]] # Path halving
+            x = parent[x]
+
+        return x
+
+
+    def union(self, x, y):
+        """ Merge the sets of `x` and `y` and return the representative of
+            the merged set.
+        """
+
+        x = self.find(x)
+        y = self.find(y)
+
+        if x == y:
+            return x
+
+        if self.rank[x] < self.rank[y]:
+            x, y = y, x
+
+        self.parent[y] = x
+
+        if self.rank[x] == self.rank[y]:
+            self.rank[x] += 1
+
+        return x
+
+
+class Closure:
+    """ The subclass/equivalence closure of the classes in an ontology, and
+        the classes individuals are asserted to be in.
+
+        Classes are numbered as they're seen. Each equivalence set has a
+        bitset of its members and, once computed (see compute()), a bitset
+        of all its superclasses, including the members of the set itself and
+        of every set equivalent to a superclass.
+    """
+
+    def __init__(self):
+        self.ids = {} # Class IDs by term
+        self.classes = [] # Class terms by ID
+        self.sets = UnionFind()
+        self.members = {} # Bitset of the classes in each set, by representative
+        self.supers = {} # Asserted superclasses (IDs) of each class, by ID
+        self.types = {} # Asserted classes (IDs) of each individual
+        self.ancestors = None # Bitset of each set's superclasses, by representative
+
+
+    def classId(self, term):
+        """ Returns the ID of the class `term`, numbering it if it's new. """
+
+        number = self.ids.get(term)
+
+        if number is None:
+            number = self.ids[term] = self.sets.add()
+            self.classes.append(term)
+            self.members[number] = 1 << number
+
+            if self.ancestors is not None:
+                self.ancestors[number] = 1 << number
+
+        return number
+
+
+    def add(self, s, p, o):
+        """ Add the statement `s`, `p`, `o` of N-Triples terms if it's about
+            classes (rdfs:subClassOf, owl:equivalentClass) or individuals
+            (rdf:type), updating the closure if it's been computed.
+        """
+
+        if p == RDF_TYPE:
+            if o.startswith(SCHEMA_NAMESPACES):
+                return
+
+            self.types.setdefault(s, set()).add(self.classId(o))
+        elif p == RDFS_SUBCLASSOF:
+            sub, sup = self.classId(s), self.classId(o)
+
+            self.supers.setdefault(sub, set()).add(sup)
+
+            if self.ancestors is not None:
+                self.addSubclass(sub, sup)
+        elif p == OWL_EQUIVALENTCLASS:
+            first, second = self.classId(s), self.classId(o)
+
+            if self.ancestors is not None:
+                self.addEquivalence(first, second)
+            else:
+                self.merge(first, second)
+
+
+    def load(self, filenames, cache=None):
+        """ Add the statements in the ontologies `filenames`, loaded from
+            snapshots in `cache` if given (see parseStatements()).
+        """
+
+        for filename in filenames:
+            for s, p, o in parseStatements(filename, cache):
+                self.add(s, p, o)
+
+
+    def merge(self, x, y):
+        """ Merge the equivalence sets of the classes `x` and `y`. Returns
+            the representative of the merged set.
+        """
+
+        x, y = self.sets.find(x), self.sets.find(y)
+
+        if x == y:
+            return x
+
+        root = self.sets.union(x, y)
+        other = y if root == x else x
+
+        self.members[root] |= self.members.pop(other)
+
+        if self.ancestors is not None:
+            self.ancestors[root] |= self.ancestors.pop(other)
+
+        return root
+
+
+    def compute(self):
+        """ Compute the superclasses of every equivalence set.
+
+            Sets of classes that are each other's subclasses through a cycle
+            are merged first, so the sets and their rdfs:subClassOf links
+            form a DAG. Tarjan's algorithm finds those cycles and also lists
+            the sets with superclasses before their subclasses, so each set's
+            bitset is its members OR-ed with its direct superclasses' bitsets.
+        """
+
+        graph = {}
+
+        for sub in self.supers:
+            for sup in self.supers[sub]:
+                graph.setdefault(self.sets.find(sub), set()).add(self.sets.find(sup))
+
+        components = stronglyConnectedComponents(self.members.keys(), graph)
+
+        # Merge the classes in each cycle
+        for component in components:
+            for member in component[1:]:
+                self.merge(component[0], member)
+
+        self.ancestors = {}
+
+        for component in components:
+            root = self.sets.find(component[0])
+            bits = self.members[root]
+
+            for member in component:
+                for sup in graph.get(member, ()):
+                    sup = self.sets.find(sup)
+
+                    if sup != root:
+                        bits |= self.ancestors[sup]
+
+            self.ancestors[root] = bits
+
+
+    def addSubclass(self, sub, sup):
+        """ Update the computed closure for the new statement `sub`
+            rdfs:subClassOf `sup` (class IDs): every set that has `sub` as a
+            superclass gets the superclasses of `sup`.
+        """
+
+        sub, sup = self.sets.find(sub), self.sets.find(sup)
+        added = self.ancestors[sup]
+
+        if added & ~self.ancestors[sub] == 0:
+            return
+
+        members = self.members[sub]
+
+        for root in self.ancestors:
+            if self.ancestors[root] & members:
+                self.ancestors[root] |= added
+
+        # `sup` was already a subclass of `sub`
+        if added & members:
+            self.mergeCycle(sub)
+
+
+    def addEquivalence(self, x, y):
+        """ Update the computed closure for the new statement `x`
+            owl:equivalentClass `y` (class IDs): their sets are merged and
+            every set that has either as a superclass gets the superclasses
+            of both.
+        """
+
+        x, y = self.sets.find(x), self.sets.find(y)
+
+        if x == y:
+            return
+
+        members = self.members[x] | self.members[y]
+        root = self.merge(x, y)
+        added = self.ancestors[root]
+
+        for other in self.ancestors:
+            if self.ancestors[other] & members:
+                self.ancestors[other] |= added
+
+        self.mergeCycle(root)
+
+
+    def mergeCycle(self, x):
+        """ Merge the sets that are both subclasses and superclasses of the
+            set of class `x` (after a new statement closed a cycle) into it.
+        """
+
+        root = self.sets.find(x)
+        cycle = [other for other in self.ancestors if other != root and
+                 self.ancestors[other] & self.members[root] and self.ancestors[root] & self.members[other]]
+
+        for other in cycle:
+            root = self.merge(root, other)
+
+
+    def superclasses(self, term):
+        """ Returns the terms of the class `term`, its equivalent classes,
+            and all their superclasses.
+        """
+
+        if self.ancestors is None:
+            self.compute()
+
+        if term not in self.ids:
+            return set()
+
+        return set(self.bitsetTerms(self.ancestors[self.sets.find(self.ids[term])]))
+
+
+    def bitsetTerms(self, bits):
+        """ Yields the terms of the classes in the bitset `bits`. """
+
+        while bits:
+            lowest = bits & -bits
+            yield self.classes[lowest.bit_length() - 1]
+            bits ^= lowest
+
+
+    def individualBits(self, individual):
+        """ Returns the bitset of the classes `individual` is in. """
+
+        bits = 0
+
+        for number in self.types[individual]:
+            bits |= self.ancestors[self.sets.find(number)]
+
+        return bits
+
+
+    def instances(self, term):
+        """ Returns the individuals that are in the class `term`, directly
+            or through its subclasses and equivalent classes.
+        """
+
+        if self.ancestors is None:
+            self.compute()
+
+        if term not in self.ids:
+            return set()
+
+        bit = 1 << self.ids[term]
+
+        return set(individual for individual in self.types if self.individualBits(individual) & bit)
+
+
+    def inferredTypes(self):
+        """ Yields the rdf:type statements (as N-Triples terms) implied for
+            the individuals by the closure that weren't already asserted.
+            Anonymous classes (blank nodes, e.g. restrictions) are left out.
+        """
+
+        if self.ancestors is None:
+            self.compute()
+
+        for individual in self.types:
+            bits = self.individualBits(individual)
+
+            for number in self.types[individual]:
+                bits &= ~(1 << number)
+
+            for term in self.bitsetTerms(bits):
+                if not term.startswith("_:"):
+                    yield individual, RDF_TYPE, term
+
+
+    def save(self, filename, key=None):
+        """ Save the closure to `filename`, along with `key` (see
+            filesKey()) to check it against later.
+        """
+
+        if self.ancestors is None:
+            self.compute()
+
+        state = (VERSION, key, self.classes, self.sets.parent, self.sets.rank, self.members,
+                 self.supers, self.types, self.ancestors)
+
+        with open(filename + ".partial", "wb") as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+
+        os.rename(filename + ".partial", filename)
+
+
+def loadClosure(filename, key=None):
+    """ Returns the Closure saved in `filename`, or None if it isn't there
+        or was saved with a different `key` or version.
+    """
+
+    if not os.path.isfile(filename):
+        return None
+
+    with open(filename, "rb") as f:
+        state = pickle.load(f)
+
+    if state[0] != VERSION or state[1] != key:
+        return None
+
+    closure = Closure()
+    closure.classes, closure.sets.parent, closure.sets.rank, closure.members, closure.supers, closure.types, closure.ancestors = state[2:]
+    closure.ids = dict((term, number) for number, term in enumerate(closure.classes))
+
+    return closure
+
+
+def stronglyConnectedComponents(nodes, graph):
+    """ Returns the strongly connected components of the directed `graph`
+        (a dict of node -> set of successors) over `nodes`, as lists of
+        nodes, with every component after the components it leads to.
+
+        This is Tarjan's algorithm, with an explicit stack so deep class
+        hierarchies don't hit Python's recursion limit.
+    """
+
+    index = {}
+    lowlink = {}
+    stack = []
+    onstack = set()
+    components = []
+
+    for start in nodes:
+        if start in index:
+            continue
+
+        work = [(start, iter(graph.get(start, ())))]
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        onstack.add(start)
+
+        while work:
+            node, successors = work[-1]
+            advanced = False
+
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    onstack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    advanced = True
+                    break
+                elif successor in onstack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+
+            if advanced:
+                continue
+
+            work.pop()
+
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+            if lowlink[node] == index[node]:
+                component = []
+
+                while True:
+                    member = stack.pop()
+                    onstack.discard(member)
+                    component.append(member)
+
+                    if member == node:
+                        break
+
+                components.append(component)
+
+    return components
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--cache", help="File to keep the computed closure in, reused while the ontologies don't change.")
+    parser.add_argument("--snapshots", help="Directory to keep snapshots of the parsed ontologies in (see parse.py). Default: Parse them every time.")
+    parser.add_argument("--query", help="Print the individuals of this class (a URI), like bruteforce.rq.")
+    parser.add_argument("-o", help="Write the inferred rdf:type statements to this file as N-Triples.")
+    parser.add_argument("filename", nargs="+", help="Ontologies (.owl, .rdf, .ttl, or .nt) to compute the closure of.")
+
+    args = parser.parse_args()
+
+    start = time.time()
+    closure = None
+    key = filesKey(args.filename)
+
+    if args.cache is not None:
+        closure = loadClosure(args.cache, key)
+
+    if closure is not None:
+        print "Loaded closure from %s in %.3fs." % (args.cache, time.time() - start)
+    else:
+        closure = Closure()
+        closure.load(args.filename, args.snapshots)
+        closure.compute()
+
+        print "Computed closure of %d classes in %.3fs." % (len(closure.classes), time.time() - start)
+
+        if args.cache is not None:
+            closure.save(args.cache, key)
+
+    if args.query is not None:
+        start = time.time()
+        instances = sorted(closure.instances("<%s>" % args.query))
+
+        for individual in instances:
+            print individual
+
+        print "Found %d individuals of %s in %.3fs." % (len(instances), args.query, time.time() - start)
+
+    if args.o is not None:
+        with open(args.o, "wb") as f:
+            count = 0
+
+            for statement in closure.inferredTypes():
+                f.write("%s %s %s .\n" % statement)
+                count += 1
+
+        print "Wrote %d inferred rdf:type statements to %s." % (count, args.o)
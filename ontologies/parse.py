@@ -1,15 +1,220 @@
 """ parse.py
     Matt Jones (jones@nceas.ucsb.edu)
 
-    Parse a Turtle file into a model
+    Parse a Turtle file into a model and print its statements
+
+    Parsing an ontology again every time it's used is slow, so loadOntology()
+    keeps a snapshot of each parsed ontology: a Redland Berkeley DB hashes
+    store in a cache directory, named after the SHA-1 of the file's base URI
+    (its absolute path, which relative URIs in it are resolved against) and
+    content. Opening a snapshot doesn't parse anything, and a file that has
+    changed or moved has a different hash so it's parsed (and snapshotted)
+    again.
+
+    Usage:
+
+        python parse.py union.ttl
+
+    With --cache, each ontology is also snapshotted and the time it takes to
+    load the snapshot is compared with parsing it:
+
+        python parse.py --cache .ontology-cache OBOE-OMlite.ttl ../examples/obs-model-examples.ttl
 """
 
+import os
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
 import RDF
 
+
+# Redland parsers by file extension
+PARSERS = {
+    '.owl': 'rdfxml',
+    '.rdf': 'rdfxml',
+    '.ttl': 'turtle',
+    '.nt': 'ntriples'
+}
+
+# Name of the Redland store in a snapshot directory
+SNAPSHOT = "ontology"
+
+
+def parserName(filename):
+    """ Returns the Redland parser for `filename`, going by its extension. """
+
+    extension = os.path.splitext(filename)[1]
+
+    if extension not in PARSERS:
+        raise Exception("Don't know how to parse %s. Try one of %s." % (filename, "|".join(sorted(PARSERS))))
+
+    return PARSERS[extension]
+
+
+def baseUri(filename):
+    """ Returns the URI `filename` is parsed with, which relative URIs in it
+        are resolved against.
+    """
+
+    return "file:" + os.path.abspath(filename)
+
+
+def snapshotKey(filename):
+    """ Returns the SHA-1 of the base URI and content of `filename`. """
+
+    sha1 = hashlib.sha1(baseUri(filename) + "\n")
+
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), ""):
+            sha1.update(block)
+
+    return sha1.hexdigest()
+
+
+def openStore(directory, new):
+    """ Returns an RDF.Model of the Berkeley DB hashes store in `directory`,
+        a new one if `new` is set or else an existing one, opened read-only.
+        Returns None if the store can't be opened (e.g. Redland was built
+        without Berkeley DB).
+    """
+
+    if new:
+        options = "new='yes',hash-type='bdb',dir='%s'" % directory
+    else:
+        options = "new='no',write='no',hash-type='bdb',dir='%s'" % directory
+
+    try:
+        return RDF.Model(RDF.Storage(storage_name="hashes", name=SNAPSHOT, options_string=options))
+    except RDF.RedlandError:
+        return None
+
+
+def closeStore(model):
+    """ Flush the store of `model`, from openStore(), to disk and close it.
+
+        Dropping the last reference to a model doesn't guarantee its store is
+        freed (and so closed) right away, so the Redland objects are freed
+        explicitly. `model` can't be used afterwards.
+    """
+
+    model.sync()
+    storage = model._storage
+
+    RDF.Redland.librdf_free_model(model._model)
+    model._model = None
+
+    # Freeing the storage closes it, once the model no longer refers to it
+    RDF.Redland.librdf_free_storage(storage._storage)
+    storage._storage = None
+
+
+def parseOntology(filename, model=None):
+    """ Parse the ontology `filename` (RDF/XML, Turtle, or N-Triples) into
+        `model`, a new in-memory RDF.Model by default, and return it.
+    """
+
+    if model is None:
+        model = RDF.Model()
+
+    uri = baseUri(filename)
+    RDF.Parser(name=parserName(filename)).parse_into_model(model, uri, uri)
+
+    return model
+
+
+def loadOntology(filename, cache=None):
+    """ Returns an RDF.Model of the ontology `filename`, opened from its
+        snapshot in `cache` if there is one for its current content, or else
+        parsed and snapshotted, and whether it was opened from the snapshot.
+        With `cache` set to None, or if snapshots can't be stored or opened,
+        the ontology is just parsed.
+
+        Snapshots are opened read-only. They're kept for the file's path as
+        well as its content, since relative URIs are resolved against it.
+    """
+
+    if cache is None:
+        return parseOntology(filename), False
+
+    directory = os.path.join(cache, snapshotKey(filename))
+
+    if os.path.isdir(directory):
+        model = openStore(directory, False)
+
+        if model is not None:
+            return model, True
+
+    if not os.path.isdir(cache):
+        os.makedirs(cache)
+
+    # Parse into a temporary directory so an interrupted parse doesn't leave
+    # a partial snapshot behind
+    partial = tempfile.mkdtemp(dir=cache, suffix=".partial")
+
+    try:
+        model = openStore(partial, True)
+
+        if model is None:
+            print "Couldn't store a snapshot of %s in %s, parsing it instead." % (filename, cache)
+            return parseOntology(filename), False
+
+        parseOntology(filename, model)
+
+        # The store must be written out and closed before it's moved
+        closeStore(model)
+
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+
+        os.rename(partial, directory)
+    finally:
+        if os.path.isdir(partial):
+            shutil.rmtree(partial)
+
+    model = openStore(directory, False)
+
+    if model is None:
+        print "Couldn't open the snapshot of %s in %s, parsing it instead." % (filename, directory)
+        return parseOntology(filename), False
+
+    return model, True
+
+
 if __name__ == "__main__":
-    parser=RDF.TurtleParser()
-    model = RDF.Model()
-    parser.parse_into_model(model, "file:./union.ttl")
-    print(model.size())
-    for statement in model:
-        print(statement)
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--cache", help="Directory to keep snapshots of parsed ontologies in, and time loading them against parsing. Default: Don't snapshot.")
+    parser.add_argument("filename", nargs="*", default=["union.ttl"], help="Ontologies (.owl, .rdf, .ttl, or .nt). Default: union.ttl.")
+
+    args = parser.parse_args()
+
+    for filename in args.filename:
+        start = time.time()
+        model = parseOntology(filename)
+        parse_time = time.time() - start
+
+        if args.cache is not None:
+            print "%s: %d statements, parsed in %.3fs." % (filename, model.size(), parse_time)
+
+            # Make sure there's a snapshot, then time loading it
+            loadOntology(filename, args.cache)
+
+            start = time.time()
+            model, snapshot = loadOntology(filename, args.cache)
+            nstatements = model.size()
+            load_time = time.time() - start
+
+            if snapshot:
+                print "%s: %d statements, loaded from snapshot in %.3fs (%.1fx faster)." % \
+                    (filename, nstatements, load_time, parse_time / max(load_time, 1e-6))
+            else:
+                print "%s: %d statements, parsed again in %.3fs (no snapshot could be opened)." % \
+                    (filename, nstatements, load_time)
+        else:
+            print(model.size())
+
+        for statement in model:
+            print(statement)
@@ -0,0 +1,176 @@
+import random
+import pytest
+import closure
+
+
+TYPE = closure.RDF_TYPE
+SUBCLASSOF = closure.RDFS_SUBCLASSOF
+EQUIVALENTCLASS = closure.OWL_EQUIVALENTCLASS
+
+
+def uri(name):
+    return "<http://example.com/%s>" % name
+
+
+def closureOf(statements, compute=True):
+    result = closure.Closure()
+
+    for statement in statements:
+        result.add(*statement)
+
+    if compute:
+        result.compute()
+
+    return result
+
+
+def superclassesOf(statements, term):
+    """ The classes reachable from `term` over rdfs:subClassOf and
+        owl:equivalentClass in either direction, like the property path in
+        bruteforce.rq.
+    """
+
+    graph = {}
+
+    for s, p, o in statements:
+        if p == SUBCLASSOF or p == EQUIVALENTCLASS:
+            graph.setdefault(s, set()).add(o)
+
+        if p == EQUIVALENTCLASS:
+            graph.setdefault(o, set()).add(s)
+
+    seen = set([term])
+    todo = [term]
+
+    while todo:
+        for sup in graph.get(todo.pop(), ()):
+            if sup not in seen:
+                seen.add(sup)
+                todo.append(sup)
+
+    return seen
+
+
+def randomStatements(generator, nclasses, nstatements):
+    statements = []
+
+    for i in range(nstatements):
+        first = uri("C%d" % generator.randrange(nclasses))
+        second = uri("C%d" % generator.randrange(nclasses))
+        choice = generator.random()
+
+        if choice < 0.5:
+            statements.append((first, SUBCLASSOF, second))
+        elif choice < 0.65:
+            statements.append((first, EQUIVALENTCLASS, second))
+        else:
+            statements.append((uri("i%d" % generator.randrange(20)), TYPE, first))
+
+    return statements
+
+
+def test_subclass_transitivity():
+    statements = [
+        (uri("A"), SUBCLASSOF, uri("B")),
+        (uri("B"), SUBCLASSOF, uri("C")),
+        (uri("C"), SUBCLASSOF, uri("D")),
+        (uri("x"), TYPE, uri("A")),
+        (uri("y"), TYPE, uri("C"))
+    ]
+
+    result = closureOf(statements)
+
+    assert(result.superclasses(uri("A")) == set([uri("A"), uri("B"), uri("C"), uri("D")]))
+    assert(result.superclasses(uri("C")) == set([uri("C"), uri("D")]))
+    assert(result.instances(uri("D")) == set([uri("x"), uri("y")]))
+    assert(result.instances(uri("B")) == set([uri("x")]))
+    assert(sorted(result.inferredTypes()) == [
+        (uri("x"), TYPE, uri("B")),
+        (uri("x"), TYPE, uri("C")),
+        (uri("x"), TYPE, uri("D")),
+        (uri("y"), TYPE, uri("D"))
+    ])
+
+
+def test_equivalence_cycles_merged():
+    statements = [
+        (uri("A"), EQUIVALENTCLASS, uri("B")),
+        (uri("C"), SUBCLASSOF, uri("D")),
+        (uri("D"), SUBCLASSOF, uri("E")),
+        (uri("E"), SUBCLASSOF, uri("C")),
+        (uri("E"), SUBCLASSOF, uri("F")),
+        (uri("b"), TYPE, uri("B")),
+        (uri("c"), TYPE, uri("C"))
+    ]
+
+    result = closureOf(statements)
+    ids = result.ids
+
+    # One set for A and B, and one for the cycle of C, D, and E
+    assert(result.sets.find(ids[uri("A")]) == result.sets.find(ids[uri("B")]))
+    assert(len(set(result.sets.find(ids[uri(name)]) for name in "CDE")) == 1)
+    assert(result.sets.find(ids[uri("C")]) != result.sets.find(ids[uri("F")]))
+    assert(len(result.members) == 3)
+
+    assert(result.instances(uri("A")) == set([uri("b")]))
+    assert(result.instances(uri("D")) == set([uri("c")]))
+    assert(result.superclasses(uri("D")) == set([uri("C"), uri("D"), uri("E"), uri("F")]))
+
+    # Typing a class with owl:Class doesn't make it an individual
+    result.add(uri("A"), TYPE, "<http://www.w3.org/2002/07/owl#Class>")
+
+    assert(uri("A") not in result.types)
+
+
+def test_incremental_matches_rebuild():
+    generator = random.Random(1)
+
+    for trial in range(100):
+        nclasses = generator.randint(2, 20)
+        statements = randomStatements(generator, nclasses, generator.randint(1, 40))
+        split = generator.randrange(len(statements) + 1)
+
+        # Computed part way through, then updated for the rest
+        incremental = closureOf(statements[:split])
+
+        for statement in statements[split:]:
+            incremental.add(*statement)
+
+        rebuilt = closureOf(statements)
+
+        for number in range(nclasses):
+            term = uri("C%d" % number)
+            expected = superclassesOf(statements, term) if term in rebuilt.ids else set()
+
+            assert(incremental.superclasses(term) == expected)
+            assert(rebuilt.superclasses(term) == expected)
+            assert(incremental.instances(term) == rebuilt.instances(term))
+
+        assert(sorted(incremental.inferredTypes()) == sorted(rebuilt.inferredTypes()))
+
+
+def test_save_load(tmpdir):
+    filename = str(tmpdir.join("closure.pickle"))
+    statements = randomStatements(random.Random(2), 15, 40)
+
+    result = closureOf(statements)
+    result.save(filename, "key")
+
+    loaded = closure.loadClosure(filename, "key")
+
+    assert(loaded.classes == result.classes)
+    assert(loaded.ids == result.ids)
+    assert(sorted(loaded.inferredTypes()) == sorted(result.inferredTypes()))
+
+    for term in result.classes:
+        assert(loaded.superclasses(term) == result.superclasses(term))
+
+    # Loaded closures are still updated in place
+    loaded.add(uri("C0"), EQUIVALENTCLASS, uri("new"))
+    result.add(uri("C0"), EQUIVALENTCLASS, uri("new"))
+
+    assert(loaded.superclasses(uri("new")) == result.superclasses(uri("new")))
+
+    # Saved for other files
+    assert(closure.loadClosure(filename, "other") is None)
+    assert(closure.loadClosure(str(tmpdir.join("missing.pickle")), "key") is None)
@@ -0,0 +1,127 @@
+import os
+import pytest
+import RDF
+import parse
+
+
+ONTOLOGY = """@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+
+<#A> a owl:Class .
+<#B> a owl:Class ; rdfs:subClassOf <#A> .
+"""
+
+
+def writeOntology(filename, content=ONTOLOGY):
+    with open(filename, "wb") as f:
+        f.write(content)
+
+
+def subjects(model):
+    return sorted(set(str(statement.subject.uri) for statement in model))
+
+
+def snapshots(cache):
+    return sorted(name for name in os.listdir(cache) if not name.endswith(".partial"))
+
+
+def test_snapshot_hit(tmpdir, monkeypatch):
+    filename = str(tmpdir.join("onto.ttl"))
+    cache = str(tmpdir.join("cache"))
+    writeOntology(filename)
+
+    model, snapshot = parse.loadOntology(filename, cache)
+    expected = subjects(model)
+
+    assert(snapshot)
+    assert(model.size() == 3)
+    assert(snapshots(cache) == [parse.snapshotKey(filename)])
+
+    del model
+
+    # The snapshot is opened without parsing the ontology again
+    def fail(filename, model=None):
+        raise Exception("Parsed %s again." % filename)
+
+    monkeypatch.setattr(parse, "parseOntology", fail)
+
+    model, snapshot = parse.loadOntology(filename, cache)
+
+    assert(snapshot)
+    assert(model.size() == 3)
+    assert(subjects(model) == expected)
+
+
+def test_no_snapshot_by_default(tmpdir):
+    filename = str(tmpdir.join("onto.ttl"))
+    writeOntology(filename)
+
+    model, snapshot = parse.loadOntology(filename)
+
+    assert(not snapshot)
+    assert(model.size() == 3)
+    assert(os.listdir(str(tmpdir)) == ["onto.ttl"])
+
+
+def test_snapshot_miss(tmpdir):
+    filename = str(tmpdir.join("onto.ttl"))
+    cache = str(tmpdir.join("cache"))
+    writeOntology(filename)
+
+    assert(parse.loadOntology(filename, cache)[0].size() == 3)
+
+    # Changed content
+    writeOntology(filename, ONTOLOGY + "<#C> a owl:Class .\n")
+
+    assert(parse.loadOntology(filename, cache)[0].size() == 4)
+    assert(len(snapshots(cache)) == 2)
+
+    # The same content at another path has another base URI
+    moved = str(tmpdir.mkdir("moved").join("onto.ttl"))
+    writeOntology(moved, ONTOLOGY + "<#C> a owl:Class .\n")
+
+    model, snapshot = parse.loadOntology(moved, cache)
+
+    assert(len(snapshots(cache)) == 3)
+    assert(all(subject.startswith(parse.baseUri(moved)) for subject in subjects(model)))
+
+
+def test_snapshot_fallback(tmpdir, monkeypatch, capsys):
+    filename = str(tmpdir.join("onto.ttl"))
+    cache = str(tmpdir.join("cache"))
+    writeOntology(filename)
+
+    # Redland built without Berkeley DB
+    def storage(**options):
+        raise RDF.RedlandError("no hashes storage")
+
+    monkeypatch.setattr(RDF, "Storage", storage)
+
+    assert(parse.openStore(str(tmpdir), True) is None)
+
+    model, snapshot = parse.loadOntology(filename, cache)
+
+    assert(not snapshot)
+    assert(model.size() == 3)
+    assert("parsing it instead" in capsys.readouterr()[0])
+    assert(snapshots(cache) == [])
+
+
+def test_snapshot_reopen_fallback(tmpdir, monkeypatch, capsys):
+    filename = str(tmpdir.join("onto.ttl"))
+    cache = str(tmpdir.join("cache"))
+    writeOntology(filename)
+
+    # The snapshot is stored but can't be opened again
+    openStore = parse.openStore
+
+    def storeOnly(directory, new):
+        return openStore(directory, new) if new else None
+
+    monkeypatch.setattr(parse, "openStore", storeOnly)
+
+    model, snapshot = parse.loadOntology(filename, cache)
+
+    assert(not snapshot)
+    assert(model.size() == 3)
+    assert("parsing it instead" in capsys.readouterr()[0])